@@ -1,59 +1,220 @@
 # app.py
 
 import gradio as gr
-import torch
-import csv
+import functools
 import os
+import signal
 from datetime import datetime
-from src.model import load_sentiment_pipeline
+from src.batching import MicroBatcher
+from src.cache import CachedPipeline, PredictionCache, model_fingerprint
+from src.hot_reload import HotSwapper, ModelReloader, ServingStack
+from src.async_inference import (AsyncInferenceService, DeadlineExceeded, RequestShed, run_until_disconnected,
+                                  validate_deadline_ms)
+from src.lazy import LazyResource
+from src.long_text import LengthPolicy, aggregate_distributions, validate_options
+from src.metrics import METRICS, instrument_pipeline, start_metrics_server, start_periodic_dump
 from src import config
 
 # --- 1. SETUP E CARICAMENTO MODELLO ---
+# torch, transformers e il modello vengono caricati solo al primo utilizzo (o in background
+# con il precaricamento): l'import di questo modulo resta veloce e senza effetti collaterali.
 
 print("Avvio dell'applicazione...")
 
 
+@functools.cache
 def get_device():
+    import torch
+
     if torch.backends.mps.is_available(): return "mps"
     if torch.cuda.is_available(): return "cuda:0"
     return "cpu"
 
 
-device = get_device()
-print(f"Utilizzo del dispositivo: {device}")
-
 # --- LOGICA DI SELEZIONE DEL MODELLO ---
 # Definiamo il percorso dove ci aspettiamo il modello trainato
 FINE_TUNED_DIR = "./fine_tuned_model"
 
-model_to_load = None
 
-# Controlliamo se la cartella esiste e contiene file
-if os.path.exists(FINE_TUNED_DIR) and os.listdir(FINE_TUNED_DIR):
-    print(f"✅ Trovato modello fine-tuned in: {FINE_TUNED_DIR}")
-    print("Utilizzo del modello personalizzato.")
-    model_to_load = FINE_TUNED_DIR
-else:
+def select_model():
+    """Restituisce la cartella del modello fine-tuned se presente, altrimenti None (modello base)."""
+    # Controlliamo se la cartella esiste e contiene file
+    if os.path.exists(FINE_TUNED_DIR) and os.listdir(FINE_TUNED_DIR):
+        print(f"✅ Trovato modello fine-tuned in: {FINE_TUNED_DIR}")
+        print("Utilizzo del modello personalizzato.")
+        return FINE_TUNED_DIR
+
     print("ℹ️ Nessun modello fine-tuned trovato (o cartella vuota).")
     print(f"Utilizzo del modello base: {config.MODEL_NAME}")
-    model_to_load = None  # La funzione userà il default da config
+    return None  # La funzione userà il default da config
+
+
+model_to_load = select_model()
+
+
+def load_pipeline():
+    from src.model import load_sentiment_pipeline
+
+    device = get_device()
+    print(f"Utilizzo del dispositivo: {device}")
+    # Se la quantizzazione int8 è attiva, verifichiamo l'accuratezza sul test set prima di usarla
+    guard_dataset = None
+    if config.QUANTIZE_INT8 and device == "cpu":
+        from src.data_loader import load_sentiment_dataset
+        guard_dataset = load_sentiment_dataset()
+
+    return load_sentiment_pipeline(device=device, model_name=select_model(), guard_dataset=guard_dataset,
+                                   profile=config.RUNTIME_PROFILE_APP)
+
+
+# Le predizioni dei diversi modelli convivono nella stessa cache: la chiave include l'impronta
+prediction_cache = PredictionCache()
+
+
+def build_serving_stack(sentiment_pipeline):
+    """Costruisce sopra la pipeline il pool di worker (se attivo), il micro-batcher e la cache."""
+    # L'impronta viene calcolata sul modello reale, non sul batcher
+    fingerprint = model_fingerprint(sentiment_pipeline)
+    # Il backend TorchScript non ha `name_or_path`: si usa la cartella dell'artefatto
+    model_name = (getattr(getattr(sentiment_pipeline, 'model', None), 'name_or_path', None)
+                  or getattr(sentiment_pipeline, 'model_dir', None))
+
+    # Con più worker, i pesi caricati vengono condivisi tra processi vincolati a core diversi
+    if config.WORKER_POOL_SIZE > 1 and get_device() == "cpu":
+        from src.worker_pool import InferenceWorkerPool
+        sentiment_pipeline = InferenceWorkerPool(sentiment_pipeline=sentiment_pipeline)
+    else:
+        # Tempi separati di tokenizzazione e forward pass (nei worker del pool non sarebbero visibili)
+        instrument_pipeline(sentiment_pipeline)
+
+    # Cascata: il primo stadio lineare risponde ai testi sicuri, solo gli altri arrivano al transformer
+    if config.CASCADE_ENABLED:
+        from src.cascade import load_cascade
+        sentiment_pipeline = load_cascade(sentiment_pipeline)
+        first_stage = getattr(sentiment_pipeline, 'first_stage', None)
+        if first_stage is not None:
+            fingerprint = f"{fingerprint}+{first_stage.fingerprint()}"
+
+    # Le richieste concorrenti vengono raggruppate in micro-batch prima di arrivare al modello.
+    # top_k=None: per ogni testo la distribuzione completa delle classi, non solo la più probabile
+    batcher = MicroBatcher(sentiment_pipeline, metrics=METRICS, pipeline_kwargs={"top_k": None})
+
+    # I testi già analizzati (retweet, frasi ricorrenti) vengono serviti dalla cache
+    cached_pipeline = CachedPipeline(batcher, cache=prediction_cache, fingerprint=fingerprint)
+
+    # I testi oltre config.INPUT_MAX_TOKENS vengono tagliati o divisi in blocchi prima della cache
+    length_policy = LengthPolicy(getattr(sentiment_pipeline, 'tokenizer', None), metrics=METRICS)
+    return ServingStack(sentiment_pipeline, batcher, cached_pipeline, length_policy, model_name=model_name)
+
+
+model_reloader = None
+
+
+def load_serving():
+    """Carica il modello e restituisce il riferimento sostituibile a caldo al modello in servizio."""
+    global model_reloader
+
+    sentiment_pipeline = load_pipeline()
+    serving = HotSwapper(build_serving_stack(sentiment_pipeline))
+
+    if config.MODEL_RELOAD_ENABLED:
+        # Anche l'artefatto TorchScript è nella cartella del modello
+        model_reloader = ModelReloader(serving, load_pipeline, build_serving_stack,
+                                       watch_dirs=[FINE_TUNED_DIR], metrics=METRICS)
+        # Il gestore del segnale di ricaricamento viene installato da start_services
+        model_reloader.start(reload_signal=None)
+    return serving
+
+
+def _on_reload_signal(signum, frame):
+    if model_reloader is not None:
+        model_reloader.request_reload()
+
+
+# Vecchio file CSV delle correzioni: le righe non ancora importate vengono migrate nell'archivio
+LEGACY_LOG_FILE = "flagged_data_corrected.csv"
+
+
+def open_feedback_store():
+    """Apre l'archivio delle correzioni (SQLite, scritture raggruppate e sicure tra più processi)."""
+    from src.feedback_store import FeedbackStore, migrate_csv
+
+    store = FeedbackStore()
+    migrate_csv(LEGACY_LOG_FILE, store)
+    return store
+
+
+serving_resource = LazyResource(load_serving, name="Modello")
+feedback_resource = LazyResource(open_feedback_store, name="Archivio correzioni")
+
+
+def _batching_stats():
+    return serving_resource.get().current.batcher.stats() if serving_resource.loaded else {}
+
 
-# Carichiamo la pipeline
-sentiment_pipeline = load_sentiment_pipeline(device=device, model_name=model_to_load)
+def _cascade_stats():
+    if not (config.CASCADE_ENABLED and serving_resource.loaded):
+        return {}
+    sentiment_pipeline = serving_resource.get().current.sentiment_pipeline
+    return sentiment_pipeline.stats() if getattr(sentiment_pipeline, 'first_stage', None) is not None else {}
 
-# File dove salveremo le correzioni
-LOG_FILE = "flagged_data_corrected.csv"
 
-# Creiamo l'header del CSV se non esiste
-if not os.path.exists(LOG_FILE):
-    with open(LOG_FILE, "w", newline="", encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "text", "model_prediction", "user_correction"])
+# Statistiche di batcher e cache esportate insieme alle metriche dell'applicazione
+METRICS.add_collector("batching", _batching_stats)
+METRICS.add_collector("cache", prediction_cache.stats)
+METRICS.add_collector("cascade", _cascade_stats)
+METRICS.add_collector("startup", lambda: {
+    "model_loaded": serving_resource.loaded,
+    "model_load_seconds": serving_resource.load_seconds or 0.0,
+})
+
+
+def start_services():
+    """
+    Avvia i servizi di contorno: endpoint delle metriche, dump periodico e, se attivo,
+    il precaricamento in background di modello e archivio delle correzioni.
+    """
+    if config.METRICS_PORT is not None:
+        start_metrics_server(ready=lambda: serving_resource.loaded)
+    if config.METRICS_DUMP_PATH:
+        start_periodic_dump()
+    if config.PRELOAD_AT_STARTUP:
+        serving_resource.preload()
+        feedback_resource.preload()
+    # `kill -HUP <pid>` forza il ricaricamento del modello senza attendere il controllo periodico
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, _on_reload_signal)
 
 
 # --- 2. FUNZIONI LOGICHE ---
 
-def predict(text):
+def predict_text(text, max_tokens=None, truncation=None):
+    """
+    Predizione sincrona di un singolo testo: cache, micro-batcher e modello in servizio.
+    Restituisce la distribuzione completa [{'label', 'score'}, ...], dalla classe più probabile.
+
+    I testi più lunghi di `max_tokens` (default: config.INPUT_MAX_TOKENS) vengono trattati
+    con la strategia `truncation` (default: config.TRUNCATION_STRATEGY); con "chunk" i
+    blocchi vengono inviati insieme al micro-batcher e le distribuzioni aggregate.
+    """
+    serving = serving_resource.get()
+    # Le richieste già iniziate terminano sul modello che le ha ricevute, anche durante un ricaricamento
+    with serving.acquire() as stack:
+        segments, weights, path = stack.length_policy.split(text, max_tokens, truncation)
+        # Latenza per percorso: quanto costano i testi lunghi rispetto a quelli che entrano nel limite
+        with METRICS.time("input_path_seconds", path=path):
+            # top_k fa parte della chiave: le vecchie voci in cache (solo top-1) non vengono riusate
+            distributions = stack.cached_pipeline(segments, top_k=None)
+        return aggregate_distributions(distributions, weights)
+
+
+# Coda di ammissione limitata davanti al modello: in sovraccarico le richieste vengono
+# rifiutate subito invece di accumulare latenza
+inference_service = AsyncInferenceService(predict_text, metrics=METRICS)
+METRICS.add_collector("admission", inference_service.stats)
+
+
+async def predict(text):
     """
     Fa la previsione. Restituisce:
     1. Il dizionario per il grafico (Label)
@@ -63,12 +224,16 @@ def predict(text):
     if not text:
         return None, None, gr.Column(visible=False)
 
-    result = sentiment_pipeline(text)[0]
-    label = result['label'].lower()
-    score = result['score']
+    METRICS.inc("requests", endpoint="predict")
+    try:
+        with METRICS.time("stage_seconds", stage="predict"):
+            distribution = await inference_service.predict(text)
+    except (RequestShed, DeadlineExceeded) as e:
+        raise gr.Error(str(e))
+    label = distribution[0]['label'].lower()
 
-    # Formattiamo per il componente Label (che vuole {Label: Score})
-    output_dict = {result['label'].capitalize(): score}
+    # Formattiamo per il componente Label (che vuole {Label: Score}): tutte le classi con la loro probabilità
+    output_dict = {item['label'].capitalize(): item['score'] for item in distribution}
 
     # Restituiamo: Output visivo, Stato nascosto, Rendi visibile la correzione
     return output_dict, label, gr.Column(visible=True)
@@ -76,30 +241,49 @@ def predict(text):
 
 def save_correction(text, model_prediction, user_correction):
     """
-    Salva la correzione nel CSV.
+    Salva la correzione nell'archivio delle correzioni.
     """
     if not user_correction:
         return "⚠️ Per favore seleziona un'etichetta corretta prima di salvare."
 
     timestamp = datetime.now().isoformat()
 
-    with open(LOG_FILE, "a", newline="", encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([timestamp, text, model_prediction, user_correction])
+    METRICS.inc("requests", endpoint="save_correction")
+    # Attendiamo il commit di gruppo: la correzione è su disco quando confermiamo all'utente
+    with METRICS.time("stage_seconds", stage="feedback_write"):
+        feedback_resource.get().append(timestamp, text, model_prediction, user_correction).result()
 
     return f"✅ Correzione salvata! (Modello: {model_prediction} -> Utente: {user_correction})"
 
 
+def get_inference_stats():
+    """
+    Restituisce le statistiche di inferenza: micro-batcher (profondità coda e
+    istogrammi), cache delle predizioni (hit/miss) e tempi per stadio.
+    """
+    return {
+        "batching": _batching_stats(),
+        "cache": prediction_cache.stats(),
+        "admission": inference_service.stats(),
+        "metrics": METRICS.snapshot(),
+    }
+
+
+def model_status():
+    """Markdown con il modello in servizio: quello dello stack corrente, o quello che verrà caricato."""
+    model_name = serving_resource.get().current.model_name if serving_resource.loaded else model_to_load
+    if model_name and os.path.abspath(model_name) == os.path.abspath(FINE_TUNED_DIR):
+        return "🚀 **Status:** Utilizzo del modello *Fine-Tuned* (Personalizzato)"
+    return "🔵 **Status:** Utilizzo del modello *Base* (Pre-addestrato)"
+
+
 # --- 3. INTERFACCIA GRAFICA CON BLOCKS ---
 
 with gr.Blocks(theme=gr.themes.Default()) as demo:
     gr.Markdown("# 📈 Analisi del Sentiment & Miglioramento Continuo")
 
-    # Mostriamo all'utente quale modello sta usando
-    if model_to_load == FINE_TUNED_DIR:
-        gr.Markdown("🚀 **Status:** Utilizzo del modello *Fine-Tuned* (Personalizzato)")
-    else:
-        gr.Markdown("🔵 **Status:** Utilizzo del modello *Base* (Pre-addestrato)")
+    # Mostriamo all'utente quale modello sta usando (aggiornato a ogni caricamento della pagina)
+    model_status_md = gr.Markdown(model_status())
 
     gr.Markdown(
         "Inserisci un testo per analizzare il sentiment. Se il modello sbaglia, aiutaci a migliorare correggendolo qui sotto.")
@@ -130,19 +314,111 @@ with gr.Blocks(theme=gr.themes.Default()) as demo:
 
         status_message = gr.Markdown("")
 
+    # --- STATISTICHE DI INFERENZA ---
+    with gr.Accordion("📊 Statistiche di Inferenza", open=False):
+        stats_json = gr.JSON(label="Micro-batching e Cache")
+        stats_btn = gr.Button("Aggiorna Statistiche")
+
     # --- 4. COLLEGAMENTI DEGLI EVENTI ---
 
     analyze_btn.click(
         fn=predict,
         inputs=input_text,
-        outputs=[output_label, prediction_state, correction_section]
-    )
+        outputs=[output_label, prediction_state, correction_section],
+        # La concorrenza è limitata da inference_service, che rifiuta le richieste in eccesso
+        # invece di lasciarle in coda: qui nessun limite aggiuntivo
+        concurrency_limit=None
+    ).then(fn=model_status, inputs=None, outputs=model_status_md)
 
     save_btn.click(
         fn=save_correction,
         inputs=[input_text, prediction_state, correction_radio],
-        outputs=status_message
+        outputs=status_message,
+        # Le scritture concorrenti vengono raggruppate in un unico commit dall'archivio
+        concurrency_limit=None
+    )
+
+    stats_btn.click(
+        fn=get_inference_stats,
+        inputs=None,
+        outputs=stats_json
     )
 
+    # Dopo un ricaricamento a caldo lo stato deve riflettere il modello ora in servizio
+    demo.load(fn=model_status, inputs=None, outputs=model_status_md)
+
+# --- 5. API JSON PER I CLIENT AUTOMATICI ---
+
+def create_server_app():
+    """
+    Applicazione FastAPI con l'endpoint JSON POST /v1/predict e l'interfaccia Gradio montata su "/".
+
+    Corpo della richiesta: {"text": "...", "deadline_ms": 2000 (opzionale, fino a config.ASYNC_MAX_DEADLINE_MS),
+    "max_tokens": 128 (opzionale), "truncation": "head" | "tail" | "head+tail" | "chunk" (opzionale)}.
+    Risposte: 200 {"label", "score", "scores"}, 400 input non valido, 429 sovraccarico (con Retry-After),
+    504 scadenza superata.
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    api = FastAPI()
+
+    @api.post("/v1/predict")
+    async def predict_json(request: Request):
+        payload = await request.json()
+        text = payload.get("text") if isinstance(payload, dict) else None
+        if not isinstance(text, str) or not text:
+            return JSONResponse({"error": "Campo 'text' mancante o vuoto."}, status_code=400)
+
+        max_tokens = payload.get("max_tokens")
+        truncation = payload.get("truncation")
+        deadline_ms = payload.get("deadline_ms")
+        try:
+            # Solo i campi assenti prendono il default: 0 o "" sono valori espliciti, da rifiutare
+            validate_options(config.INPUT_MAX_TOKENS if max_tokens is None else max_tokens,
+                             config.TRUNCATION_STRATEGY if truncation is None else truncation)
+            if deadline_ms is not None:
+                validate_deadline_ms(deadline_ms)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+        METRICS.inc("requests", endpoint="predict_json")
+        try:
+            # Se il client si disconnette mentre la richiesta è in coda, non arriva al modello
+            result = await run_until_disconnected(
+                inference_service.predict(text, deadline_ms=deadline_ms,
+                                          max_tokens=max_tokens, truncation=truncation),
+                request.is_disconnected
+            )
+        except RequestShed as e:
+            return JSONResponse({"error": str(e)}, status_code=e.status_code, headers={"Retry-After": "1"})
+        except DeadlineExceeded as e:
+            return JSONResponse({"error": str(e)}, status_code=e.status_code)
+
+        if result is None:
+            return JSONResponse({"error": "Client disconnesso."}, status_code=499)
+        return {
+            "label": result[0]['label'].lower(),
+            "score": result[0]['score'],
+            "scores": {item['label'].lower(): item['score'] for item in result},
+        }
+
+    return gr.mount_gradio_app(api, demo, path="/")
+
+
+def server_address():
+    """
+    Indirizzo del server HTTP: GRADIO_SERVER_NAME e GRADIO_SERVER_PORT se impostate
+    (es. da Hugging Face Spaces, che richiede 0.0.0.0), altrimenti i valori di config.
+    """
+    host = os.environ.get("GRADIO_SERVER_NAME") or config.SERVER_HOST
+    port = int(os.environ.get("GRADIO_SERVER_PORT") or config.SERVER_PORT)
+    return host, port
+
+
 if __name__ == "__main__":
-    demo.launch()
\ No newline at end of file
+    import uvicorn
+
+    start_services()
+    host, port = server_address()
+    uvicorn.run(create_server_app(), host=host, port=port)
\ No newline at end of file
@@ -1,10 +1,11 @@
 # main.py
 
+import argparse
 import torch
 import os
 from src.data_loader import load_sentiment_dataset
 from src.model import load_sentiment_pipeline
-from src.evaluate import evaluate_model
+from src.evaluate import evaluate_model, evaluate_sharded
 from src import config
 
 
@@ -14,11 +15,21 @@ def get_device():
     return "cpu"
 
 
-def main():
+def main(sample_size=1000, batch_size=None, quantize=False, workers=0, shards=0, cascade=False):
     """
     Benchmark Script:
     Valuta il modello corrente (Base o Fine-Tuned) sul dataset originale TweetEval.
     Serve a verificare che il retraining non abbia causato degrado (Catastrophic Forgetting).
+
+    Args:
+        sample_size (int, optional): Elementi del test set da valutare (None = tutto il test set).
+        batch_size (int, optional): Dimensione dei batch per l'inferenza in blocco.
+        quantize (bool): Se True, valuta il modello quantizzato int8 (con guardia di accuratezza).
+        workers (int): Se maggiore di 1, distribuisce l'inferenza su un pool di processi (solo CPU).
+        shards (int): Se maggiore di 1, divide il test set tra più processi che uniscono le
+                      matrici di confusione, con intervalli di confidenza bootstrap (solo CPU).
+        cascade (bool): Se True, valuta la cascata primo stadio lineare + transformer
+                        (tasso di escalation e accuratezza per stadio).
     """
     device = get_device()
 
@@ -41,15 +52,53 @@ def main():
     dataset = load_sentiment_dataset()
 
     # 3. Carica la pipeline con il modello scelto
-    sentiment_pipeline = load_sentiment_pipeline(device=device, model_name=model_to_use)
+    if quantize:
+        # La guardia confronta int8 e fp32 sullo stesso campione prima di accettare il modello
+        sentiment_pipeline = load_sentiment_pipeline(device="cpu", model_name=model_to_use,
+                                                     quantize=True, guard_dataset=dataset,
+                                                     profile=config.RUNTIME_PROFILE_BATCH)
+    elif shards > 1:
+        # Backend eager: il grafo TorchScript non si può passare ai processi di valutazione
+        sentiment_pipeline = load_sentiment_pipeline(device="cpu", model_name=model_to_use, backend="eager",
+                                                     profile=config.RUNTIME_PROFILE_BATCH)
+    elif workers > 1:
+        from src.worker_pool import InferenceWorkerPool
+        sentiment_pipeline = InferenceWorkerPool(model_name=model_to_use, num_workers=workers)
+    else:
+        sentiment_pipeline = load_sentiment_pipeline(device=device, model_name=model_to_use,
+                                                     profile=config.RUNTIME_PROFILE_BATCH)
+
+    if cascade:
+        from src.cascade import load_cascade
+        sentiment_pipeline = load_cascade(sentiment_pipeline)
 
     # 4. Valuta le performance
     print("\n--- Inizio Benchmark ---")
     if model_to_use:
         print("Obiettivo: Verificare che l'accuratezza non sia peggiorata rispetto al 74% del modello base.")
 
-    evaluate_model(sentiment_pipeline, dataset)
+    if shards > 1:
+        evaluate_sharded(sentiment_pipeline, dataset, num_shards=shards, sample_size=sample_size,
+                         batch_size=batch_size)
+    else:
+        evaluate_model(sentiment_pipeline, dataset, sample_size=sample_size, batch_size=batch_size)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Benchmark del modello corrente su TweetEval.")
+    parser.add_argument("--full", action="store_true",
+                        help="Valuta l'intero test set invece del campione di 1000 elementi.")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Dimensione dei batch per l'inferenza (default: quella del profilo di esecuzione).")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Valuta il modello quantizzato int8 su CPU.")
+    parser.add_argument("--workers", type=int, default=config.WORKER_POOL_SIZE,
+                        help="Numero di processi di inferenza con pesi condivisi (CPU).")
+    parser.add_argument("--shards", type=int, default=config.EVAL_NUM_SHARDS or 0,
+                        help="Valutazione parallela a shard con intervalli di confidenza (CPU, es. con --full).")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Valuta la cascata con il primo stadio lineare (python -m src.cascade per addestrarlo).")
+    args = parser.parse_args()
+
+    main(sample_size=None if args.full else 1000, batch_size=args.batch_size,
+         quantize=args.quantize, workers=args.workers, shards=args.shards, cascade=args.cascade)
\ No newline at end of file
@@ -0,0 +1,251 @@
+# benchmark_performance.py
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+
+from src import config
+from src.model import load_sentiment_pipeline
+from src.tiny_model import get_tiny_model
+
+# Metriche in cui un valore più basso è migliore; per tutte le altre vale il contrario
+LOWER_IS_BETTER = ("cold_start_s", "latency_", "peak_rss_mb", "tokenizer_ms", "model_ms")
+
+
+# --- 1. GENERAZIONE DEGLI INPUT ---
+
+def make_texts(tokenizer, target_tokens, count, seed=0):
+    """
+    Genera `count` testi sintetici lunghi circa `target_tokens` token,
+    così i risultati sono riproducibili e non dipendono da un dataset scaricato.
+    """
+    rng = np.random.default_rng(seed)
+    words = ["great", "service", "today", "really", "bad", "support", "love", "product",
+             "the", "package", "arrived", "late", "#fail", "@user", "😂", "not", "happy"]
+    texts = []
+    for _ in range(count):
+        text_words = []
+        while len(tokenizer(" ".join(text_words))['input_ids']) < target_tokens:
+            text_words.append(words[rng.integers(len(words))])
+        texts.append(" ".join(text_words))
+    return texts
+
+
+# --- 2. MISURE ---
+
+def measure_cold_start(model_dir, backend):
+    """
+    Tempo per avviare un nuovo processo, importare, caricare il modello e servire
+    la prima richiesta: è il tempo che aspetta un nuovo worker dell'autoscaler.
+    """
+    code = (
+        "import time; start = time.perf_counter(); "
+        "from src.model import load_sentiment_pipeline; "
+        f"p = load_sentiment_pipeline(device='cpu', model_name={model_dir!r}, backend={backend!r}); "
+        "p('warm up'); print('COLD_START', time.perf_counter() - start)"
+    )
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    line = [line for line in output.stdout.splitlines() if line.startswith("COLD_START")][-1]
+    return float(line.split()[1])
+
+
+def measure_latency(sentiment_pipeline, texts):
+    """Latenza di singole richieste sequenziali, in millisecondi."""
+    sentiment_pipeline(texts[0], truncation=True)  # Warm-up
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        sentiment_pipeline(text, truncation=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+        "latency_p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def measure_throughput(sentiment_pipeline, texts, batch_size):
+    """Testi al secondo processando `texts` a batch di `batch_size`."""
+    sentiment_pipeline(texts[:batch_size], batch_size=batch_size, truncation=True)  # Warm-up
+    start = time.perf_counter()
+    for offset in range(0, len(texts), batch_size):
+        batch = texts[offset:offset + batch_size]
+        sentiment_pipeline(batch, batch_size=len(batch), truncation=True)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def measure_stage_split(sentiment_pipeline, texts, batch_size, repeats=5):
+    """Tempo medio per batch speso in tokenizzazione e nella forward pass del modello."""
+    tokenizer = sentiment_pipeline.tokenizer
+    model = sentiment_pipeline.model
+    batch = texts[:batch_size]
+
+    tokenizer_times, model_times = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        encodings = tokenizer(batch, padding=True, truncation=True, return_tensors="pt")
+        tokenizer_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with torch.inference_mode():
+            if isinstance(model, torch.jit.ScriptModule):
+                model(encodings['input_ids'], encodings['attention_mask'])
+            else:
+                model(input_ids=encodings['input_ids'], attention_mask=encodings['attention_mask'])
+        model_times.append(time.perf_counter() - start)
+
+    tokenizer_ms = float(np.mean(tokenizer_times) * 1000)
+    model_ms = float(np.mean(model_times) * 1000)
+    return {
+        "tokenizer_ms": tokenizer_ms,
+        "model_ms": model_ms,
+        "tokenizer_share": tokenizer_ms / (tokenizer_ms + model_ms),
+    }
+
+
+def peak_rss_mb():
+    """Picco di memoria residente del processo (ru_maxrss è in KB su Linux, in byte su macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# --- 3. STORICO E CONFRONTO ---
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def append_history(path, run):
+    history = load_history(path)
+    history.append(run)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+
+
+def compare_runs(baseline, current, threshold):
+    """
+    Confronta due esecuzioni e restituisce le metriche peggiorate oltre la soglia relativa.
+
+    Returns:
+        list[dict]: Una voce per ogni regressione (metrica, valore precedente, attuale, variazione).
+    """
+    regressions = []
+    for name, current_value in current["metrics"].items():
+        previous_value = baseline["metrics"].get(name)
+        if not previous_value or name == "tokenizer_share":
+            continue
+        change = (current_value - previous_value) / previous_value
+        worse = change > threshold if name.startswith(LOWER_IS_BETTER) else change < -threshold
+        if worse:
+            regressions.append({"metric": name, "previous": previous_value,
+                                "current": current_value, "change": change})
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- 4. SUITE ---
+
+def run_benchmark(model_dir, backend="eager", batch_sizes=None, seq_lengths=None, latency_requests=200):
+    """
+    Esegue la suite di benchmark e restituisce un dizionario con tutte le metriche.
+    """
+    batch_sizes = batch_sizes or config.BENCHMARK_BATCH_SIZES
+    seq_lengths = seq_lengths or config.BENCHMARK_SEQ_LENGTHS
+
+    metrics = {}
+    print("Misura del cold start (nuovo processo)...")
+    metrics["cold_start_s"] = measure_cold_start(model_dir, backend)
+
+    sentiment_pipeline = load_sentiment_pipeline(device="cpu", model_name=model_dir, backend=backend)
+    tokenizer = sentiment_pipeline.tokenizer
+
+    print("Misura della latenza di singole richieste...")
+    latency_texts = make_texts(tokenizer, target_tokens=min(seq_lengths), count=latency_requests)
+    metrics.update(measure_latency(sentiment_pipeline, latency_texts))
+
+    for seq_length in seq_lengths:
+        texts = make_texts(tokenizer, target_tokens=seq_length, count=max(batch_sizes) * 4, seed=seq_length)
+        for batch_size in batch_sizes:
+            print(f"Throughput: sequenze da {seq_length} token, batch da {batch_size}...")
+            throughput = measure_throughput(sentiment_pipeline, texts, batch_size)
+            metrics[f"throughput_seq{seq_length}_bs{batch_size}"] = throughput
+
+        split = measure_stage_split(sentiment_pipeline, texts, max(batch_sizes))
+        metrics[f"tokenizer_ms_seq{seq_length}"] = split["tokenizer_ms"]
+        metrics[f"model_ms_seq{seq_length}"] = split["model_ms"]
+
+    metrics["peak_rss_mb"] = peak_rss_mb()
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "model": model_dir,
+        "backend": backend,
+        "host": {"platform": platform.platform(), "cpus": os.cpu_count(), "torch": torch.__version__,
+                 "threads": torch.get_num_threads()},
+        "metrics": metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark di latenza, throughput e memoria dell'inferenza.")
+    parser.add_argument("--model", default=None,
+                        help="Modello da misurare (default: modello minuscolo generato in locale, offline).")
+    parser.add_argument("--backend", default="eager", choices=["eager", "traced", "auto"])
+    parser.add_argument("--history", default=config.BENCHMARK_HISTORY_FILE, help="File JSON con lo storico.")
+    parser.add_argument("--threshold", type=float, default=config.BENCHMARK_REGRESSION_THRESHOLD,
+                        help="Peggioramento relativo oltre il quale segnalare una regressione.")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Termina con codice di uscita 1 se ci sono regressioni.")
+    args = parser.parse_args()
+
+    model_dir = args.model or get_tiny_model()
+    run = run_benchmark(model_dir, backend=args.backend)
+
+    print("\n--- Risultati Benchmark ---")
+    for name, value in run["metrics"].items():
+        print(f"  {name:<32} {value:.4f}")
+
+    # Confronto con l'ultima esecuzione dello stesso modello e backend
+    previous_runs = [r for r in load_history(args.history)
+                     if r["model"] == run["model"] and r["backend"] == run["backend"]]
+    append_history(args.history, run)
+
+    if not previous_runs:
+        print("\nNessuna esecuzione precedente: questo risultato diventa il riferimento.")
+        return 0
+
+    regressions = compare_runs(previous_runs[-1], run, args.threshold)
+    if not regressions:
+        print(f"\n✅ Nessuna regressione oltre il {args.threshold:.0%} rispetto all'esecuzione precedente.")
+        return 0
+
+    print(f"\n❌ Regressioni oltre il {args.threshold:.0%} rispetto all'esecuzione precedente:")
+    for regression in regressions:
+        print(f"  {regression['metric']}: {regression['previous']:.4f} -> {regression['current']:.4f} "
+              f"({regression['change']:+.1%})")
+    return 1 if args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
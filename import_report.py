@@ -0,0 +1,92 @@
+# import_report.py
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Punti di ingresso del progetto (moduli importati dai comandi e dai test)
+ENTRY_POINTS = [
+    "app",
+    "retrain",
+    "score_file",
+    "benchmark_baseline",
+    "benchmark_performance",
+    "src.monitor",
+    "src.evaluate",
+    "src.model",
+]
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_importtime(stderr):
+    """
+    Legge l'output di `python -X importtime` e restituisce il tempo cumulativo (in secondi)
+    dei moduli importati direttamente dal punto di ingresso, raggruppati per pacchetto.
+    """
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name_field = line[len("import time:"):].split("|")
+        name = name_field.rstrip()
+        # Ogni livello di annidamento aggiunge due spazi davanti al nome
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth != 1:
+            continue
+        module = name.strip()
+        # I moduli del progetto restano separati, le librerie vengono raggruppate per pacchetto
+        package = module if module.startswith("src.") else module.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(cumulative_us) / 1e6
+    return packages
+
+
+def measure_entry_point(module):
+    """Importa `module` in un nuovo processo e misura il tempo totale e quello per pacchetto."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=PROJECT_DIR
+    )
+    seconds = time.perf_counter() - start
+
+    report = {"module": module, "seconds": seconds, "ok": result.returncode == 0}
+    if result.returncode != 0:
+        report["error"] = result.stderr.strip().splitlines()[-1]
+        return report
+
+    packages = parse_importtime(result.stderr)
+    report["packages"] = dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Costo in secondi dell'import di ogni punto di ingresso.")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS, help="Moduli da misurare.")
+    parser.add_argument("--top", type=int, default=5, help="Pacchetti più costosi da mostrare per modulo.")
+    parser.add_argument("--json", action="store_true", help="Stampa il report in formato JSON.")
+    args = parser.parse_args()
+
+    reports = [measure_entry_point(module) for module in args.modules]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print("\n--- Report dei Tempi di Import ---")
+    for report in reports:
+        if not report["ok"]:
+            print(f"\n{report['module']}: ❌ import fallito ({report['error']})")
+            continue
+        print(f"\n{report['module']}: {report['seconds']:.2f}s (processo completo)")
+        for package, seconds in list(report["packages"].items())[:args.top]:
+            if seconds < 0.01:
+                break
+            print(f"  {package:<24} {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,34 @@
 # retrain.py
 
+import argparse
+import json
 import pandas as pd
 import os
 import numpy as np
-from datasets import Dataset
-from transformers import AutoModelForSequenceClassification, AutoTokenizer, Trainer, TrainingArguments
+from datetime import datetime
+from datasets import concatenate_datasets
+from transformers import (AutoModelForSequenceClassification, AutoTokenizer, DataCollatorWithPadding,
+                          Trainer, TrainingArguments)
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 
 # Importiamo le configurazioni
 from src import config
+from src.artifact_store import resolve_model_path
+from src.dedup import deduplicate_corrections
+from src.export import export_traced_model
+from src.feedback_store import FeedbackStore, migrate_csv
+from src.token_cache import TokenizedFeatureCache
 
 # --- CONFIGURAZIONE ---
-CSV_FILE = "flagged_data_corrected.csv"
+CSV_FILE = "flagged_data_corrected.csv"  # Vecchio formato: viene migrato nell'archivio delle correzioni
 NEW_MODEL_DIR = "./fine_tuned_model"
 BASE_MODEL = config.MODEL_NAME
 
 
 def preprocess_function(examples, tokenizer):
-    """Tokenizza i testi per il modello."""
-    return tokenizer(examples['text'], truncation=True, padding=True)
+    """Tokenizza i testi per il modello (il padding viene applicato batch per batch dal collator)."""
+    return tokenizer(examples['text'], truncation=True)
 
 
 def compute_metrics(eval_pred):
@@ -29,68 +38,234 @@ def compute_metrics(eval_pred):
     return {"accuracy": accuracy_score(labels, predictions)}
 
 
-def load_corrected_data():
+def _prepare_corrections(df):
+    """Scarta le righe incomplete, converte le etichette in id e collassa i quasi duplicati."""
+    # Filtriamo eventuali righe vuote o incomplete
+    df = df.dropna(subset=['text', 'user_correction'])
+    df = df[(df['text'].str.strip() != "") & (df['user_correction'].str.strip() != "")]
+
+    # Mappiamo le etichette stringa (es: 'positive') in ID numerici (es: 2)
+    try:
+        df = df.assign(label=df['user_correction'].apply(lambda x: config.LABEL2ID[x.lower()]))
+    except KeyError as e:
+        print(f"Errore nei dati: Trovata un'etichetta non valida nel CSV: {e}")
+        print("Assicurati che il CSV contenga solo 'negative', 'neutral', 'positive'.")
+        return None
+
+    if config.DEDUP_CORRECTIONS:
+        # Lo stesso tweet con link, menzioni o maiuscole diverse viene addestrato una volta sola
+        total = len(df)
+        df = deduplicate_corrections(df, policy=config.DEDUP_LABEL_POLICY)
+        print(f"Deduplicazione: {total} correzioni -> {len(df)} testi distinti "
+              f"(etichette in conflitto risolte con '{config.DEDUP_LABEL_POLICY}').")
+
+    return df
+
+
+def _open_feedback_store():
+    if not os.path.exists(config.FEEDBACK_DB_PATH) and not os.path.exists(CSV_FILE):
+        print(f"Errore: Nessuna correzione trovata ({config.FEEDBACK_DB_PATH} o {CSV_FILE}). "
+              "Raccogli prima qualche dato con l'app!")
+        return None
+
+    store = FeedbackStore()
+    migrate_csv(CSV_FILE, store)
+    return store
+
+
+def load_corrected_data(since_id=0):
     """
-    Carica i dati dal CSV delle correzioni e li prepara per il training.
+    Carica i dati dall'archivio delle correzioni e li prepara per il training.
+
+    Args:
+        since_id (int): Considera solo le correzioni con id maggiore (modalità incrementale).
     """
-    if not os.path.exists(CSV_FILE):
-        print(f"Errore: Il file {CSV_FILE} non esiste. Raccogli prima qualche dato con l'app!")
+    store = _open_feedback_store()
+    if store is None:
         return None
+    df = store.read_since(since_id)
+    store.close()
 
-    # Leggiamo il CSV
-    df = pd.read_csv(CSV_FILE)
+    if since_id and df.empty:
+        print(f"Nessuna nuova correzione dopo l'id {since_id}: il modello è già aggiornato.")
+        return None
 
-    # Filtriamo eventuali righe vuote o incomplete
-    df = df.dropna(subset=['text', 'user_correction'])
+    df = _prepare_corrections(df)
+    if df is None:
+        return None
 
     if len(df) < 5:
         print(f"Attenzione: Hai solo {len(df)} esempi. Il training potrebbe non essere efficace.")
         print("Consiglio: Raccogli almeno 10-20 correzioni prima di lanciare il retraining.")
 
     print(f"Trovati {len(df)} nuovi esempi per il retraining.")
+    return df
 
-    # Mappiamo le etichette stringa (es: 'positive') in ID numerici (es: 2)
-    try:
-        df['label'] = df['user_correction'].apply(lambda x: config.LABEL2ID[x.lower()])
-    except KeyError as e:
-        print(f"Errore nei dati: Trovata un'etichetta non valida nel CSV: {e}")
-        print("Assicurati che il CSV contenga solo 'negative', 'neutral', 'positive'.")
+
+# --- MODALITÀ INCREMENTALE ---
+
+def load_training_state(model_dir=NEW_MODEL_DIR):
+    """
+    Restituisce il watermark dell'ultimo addestramento salvato accanto al modello
+    (es. {"last_correction_id": 120, ...}), oppure None se il modello non esiste o non ne ha uno.
+    """
+    state_path = os.path.join(model_dir, config.RETRAIN_STATE_FILENAME)
+    if not os.path.exists(os.path.join(model_dir, "config.json")) or not os.path.exists(state_path):
         return None
+    with open(state_path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-    return df
+
+def save_training_state(state, model_dir=NEW_MODEL_DIR):
+    # Scrittura atomica: un watermark a metà farebbe ripetere o saltare delle correzioni
+    state_path = os.path.join(model_dir, config.RETRAIN_STATE_FILENAME)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
 
 
-def run_retraining():
+def load_replay_corrections(until_id, sample_size=None):
+    """
+    Campione limitato delle correzioni già usate (id <= until_id), riproposto insieme
+    a quelle nuove per non dimenticare i casi già corretti. Il campione viene estratto
+    direttamente da SQLite, senza leggere tutto l'archivio.
+    """
+    sample_size = config.REPLAY_CORRECTIONS if sample_size is None else sample_size
+    if not sample_size:
+        return None
+
+    store = _open_feedback_store()
+    if store is None:
+        return None
+    old = store.sample_until(until_id, sample_size)
+    store.close()
+
+    if old.empty:
+        return None
+    return _prepare_corrections(old)
+
+
+def tweeteval_replay_features(tokenizer, sample_size=None, seed=None, split="train"):
+    """
+    Campione limitato di uno split di TweetEval, tokenizzato con lo stesso formato
+    della cache delle correzioni. Dal train set limita il catastrophic forgetting sui
+    dati originali; dalla validation fornisce l'eval set del retraining.
+    """
+    from datasets import Dataset
+
+    from src.data_loader import load_sentiment_dataset
+
+    sample_size = config.REPLAY_TWEETEVAL if sample_size is None else sample_size
+    if not sample_size:
+        return None
+
+    data = load_sentiment_dataset()[split]
+    sample = data.shuffle(seed=config.REPLAY_SEED if seed is None else seed)
+    sample = sample.select(range(min(sample_size, len(sample))))
+    features = tokenizer(list(sample['text']), truncation=True)
+    return Dataset.from_dict({
+        "row_id": [-1] * len(sample),
+        "input_ids": features['input_ids'],
+        "attention_mask": features['attention_mask'],
+        "labels": [int(label) for label in sample['label']],
+    })
+
+
+def split_train_eval(new_df, replay_df=None, test_size=0.2):
+    """
+    Divide i dati tra training ed eval. Le correzioni nuove vanno tutte in training:
+    il watermark le supera e non verrebbero più lette dai retraining successivi.
+    L'eval set si ricava solo dal replay (correzioni già addestrate in precedenza).
+
+    Returns:
+        tuple: (DataFrame di training, DataFrame di eval oppure None)
+    """
+    if replay_df is None or replay_df.empty:
+        return new_df, None
+    if len(replay_df) <= 5:
+        return pd.concat([new_df, replay_df], ignore_index=True), None
+
+    replay_train, eval_df = train_test_split(replay_df, test_size=test_size, random_state=42)
+    return pd.concat([new_df, replay_train], ignore_index=True), eval_df
+
+
+def run_retraining(incremental=False):
+    """
+    Esegue il fine-tuning sulle correzioni.
+
+    Args:
+        incremental (bool): Se True, riparte dal modello in ./fine_tuned_model e addestra
+                            solo sulle correzioni successive al watermark salvato con il
+                            modello, più un campione limitato di correzioni precedenti e di
+                            TweetEval (config.REPLAY_CORRECTIONS, config.REPLAY_TWEETEVAL).
+                            Senza un modello con watermark si esegue un retraining completo.
+    """
     print("--- Avvio Pipeline di Retraining ---")
 
+    state = load_training_state() if incremental else None
+    if incremental and state is None:
+        print(f"Nessun modello con watermark in {NEW_MODEL_DIR}: eseguo un retraining completo.")
+        incremental = False
+    since_id = state["last_correction_id"] if incremental else 0
+    if incremental:
+        print(f"Modalità incrementale: correzioni successive all'id {since_id}.")
+
     # 1. Caricamento Dati
-    df = load_corrected_data()
+    df = load_corrected_data(since_id=since_id)
     if df is None:
         return
+    # Il watermark avanza fino all'ultima correzione letta in questo addestramento
+    last_correction_id = max(since_id, int(df['id'].max())) if len(df) else since_id
+    new_examples = len(df)
 
-    # 2. Split Training/Evaluation
-    if len(df) > 5:
-        train_df, eval_df = train_test_split(df, test_size=0.2, random_state=42)
-    else:
-        train_df = df
-        eval_df = df
+    replay = None
+    if incremental:
+        replay = load_replay_corrections(until_id=since_id)
+        if replay is not None and len(replay):
+            print(f"Replay: {len(replay)} correzioni precedenti.")
 
-    train_dataset = Dataset.from_pandas(train_df)
-    eval_dataset = Dataset.from_pandas(eval_df)
+    # 2. Split Training/Evaluation: nessuna correzione nuova resta fuori dal training
+    train_df, eval_df = split_train_eval(df, replay)
 
-    # 3. Preparazione Modello e Tokenizer
-    print(f"Scaricamento modello base: {BASE_MODEL}")
-    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL)
+    # 3. Preparazione Modello e Tokenizer: in modalità incrementale si continua dal modello corrente
+    if incremental:
+        model_source = NEW_MODEL_DIR
+        print(f"Caricamento del modello corrente: {NEW_MODEL_DIR}")
+    else:
+        # Snapshot locale del modello base, se presente (vedi src/artifact_store.py)
+        model_source = resolve_model_path(BASE_MODEL)
+        print(f"Scaricamento modello base: {BASE_MODEL}")
+    tokenizer = AutoTokenizer.from_pretrained(model_source)
     model = AutoModelForSequenceClassification.from_pretrained(
-        BASE_MODEL,
+        model_source,
         num_labels=len(config.LABELS),
         id2label=config.ID2LABEL,
         label2id=config.LABEL2ID
     )
 
-    # Tokenizzazione
-    tokenized_train = train_dataset.map(lambda x: preprocess_function(x, tokenizer), batched=True)
-    tokenized_eval = eval_dataset.map(lambda x: preprocess_function(x, tokenizer), batched=True)
+    # Tokenizzazione: solo le correzioni nuove, le altre vengono lette dalla cache su disco
+    feature_cache = TokenizedFeatureCache(tokenizer)
+    tokenized_train = feature_cache.features_for(train_df)
+    eval_parts = [feature_cache.features_for(eval_df)] if eval_df is not None else []
+
+    if incremental:
+        tweeteval_replay = tweeteval_replay_features(tokenizer)
+        if tweeteval_replay is not None:
+            print(f"Replay: {len(tweeteval_replay)} esempi di TweetEval.")
+            tweeteval_replay = tweeteval_replay.cast(tokenized_train.features)
+            tokenized_train = concatenate_datasets([tokenized_train, tweeteval_replay])
+
+    # Eval set: correzioni di replay tenute da parte più un campione della validation di TweetEval
+    tweeteval_eval = tweeteval_replay_features(tokenizer, sample_size=config.RETRAIN_EVAL_TWEETEVAL,
+                                               split="validation")
+    if tweeteval_eval is not None:
+        eval_parts.append(tweeteval_eval.cast(tokenized_train.features))
+    if eval_parts:
+        tokenized_eval = concatenate_datasets(eval_parts)
+    else:
+        # Senza dati già addestrati né TweetEval si valuta sul training set, come per i dataset minuscoli
+        tokenized_eval = tokenized_train
 
     # 4. Configurazione Training
     training_args = TrainingArguments(
@@ -111,11 +286,13 @@ def run_retraining():
         train_dataset=tokenized_train,
         eval_dataset=tokenized_eval,
         compute_metrics=compute_metrics,
-        tokenizer=tokenizer,
+        processing_class=tokenizer,
+        # Padding dinamico: ogni batch viene allineato al suo testo più lungo
+        data_collator=DataCollatorWithPadding(tokenizer),
     )
 
     # 5. Esecuzione Training
-    print("Inizio addestramento...")
+    print(f"Inizio addestramento su {len(tokenized_train)} esempi...")
     trainer.train()
 
     # 6. Salvataggio
@@ -123,9 +300,27 @@ def run_retraining():
     trainer.save_model(NEW_MODEL_DIR)
     tokenizer.save_pretrained(NEW_MODEL_DIR)
 
+    # 7. Export TorchScript: l'artefatto precedente non corrisponde più ai nuovi pesi
+    export_traced_model(NEW_MODEL_DIR)
+
+    # 8. Watermark: il prossimo retraining incrementale partirà dalle correzioni successive
+    save_training_state({
+        "last_correction_id": last_correction_id,
+        "mode": "incremental" if incremental else "full",
+        "base_model": (state or {}).get("base_model", BASE_MODEL),
+        "trained_at": datetime.now().isoformat(),
+        "new_examples": new_examples,
+        "train_examples": len(tokenized_train),
+    })
+
     print("--- Retraining Completato! ---")
     print("Ora puoi caricare la cartella 'fine_tuned_model' su Hugging Face o usarla localmente.")
 
 
 if __name__ == "__main__":
-    run_retraining()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fine-tuning del modello sulle correzioni degli utenti.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Riparte dal modello fine-tuned e addestra solo sulle correzioni nuove (con replay).")
+    args = parser.parse_args()
+
+    run_retraining(incremental=args.incremental)
\ No newline at end of file
@@ -0,0 +1,263 @@
+# score_file.py
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from queue import Queue
+
+import pandas as pd
+
+from src import config
+from src.bulk_inference import compute_token_lengths, predict_sorted_by_length
+from src.dedup import dedup_plan
+from src.model import load_sentiment_pipeline
+
+# Segnale di fine stream tra gli stadi della pipeline
+_END = object()
+
+
+# --- 1. LETTURA A BLOCCHI ---
+
+def _iter_csv(path, text_column, id_column, chunk_size, skip_rows):
+    columns = [text_column] + ([id_column] if id_column else [])
+    reader = pd.read_csv(path, usecols=columns, chunksize=chunk_size,
+                         skiprows=range(1, skip_rows + 1), dtype={text_column: str})
+    for chunk in reader:
+        yield chunk
+
+
+def _iter_jsonl(path, text_column, id_column, chunk_size, skip_rows):
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            # Le righe già elaborate vengono saltate senza fare il parsing del JSON
+            if line_number < skip_rows:
+                continue
+            record = json.loads(line)
+            rows.append({column: record.get(column) for column in [text_column, id_column] if column})
+            if len(rows) >= chunk_size:
+                yield pd.DataFrame(rows)
+                rows = []
+    if rows:
+        yield pd.DataFrame(rows)
+
+
+def _iter_parquet(path, text_column, id_column, chunk_size, skip_rows):
+    import pyarrow.parquet as pq
+
+    columns = [text_column] + ([id_column] if id_column else [])
+    rows_seen = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+        if rows_seen + batch.num_rows <= skip_rows:
+            rows_seen += batch.num_rows
+            continue
+        offset = max(0, skip_rows - rows_seen)
+        rows_seen += batch.num_rows
+        yield batch.slice(offset).to_pandas()
+
+
+def iter_input_chunks(path, text_column="text", id_column=None, chunk_size=None, skip_rows=0):
+    """
+    Legge il file di input (CSV, JSONL o Parquet) a blocchi di `chunk_size` righe,
+    saltando le prime `skip_rows` righe già elaborate. La memoria usata dipende
+    dalla dimensione del blocco, non da quella del file.
+    """
+    chunk_size = chunk_size or config.SCORING_CHUNK_SIZE
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == ".csv":
+        return _iter_csv(path, text_column, id_column, chunk_size, skip_rows)
+    if extension in (".jsonl", ".ndjson"):
+        return _iter_jsonl(path, text_column, id_column, chunk_size, skip_rows)
+    if extension in (".parquet", ".pq"):
+        return _iter_parquet(path, text_column, id_column, chunk_size, skip_rows)
+    raise ValueError(f"Formato di input non supportato: '{extension}' (usare .csv, .jsonl o .parquet)")
+
+
+# --- 2. CHECKPOINT ---
+
+def checkpoint_path(output_path):
+    return output_path + ".checkpoint.json"
+
+
+def load_checkpoint(output_path):
+    """Restituisce (righe già elaborate, byte validi del file di output)."""
+    path = checkpoint_path(output_path)
+    if not os.path.exists(path):
+        return 0, 0
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    return state["rows_done"], state["output_bytes"]
+
+
+def save_checkpoint(output_path, rows_done, output_bytes):
+    # Scrittura atomica: un crash durante il salvataggio non corrompe il checkpoint
+    path = checkpoint_path(output_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"rows_done": rows_done, "output_bytes": output_bytes}, f)
+    os.replace(tmp_path, path)
+
+
+# --- 3. SCRITTURA INCREMENTALE ---
+
+def _write_chunk(output_file, output_format, records, write_header):
+    if output_format == "jsonl":
+        for record in records:
+            output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return
+
+    writer = csv.DictWriter(output_file, fieldnames=list(records[0].keys()))
+    if write_header:
+        writer.writeheader()
+    writer.writerows(records)
+
+
+# --- 4. PIPELINE DI SCORING ---
+
+def score_file(sentiment_pipeline, input_path, output_path, text_column="text", id_column=None,
+               chunk_size=None, batch_size=None, resume=True, dedup=False):
+    """
+    Assegna il sentiment a tutte le righe di un file, in streaming.
+
+    Tre stadi lavorano in parallelo collegati da code limitate:
+    lettura + pre-tokenizzazione, inferenza (batch ordinati per lunghezza) e scrittura.
+    Dopo ogni blocco scritto viene salvato un checkpoint: se il processo si interrompe,
+    una nuova esecuzione riparte dalla prima riga non ancora elaborata.
+
+    Con `dedup=True` i testi quasi identici di ogni blocco (stesso testo con link,
+    menzioni o maiuscole diverse) vengono valutati una volta sola e il risultato
+    viene riportato a tutte le righe del cluster.
+    """
+    output_format = "jsonl" if output_path.endswith((".jsonl", ".ndjson")) else "csv"
+
+    rows_done, output_bytes = load_checkpoint(output_path) if resume else (0, 0)
+    if rows_done:
+        print(f"Ripresa dal checkpoint: {rows_done} righe già elaborate.")
+    # Eventuali righe scritte dopo l'ultimo checkpoint vengono scartate e ricalcolate
+    with open(output_path, "a", encoding="utf-8") as f:
+        f.truncate(output_bytes)
+
+    read_queue = Queue(maxsize=config.SCORING_QUEUE_SIZE)
+    write_queue = Queue(maxsize=config.SCORING_QUEUE_SIZE)
+    errors = []
+
+    def reader():
+        try:
+            for chunk in iter_input_chunks(input_path, text_column, id_column, chunk_size, skip_rows=rows_done):
+                texts = chunk[text_column].fillna("").astype(str).tolist()
+                # Un testo per cluster di quasi duplicati (calcolato qui, in parallelo all'inferenza)
+                positions, inverse = dedup_plan(texts) if dedup else (None, None)
+                unique_texts = texts if positions is None else [texts[i] for i in positions]
+                lengths = compute_token_lengths(sentiment_pipeline, unique_texts)
+                read_queue.put((chunk, texts, unique_texts, inverse, lengths))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            read_queue.put(_END)
+
+    def writer():
+        nonlocal rows_done
+        with open(output_path, "a", newline="", encoding="utf-8") as f:
+            while True:
+                records = write_queue.get()
+                if records is _END:
+                    return
+                # Dopo un errore si continua a svuotare la coda per non bloccare l'inferenza
+                if errors:
+                    continue
+                try:
+                    _write_chunk(f, output_format, records, write_header=(f.tell() == 0))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    rows_done += len(records)
+                    save_checkpoint(output_path, rows_done, f.tell())
+                except Exception as e:
+                    errors.append(e)
+
+    reader_thread = threading.Thread(target=reader, name="score-reader", daemon=True)
+    writer_thread = threading.Thread(target=writer, name="score-writer", daemon=True)
+    reader_thread.start()
+    writer_thread.start()
+
+    start_time = time.perf_counter()
+    scored = 0
+    inferred = 0
+    row_number = rows_done
+    try:
+        while True:
+            item = read_queue.get()
+            if item is _END or errors:
+                break
+            chunk, texts, unique_texts, inverse, lengths = item
+            outputs, _ = predict_sorted_by_length(sentiment_pipeline, unique_texts, batch_size=batch_size,
+                                                  lengths=lengths)
+            inferred += len(unique_texts)
+            if inverse is not None:
+                outputs = [outputs[i] for i in inverse]
+
+            records = []
+            ids = chunk[id_column].tolist() if id_column else [None] * len(texts)
+            for row_id, output in zip(ids, outputs):
+                record = {"row": row_number}
+                if id_column:
+                    record[id_column] = row_id
+                record["label"] = output['label'].lower()
+                record["score"] = output['score']
+                records.append(record)
+                row_number += 1
+
+            write_queue.put(records)
+            scored += len(records)
+            elapsed = time.perf_counter() - start_time
+            print(f"  {row_number} righe elaborate ({scored / elapsed:.1f} testi/sec)")
+    finally:
+        write_queue.put(_END)
+        writer_thread.join()
+
+    if errors:
+        raise errors[0]
+
+    if dedup and scored:
+        print(f"Deduplicazione: {inferred} testi valutati dal modello su {scored} righe.")
+    print(f"✅ Scoring completato: {row_number} righe in '{output_path}'.")
+    return row_number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoring del sentiment in streaming su file di grandi dimensioni.")
+    parser.add_argument("input", help="File di input (.csv, .jsonl o .parquet)")
+    parser.add_argument("output", help="File di output (.csv o .jsonl)")
+    parser.add_argument("--text-column", default="text", help="Colonna con il testo da analizzare.")
+    parser.add_argument("--id-column", default=None, help="Colonna identificativa da riportare nell'output.")
+    parser.add_argument("--chunk-size", type=int, default=config.SCORING_CHUNK_SIZE,
+                        help="Righe lette e scritte per ogni blocco.")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Dimensione dei batch di inferenza (default: quella del profilo di esecuzione).")
+    parser.add_argument("--model", default=None, help="Percorso o nome del modello (default: fine-tuned se presente).")
+    parser.add_argument("--no-resume", action="store_true", help="Ignora il checkpoint e riparte da zero.")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Valuta una sola volta i testi quasi identici di ogni blocco.")
+    args = parser.parse_args()
+
+    model_to_use = args.model
+    local_model_path = "./fine_tuned_model"
+    if model_to_use is None and os.path.isdir(local_model_path) and "config.json" in os.listdir(local_model_path):
+        model_to_use = os.path.abspath(local_model_path)
+        print(f"Trovato modello locale: {model_to_use}")
+
+    if args.no_resume and os.path.exists(checkpoint_path(args.output)):
+        os.remove(checkpoint_path(args.output))
+
+    sentiment_pipeline = load_sentiment_pipeline(device="cpu", model_name=model_to_use,
+                                                  profile=config.RUNTIME_PROFILE_BATCH)
+    score_file(sentiment_pipeline, args.input, args.output, text_column=args.text_column,
+               id_column=args.id_column, chunk_size=args.chunk_size, batch_size=args.batch_size,
+               resume=not args.no_resume, dedup=args.dedup)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+# src/artifact_store.py
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from src import config
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def _sha256_file(path, block_size=1 << 20):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _hash_directory(directory):
+    """
+    Restituisce (hash del contenuto, {percorso relativo: {"size", "sha256"}}).
+    L'hash dipende solo da nomi e contenuto dei file, non da date o percorsi assoluti.
+    """
+    files = {}
+    for root, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            path = os.path.join(root, file_name)
+            relative = os.path.relpath(path, directory).replace(os.sep, "/")
+            files[relative] = {"size": os.path.getsize(path), "sha256": _sha256_file(path)}
+
+    hasher = hashlib.sha256()
+    for relative in sorted(files):
+        hasher.update(f"{relative}\x00{files[relative]['sha256']}\n".encode("utf-8"))
+    return hasher.hexdigest(), files
+
+
+def _safe_name(key):
+    return key.replace("/", "__")
+
+
+class ArtifactStore:
+    """
+    Archivio locale di snapshot di dataset e modelli, indicizzato da un manifest.
+
+    Ogni snapshot è una cartella il cui nome è l'hash del contenuto
+    (`<store>/<tipo>/<nome>/<hash>/`); il manifest registra per ogni nome lo snapshot
+    corrente con dimensione e SHA-256 di ogni file. I dataset sono salvati in formato
+    Arrow e vengono riaperti in memory-map (nessuna copia in memoria); i modelli sono
+    salvati con `save_pretrained` e caricati come una normale cartella locale.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or config.ARTIFACT_STORE_DIR
+        self.manifest_path = os.path.join(self.root, MANIFEST_FILENAME)
+
+    # --- MANIFEST ---
+
+    def manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"datasets": {}, "models": {}}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def entry(self, kind, key):
+        return self.manifest()[kind].get(key)
+
+    def path(self, kind, key):
+        """Cartella dello snapshot corrente, oppure None se non esiste."""
+        entry = self.entry(kind, key)
+        if entry is None:
+            return None
+        path = os.path.join(self.root, entry["path"])
+        return path if os.path.isdir(path) else None
+
+    # --- SCRITTURA ---
+
+    def _commit(self, kind, key, write_fn, source):
+        """Scrive lo snapshot in una cartella temporanea, lo rinomina col suo hash e aggiorna il manifest."""
+        kind_dir = os.path.join(self.root, kind, _safe_name(key))
+        os.makedirs(kind_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=kind_dir, prefix=".tmp-")
+        try:
+            write_fn(tmp_dir)
+            content_hash, files = _hash_directory(tmp_dir)
+            final_dir = os.path.join(kind_dir, content_hash[:16])
+            if os.path.isdir(final_dir):
+                # Contenuto identico già presente: lo snapshot esistente resta valido
+                shutil.rmtree(tmp_dir)
+            else:
+                os.rename(tmp_dir, final_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        manifest = self.manifest()
+        previous = manifest[kind].get(key)
+        manifest[kind][key] = {
+            "path": os.path.relpath(final_dir, self.root).replace(os.sep, "/"),
+            "sha256": content_hash,
+            "source": source,
+            "created_at": datetime.now().isoformat(),
+            "files": files,
+        }
+        self._save_manifest(manifest)
+
+        # Lo snapshot precedente non è più referenziato dal manifest
+        if previous is not None and previous["sha256"] != content_hash:
+            shutil.rmtree(os.path.join(self.root, previous["path"]), ignore_errors=True)
+        return manifest[kind][key]
+
+    def snapshot_dataset(self, name=None, subset=None):
+        """Scarica il dataset dal Hub e ne salva uno snapshot Arrow nell'archivio."""
+        from datasets import load_dataset
+
+        name = name or config.DATASET_NAME
+        subset = subset or config.DATASET_SUBSET
+        key = f"{name}/{subset}"
+        print(f"Snapshot del dataset '{key}'...")
+        dataset = load_dataset(name, subset)
+        entry = self._commit("datasets", key, dataset.save_to_disk, source="huggingface-hub")
+        print(f"✅ Dataset salvato in '{entry['path']}' ({entry['sha256'][:16]}).")
+        return entry
+
+    def snapshot_model(self, model_name=None):
+        """Salva nell'archivio pesi, configurazione e tokenizer del modello (dal Hub o da una cartella)."""
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        model_name = model_name or config.MODEL_NAME
+        print(f"Snapshot del modello '{model_name}'...")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+
+        def write(directory):
+            model.save_pretrained(directory)
+            tokenizer.save_pretrained(directory)
+
+        source = "local" if os.path.isdir(model_name) else "huggingface-hub"
+        entry = self._commit("models", model_name, write, source=source)
+        print(f"✅ Modello salvato in '{entry['path']}' ({entry['sha256'][:16]}).")
+        return entry
+
+    # --- VERIFICA ---
+
+    def verify(self, kind, key, full=False):
+        """
+        Controlla che i file dello snapshot corrispondano al manifest.
+        Il controllo rapido confronta solo le dimensioni; con `full=True` ricalcola gli SHA-256.
+
+        Returns:
+            list[str]: Problemi trovati (lista vuota se lo snapshot è integro).
+        """
+        entry = self.entry(kind, key)
+        if entry is None:
+            return [f"{kind}/{key}: assente dal manifest"]
+
+        directory = os.path.join(self.root, entry["path"])
+        problems = []
+        for relative, expected in entry["files"].items():
+            path = os.path.join(directory, relative)
+            if not os.path.exists(path):
+                problems.append(f"{relative}: mancante")
+            elif os.path.getsize(path) != expected["size"]:
+                problems.append(f"{relative}: dimensione diversa dal manifest")
+            elif full and _sha256_file(path) != expected["sha256"]:
+                problems.append(f"{relative}: contenuto diverso dal manifest")
+        return problems
+
+
+# --- RISOLUZIONE PER I LOADER ---
+
+def _mode():
+    mode = config.ARTIFACT_STORE_MODE
+    if mode not in ("off", "prefer", "offline"):
+        raise ValueError(f"ARTIFACT_STORE_MODE non valido: '{mode}' (usare 'off', 'prefer' o 'offline').")
+    return mode
+
+
+def _resolve(kind, key, store):
+    """Percorso dello snapshot locale da usare, None per il Hub; in modalità offline lo snapshot è obbligatorio."""
+    mode = _mode()
+    if mode == "off":
+        return None
+
+    store = store or ArtifactStore()
+    path = store.path(kind, key)
+    if path is not None:
+        problems = store.verify(kind, key)
+        if problems:
+            raise RuntimeError(f"Snapshot '{key}' danneggiato: {'; '.join(problems)}. "
+                               "Ricrearlo con: python -m src.artifact_store snapshot")
+        return path
+    if mode == "offline":
+        raise FileNotFoundError(
+            f"Modalità offline: nessuno snapshot di '{key}' in '{store.root}'. "
+            "Crearlo (con accesso alla rete) con: python -m src.artifact_store snapshot"
+        )
+    return None
+
+
+def resolve_model_path(model_name, store=None):
+    """
+    Restituisce il percorso da passare a `from_pretrained`: lo snapshot locale del
+    modello se presente, altrimenti il nome originale. Le cartelle locali (es. il
+    modello fine-tuned) sono già offline e vengono restituite invariate.
+    """
+    if os.path.isdir(model_name):
+        return model_name
+    return _resolve("models", model_name, store) or model_name
+
+
+def load_dataset_snapshot(name=None, subset=None, store=None):
+    """
+    Apre in memory-map lo snapshot del dataset, oppure restituisce None se va usato il Hub.
+    """
+    key = f"{name or config.DATASET_NAME}/{subset or config.DATASET_SUBSET}"
+    path = _resolve("datasets", key, store)
+    if path is None:
+        return None
+
+    from datasets import load_from_disk
+
+    start = time.perf_counter()
+    dataset = load_from_disk(path)
+    print(f"📦 Dataset '{key}' aperto dallo snapshot locale in {time.perf_counter() - start:.2f}s.")
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivio locale di snapshot di dataset e modelli.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="Crea o aggiorna gli snapshot (richiede la rete).")
+    snapshot_parser.add_argument("--model", action="append", default=None,
+                                 help="Modello da salvare (ripetibile). Default: modello base di config.")
+    snapshot_parser.add_argument("--skip-dataset", action="store_true", help="Non salvare il dataset.")
+
+    subparsers.add_parser("list", help="Mostra gli snapshot presenti nel manifest.")
+
+    verify_parser = subparsers.add_parser("verify", help="Verifica gli snapshot rispetto al manifest.")
+    verify_parser.add_argument("--full", action="store_true", help="Ricalcola gli SHA-256 di tutti i file.")
+
+    parser.add_argument("--store", default=None, help="Cartella dell'archivio (default: config.ARTIFACT_STORE_DIR).")
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.store)
+    if args.command == "snapshot":
+        if not args.skip_dataset:
+            store.snapshot_dataset()
+        for model_name in args.model or [config.MODEL_NAME]:
+            store.snapshot_model(model_name)
+        return
+
+    manifest = store.manifest()
+    if args.command == "list":
+        for kind in ("datasets", "models"):
+            for key, entry in manifest[kind].items():
+                size_mb = sum(f["size"] for f in entry["files"].values()) / 1e6
+                print(f"{kind[:-1]:<8} {key:<55} {entry['sha256'][:16]}  {size_mb:8.1f} MB  {entry['created_at']}")
+        return
+
+    failures = 0
+    for kind in ("datasets", "models"):
+        for key in manifest[kind]:
+            problems = store.verify(kind, key, full=args.full)
+            failures += bool(problems)
+            print(f"{'✅' if not problems else '❌'} {kind[:-1]} {key}" + "".join(f"\n   {p}" for p in problems))
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# src/async_inference.py
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from src import config
+
+
+class RequestShed(Exception):
+    """Richiesta rifiutata per sovraccarico (equivalente a HTTP 429): il client deve riprovare più tardi."""
+
+    status_code = 429
+
+    def __init__(self, reason):
+        super().__init__(f"Servizio sovraccarico ({reason}), riprovare più tardi.")
+        self.reason = reason
+
+
+class DeadlineExceeded(Exception):
+    """La richiesta non è stata completata entro la sua scadenza (equivalente a HTTP 504)."""
+
+    status_code = 504
+
+
+def validate_deadline_ms(deadline_ms):
+    """Controlla una scadenza arrivata con una richiesta: numero positivo non oltre config.ASYNC_MAX_DEADLINE_MS."""
+    upper = config.ASYNC_MAX_DEADLINE_MS
+    if (not isinstance(deadline_ms, (int, float)) or isinstance(deadline_ms, bool)
+            or not 0 < deadline_ms <= upper):
+        raise ValueError(f"deadline_ms non valido: {deadline_ms!r} (numero maggiore di 0 e non oltre {upper}).")
+
+
+class AsyncInferenceService:
+    """
+    API asyncio per l'inferenza con controllo di ammissione e scarico del carico.
+
+    Al massimo `max_concurrency` richieste vengono eseguite insieme (in un pool di
+    thread, dove il micro-batcher le raggruppa); le altre aspettano in una coda di
+    ammissione limitata a `max_queue` posti. Una richiesta viene rifiutata subito con
+    RequestShed se la coda è piena, o dopo `queue_budget_ms` se non è ancora partita:
+    meglio un errore immediato che una latenza senza limiti.
+
+    Ogni richiesta ha una scadenza complessiva (DeadlineExceeded). Se il chiamante
+    viene cancellato (es. il client si è disconnesso) mentre la richiesta è in coda,
+    la richiesta non arriva mai al modello.
+    """
+
+    def __init__(self, predict_fn, max_concurrency=None, max_queue=None, queue_budget_ms=None,
+                 deadline_ms=None, metrics=None):
+        """
+        Args:
+            predict_fn (callable): Funzione sincrona testo -> predizione.
+            max_concurrency (int, optional): Default: letto da config a ogni richiesta (vedi `max_concurrency`).
+            max_queue (int, optional): Posti nella coda di ammissione. Default: config.ASYNC_MAX_QUEUE.
+            queue_budget_ms (float, optional): Attesa massima in coda. Default: config.ASYNC_QUEUE_BUDGET_MS.
+            deadline_ms (float, optional): Scadenza predefinita. Default: config.ASYNC_DEADLINE_MS.
+            metrics (Metrics, optional): Registro in cui contare richieste rifiutate e scadute.
+        """
+        self.predict_fn = predict_fn
+        self._max_concurrency = max_concurrency
+        self.max_queue = max_queue if max_queue is not None else config.ASYNC_MAX_QUEUE
+        self.queue_budget = (queue_budget_ms or config.ASYNC_QUEUE_BUDGET_MS) / 1000.0
+        self.deadline = (deadline_ms or config.ASYNC_DEADLINE_MS) / 1000.0
+        self.metrics = metrics
+
+        # Creato al primo utilizzo e ingrandito se il limite cresce
+        self._executor = None
+        self._executor_size = 0
+        # Richieste in attesa di un posto, in ordine di arrivo (Future dell'event loop)
+        self._waiters = deque()
+        self._waiting = 0
+        self._running = 0
+        self._counters = {"completed": 0, "shed": 0, "deadline_exceeded": 0, "cancelled": 0}
+
+    def _count(self, outcome, **labels):
+        self._counters[outcome] += 1
+        if self.metrics is not None:
+            self.metrics.inc("async_requests", outcome=outcome, **labels)
+
+    async def predict(self, text, deadline_ms=None, **options):
+        """
+        Restituisce la predizione per `text`. Le `options` (es. max_tokens) vengono
+        passate a `predict_fn`.
+
+        Raises:
+            RequestShed: Coda di ammissione piena o attesa oltre il budget.
+            DeadlineExceeded: Scadenza della richiesta superata.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = self.deadline if deadline_ms is None else deadline_ms / 1000.0
+        expires_at = loop.time() + deadline
+
+        # --- Ammissione ---
+        # Il limite può essere cresciuto (es. profilo di esecuzione applicato al caricamento del modello)
+        self._admit_waiters()
+        if not self._waiters and self._running < self.max_concurrency:
+            # Posto libero e nessuno in attesa prima di questa richiesta
+            self._running += 1
+        else:
+            if self._waiting >= self.max_queue:
+                self._count("shed", reason="queue_full")
+                raise RequestShed("coda piena")
+
+            wait_timeout = min(self.queue_budget, deadline)
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            self._waiting += 1
+            try:
+                # Il posto viene assegnato (e contato in _running) da _admit_waiters
+                await asyncio.wait_for(waiter, timeout=wait_timeout)
+            except asyncio.TimeoutError:
+                self._abandon(waiter)
+                if wait_timeout < self.queue_budget:
+                    self._count("deadline_exceeded")
+                    raise DeadlineExceeded("Scadenza superata prima dell'esecuzione.")
+                self._count("shed", reason="queue_timeout")
+                raise RequestShed("attesa in coda oltre il budget")
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                self._count("cancelled")
+                raise
+            finally:
+                self._waiting -= 1
+
+        # --- Esecuzione ---
+        self._ensure_executor()
+        future = loop.run_in_executor(self._executor, partial(self.predict_fn, text, **options))
+        # Il posto si libera quando il lavoro è davvero finito, anche se il chiamante non aspetta più
+        future.add_done_callback(self._release_slot)
+        try:
+            # shield: il thread non può essere interrotto, quindi la scadenza smette solo di attenderlo
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=max(0.0, expires_at - loop.time()))
+        except asyncio.TimeoutError:
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded("Scadenza superata durante l'inferenza.")
+        except asyncio.CancelledError:
+            self._count("cancelled")
+            raise
+        self._count("completed")
+        return result
+
+    @property
+    def max_concurrency(self):
+        """
+        Richieste eseguite insieme. Se non è stato fissato nel costruttore viene letto da
+        config a ogni ammissione: config.ASYNC_MAX_CONCURRENCY o, se None, config.BATCH_MAX_SIZE,
+        che un profilo di esecuzione cambia quando il modello viene caricato (dopo la
+        creazione del servizio).
+        """
+        return self._max_concurrency or config.ASYNC_MAX_CONCURRENCY or config.BATCH_MAX_SIZE
+
+    def _admit_waiters(self):
+        """Assegna i posti liberi alle richieste in attesa, in ordine di arrivo."""
+        while self._waiters and self._running < self.max_concurrency:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue  # Richiesta già scaduta o cancellata
+            self._running += 1
+            waiter.set_result(None)
+
+    def _abandon(self, waiter):
+        """Toglie dalla coda una richiesta che rinuncia, restituendo il posto se le era già stato assegnato."""
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        if waiter.done() and not waiter.cancelled():
+            self._release_slot()
+
+    def _ensure_executor(self):
+        """Thread sufficienti per il limite di concorrenza corrente."""
+        limit = self.max_concurrency
+        if limit <= self._executor_size:
+            return
+        previous = self._executor
+        self._executor = ThreadPoolExecutor(limit, thread_name_prefix="async-inference")
+        self._executor_size = limit
+        if previous is not None:
+            # Le predizioni già avviate terminano sui thread del vecchio pool
+            previous.shutdown(wait=False)
+
+    def _release_slot(self, future=None):
+        self._running -= 1
+        self._admit_waiters()
+
+    def stats(self):
+        return {
+            **self._counters,
+            "waiting": self._waiting,
+            "running": self._running,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+async def run_until_disconnected(coroutine, is_disconnected, poll_interval_s=0.05):
+    """
+    Esegue `coroutine` e la cancella se `is_disconnected()` (funzione async, es.
+    `request.is_disconnected` di Starlette) diventa vera prima della fine.
+    Restituisce None se il client si è disconnesso.
+    """
+    task = asyncio.ensure_future(coroutine)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=poll_interval_s)
+        if done:
+            return task.result()
+        if await is_disconnected():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            return None
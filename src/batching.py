@@ -0,0 +1,195 @@
+# src/batching.py
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+from src import config
+
+
+class MicroBatcher:
+    """
+    Scheduler di micro-batching da mettere davanti alla pipeline di sentiment.
+
+    Le richieste in arrivo (una per handler Gradio) vengono accodate e un thread
+    dedicato le raggruppa in un unico batch, che viene inviato alla pipeline
+    quando si raggiunge la dimensione massima oppure scade il tempo di attesa.
+    Ogni chiamante riceve indietro solo il proprio risultato.
+
+    L'oggetto è compatibile con la chiamata della pipeline originale:
+    `batcher("testo")` e `batcher(["a", "b"])` restituiscono una lista di dict.
+    """
+
+    def __init__(self, sentiment_pipeline, max_batch_size=None, max_wait_ms=None, metrics=None,
+                 pipeline_kwargs=None):
+        """
+        Args:
+            sentiment_pipeline: La pipeline restituita da `load_sentiment_pipeline`.
+            max_batch_size (int, optional): Numero massimo di testi per batch.
+                                            Se None, usa config.BATCH_MAX_SIZE.
+            max_wait_ms (float, optional): Attesa massima (in ms) dal primo testo
+                                           accodato prima di forzare il flush.
+                                           Se None, usa config.BATCH_MAX_WAIT_MS.
+            metrics (Metrics, optional): Registro in cui misurare la durata di ogni
+                                         chiamata alla pipeline (stage="pipeline").
+            pipeline_kwargs (dict, optional): Parametri aggiuntivi passati alla pipeline a ogni
+                                              batch (es. {"top_k": None} per la distribuzione
+                                              completa delle classi).
+        """
+        self.pipeline = sentiment_pipeline
+        self.max_batch_size = max_batch_size or config.BATCH_MAX_SIZE
+        if max_wait_ms is None:
+            max_wait_ms = config.BATCH_MAX_WAIT_MS
+        self.max_wait = max_wait_ms / 1000.0
+        self.metrics = metrics
+        self.pipeline_kwargs = dict(pipeline_kwargs or {})
+
+        self._queue = Queue()
+        # Protegge `_closed`: nessun testo può essere accodato dopo il segnale di stop
+        self._close_lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._batch_size_hist = Counter()
+        self._queue_depth_hist = Counter()
+        self._requests = 0
+        self._batches = 0
+
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    # --- API PUBBLICA ---
+
+    def submit(self, text):
+        """
+        Accoda un singolo testo e restituisce un Future con il risultato (dict).
+
+        Raises:
+            RuntimeError: Se il batcher è già stato chiuso.
+        """
+        future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher chiuso: impossibile accodare nuove richieste.")
+            self._queue.put((text, future))
+        return future
+
+    def predict(self, text, timeout=None):
+        """Accoda un testo e attende il risultato (bloccante)."""
+        return self.submit(text).result(timeout=timeout)
+
+    def __call__(self, inputs, **kwargs):
+        """Interfaccia compatibile con la pipeline: accetta una stringa o una lista."""
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def stats(self):
+        """
+        Restituisce le statistiche correnti del batcher:
+        profondità della coda e istogrammi di dimensione dei batch e della coda.
+        """
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": self._batches,
+                "avg_batch_size": (self._requests / self._batches) if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_size_hist.items())),
+                "queue_depth_histogram": dict(sorted(self._queue_depth_hist.items())),
+            }
+
+    def close(self, timeout=None):
+        """Ferma il thread di batching dopo aver smaltito le richieste già in coda."""
+        with self._close_lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+        self._worker.join(timeout=timeout)
+
+    # --- LOGICA INTERNA ---
+
+    def _collect_batch(self, first_item):
+        """Raccoglie testi finché il batch è pieno o la deadline è scaduta."""
+        batch = [first_item]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            if item is None:
+                # Rimettiamo il segnale di stop in coda: verrà gestito dal loop principale
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = self._collect_batch(item)
+
+            # Scartiamo le richieste annullate dal chiamante prima della forward pass
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self._stats_lock:
+                self._requests += len(batch)
+                self._batches += 1
+                self._batch_size_hist[len(batch)] += 1
+                self._queue_depth_hist[self._queue.qsize()] += 1
+
+            texts = [text for text, _ in batch]
+            futures = [future for _, future in batch]
+
+            submit_batch = getattr(self.pipeline, 'submit_batch', None)
+            if submit_batch is not None:
+                # Pool di worker: il batch viene inviato senza attendere, così il
+                # thread può già raccogliere il batch successivo per un altro worker
+                start = time.perf_counter()
+                batch_future = submit_batch(texts, truncation=True, **self.pipeline_kwargs)
+                batch_future.add_done_callback(
+                    lambda done, futures=futures, start=start: self._on_batch_done(futures, start, done)
+                )
+                continue
+
+            start = time.perf_counter()
+            try:
+                # Un'unica forward pass: la pipeline fa il padding al testo più lungo del batch.
+                # I testi oltre la lunghezza massima del modello vengono troncati, come nell'inferenza in blocco
+                outputs = self.pipeline(texts, batch_size=len(texts), truncation=True, **self.pipeline_kwargs)
+            except Exception as e:
+                self._dispatch(futures, e, None)
+                continue
+            self._observe_pipeline(start)
+            self._dispatch(futures, None, outputs)
+
+    def _observe_pipeline(self, start):
+        if self.metrics is not None:
+            self.metrics.observe("stage_seconds", time.perf_counter() - start, stage="pipeline")
+
+    def _on_batch_done(self, futures, start, done):
+        self._observe_pipeline(start)
+        self._dispatch(futures, done.exception(), None if done.exception() else done.result())
+
+    @staticmethod
+    def _dispatch(futures, error, outputs):
+        """Restituisce a ogni chiamante il proprio risultato (o l'errore del batch)."""
+        if error is not None:
+            for future in futures:
+                future.set_exception(error)
+            return
+
+        for future, output in zip(futures, outputs):
+            future.set_result(output)
@@ -0,0 +1,145 @@
+# src/bulk_inference.py
+
+import time
+import numpy as np
+
+from src import config
+from src.scoring import class_probabilities, distributions_to_array
+
+
+def compute_token_lengths(sentiment_pipeline, texts):
+    """
+    Pre-tokenizza i testi e restituisce il numero di token di ciascuno.
+    Se la pipeline non espone un tokenizer, usa il numero di parole come stima.
+    """
+    tokenizer = getattr(sentiment_pipeline, 'tokenizer', None)
+    if tokenizer is None:
+        return np.array([len(text.split()) + 2 for text in texts])
+
+    encodings = tokenizer(texts, truncation=True)
+    return np.array([len(ids) for ids in encodings['input_ids']])
+
+
+def padding_waste(lengths, batch_size):
+    """
+    Calcola la frazione di token di padding che si avrebbe processando
+    le lunghezze nell'ordine dato, a batch di `batch_size` elementi.
+    """
+    padded_total = 0
+    real_total = 0
+    for start in range(0, len(lengths), batch_size):
+        batch = lengths[start:start + batch_size]
+        padded_total += len(batch) * int(batch.max())
+        real_total += int(batch.sum())
+
+    if padded_total == 0:
+        return 0.0
+    return 1.0 - real_total / padded_total
+
+
+def _length_sorted_batches(sentiment_pipeline, texts, batch_size, lengths):
+    """Restituisce (lunghezze, ordine, indici di ogni batch, testi di ogni batch) ordinati per lunghezza."""
+    if lengths is None:
+        lengths = compute_token_lengths(sentiment_pipeline, texts)
+    lengths = np.asarray(lengths)
+    # Ordinamento stabile: a parità di lunghezza si mantiene l'ordine originale
+    order = np.argsort(lengths, kind="stable")
+
+    batches_indices = [order[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    batches_texts = [[texts[i] for i in batch_indices] for batch_indices in batches_indices]
+    return lengths, order, batches_indices, batches_texts
+
+
+def _inference_stats(texts, start_time, lengths, order, batch_size):
+    elapsed = time.perf_counter() - start_time
+    return {
+        "texts": len(texts),
+        "seconds": elapsed,
+        "texts_per_sec": len(texts) / elapsed if elapsed > 0 else 0.0,
+        "padding_waste": padding_waste(lengths[order], batch_size),
+        "padding_waste_unsorted": padding_waste(lengths, batch_size),
+    }
+
+
+_EMPTY_STATS = {"texts": 0, "texts_per_sec": 0.0, "padding_waste": 0.0, "padding_waste_unsorted": 0.0}
+
+
+def predict_sorted_by_length(sentiment_pipeline, texts, batch_size=None, lengths=None):
+    """
+    Esegue l'inferenza in blocco raggruppando i testi per lunghezza.
+
+    I testi vengono ordinati per numero di token, processati a batch di lunghezza
+    simile (così il padding è minimo) e le predizioni vengono riportate
+    nell'ordine originale: l'output è identico a `sentiment_pipeline(texts)`.
+
+    Args:
+        sentiment_pipeline: La pipeline restituita da `load_sentiment_pipeline`.
+        texts (list[str]): I testi da classificare.
+        batch_size (int, optional): Dimensione dei batch. Se None, usa config.BULK_BATCH_SIZE.
+        lengths (array, optional): Lunghezze in token già calcolate (es. da uno stadio di
+                                   pre-tokenizzazione in parallelo). Se None, vengono calcolate qui.
+
+    Returns:
+        tuple: (lista di dict {'label', 'score'} nell'ordine originale, dict di statistiche)
+    """
+    batch_size = batch_size or config.BULK_BATCH_SIZE
+    texts = list(texts)
+    if not texts:
+        return [], dict(_EMPTY_STATS)
+
+    start_time = time.perf_counter()
+    lengths, order, batches_indices, batches_texts = _length_sorted_batches(
+        sentiment_pipeline, texts, batch_size, lengths
+    )
+
+    run_batches = getattr(sentiment_pipeline, 'run_batches', None)
+    if run_batches is not None:
+        # Pool di worker: tutti i batch vengono distribuiti in parallelo
+        batches_outputs = run_batches(batches_texts, truncation=True)
+    else:
+        batches_outputs = [
+            sentiment_pipeline(batch_texts, batch_size=len(batch_texts), truncation=True)
+            for batch_texts in batches_texts
+        ]
+
+    outputs = [None] * len(texts)
+    for batch_indices, batch_outputs in zip(batches_indices, batches_outputs):
+        for index, output in zip(batch_indices, batch_outputs):
+            outputs[index] = output
+
+    return outputs, _inference_stats(texts, start_time, lengths, order, batch_size)
+
+
+def predict_proba_sorted_by_length(sentiment_pipeline, texts, batch_size=None, lengths=None):
+    """
+    Come `predict_sorted_by_length`, ma restituisce le probabilità di tutte le classi
+    calcolate dai logit, in una matrice (len(texts), len(config.LABELS)) nell'ordine
+    originale dei testi. Nessun dict viene creato per i singoli testi.
+
+    Returns:
+        tuple: (np.ndarray di probabilità, dict di statistiche)
+    """
+    batch_size = batch_size or config.BULK_BATCH_SIZE
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, len(config.LABELS)), dtype=np.float32), dict(_EMPTY_STATS)
+
+    start_time = time.perf_counter()
+    lengths, order, batches_indices, batches_texts = _length_sorted_batches(
+        sentiment_pipeline, texts, batch_size, lengths
+    )
+
+    run_batches = getattr(sentiment_pipeline, 'run_batches', None)
+    if run_batches is not None:
+        # Pool di worker: i processi restituiscono la distribuzione completa
+        batches_probabilities = [
+            distributions_to_array(outputs) for outputs in run_batches(batches_texts, truncation=True, top_k=None)
+        ]
+    else:
+        batches_probabilities = [class_probabilities(sentiment_pipeline, batch_texts) for batch_texts in batches_texts]
+
+    probabilities = np.zeros((len(texts), len(config.LABELS)), dtype=np.float32)
+    for batch_indices, batch_probabilities in zip(batches_indices, batches_probabilities):
+        probabilities[batch_indices] = batch_probabilities
+
+    return probabilities, _inference_stats(texts, start_time, lengths, order, batch_size)
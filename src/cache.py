@@ -0,0 +1,201 @@
+# src/cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from src import config
+
+
+def model_fingerprint(sentiment_pipeline):
+    """
+    Calcola un'impronta del modello caricato nella pipeline.
+
+    Per un modello locale (es. ./fine_tuned_model) usa nome, dimensione e data di
+    modifica dei file: un nuovo retraining cambia l'impronta e invalida la cache.
+    Per un modello del Hub usa il nome e la revisione (commit) scaricata.
+    I tipi dei moduli distinguono le varianti dello stesso modello (es. quantizzata int8).
+    Gli involucri con un proprio stato (es. la cascata) lo aggiungono con `fingerprint_extra`.
+    """
+    model = getattr(sentiment_pipeline, 'model', None)
+    if model is None:
+        return "unknown"
+
+    # Il backend TorchScript non ha `name_or_path`: si usa la cartella dell'artefatto
+    name_or_path = getattr(model, 'name_or_path', None) or getattr(sentiment_pipeline, 'model_dir', "")
+    hasher = hashlib.sha256(name_or_path.encode("utf-8"))
+    module_types = sorted({type(module).__qualname__ for module in model.modules()})
+    hasher.update(",".join(module_types).encode("utf-8"))
+
+    if os.path.isdir(name_or_path):
+        for file_name in sorted(os.listdir(name_or_path)):
+            file_stat = os.stat(os.path.join(name_or_path, file_name))
+            hasher.update(f"{file_name}:{file_stat.st_size}:{file_stat.st_mtime_ns}".encode("utf-8"))
+    elif getattr(model, 'config', None) is not None:
+        revision = getattr(model.config, '_commit_hash', None) or ""
+        hasher.update(revision.encode("utf-8"))
+        hasher.update(model.config.to_json_string().encode("utf-8"))
+
+    extra = getattr(sentiment_pipeline, 'fingerprint_extra', None)
+    if extra:
+        hasher.update(extra.encode("utf-8"))
+
+    return hasher.hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Cache delle predizioni a due livelli:
+    1. In memoria, con politica LRU, numero massimo di elementi e scadenza (TTL).
+    2. Opzionale su disco (SQLite), che sopravvive ai riavvii del processo.
+    """
+
+    def __init__(self, max_entries=None, ttl_seconds=None, db_path=None):
+        """
+        Args:
+            max_entries (int, optional): Elementi massimi in memoria. Default: config.CACHE_MAX_ENTRIES.
+            ttl_seconds (float, optional): Validità di un elemento. Default: config.CACHE_TTL_SECONDS.
+            db_path (str, optional): File SQLite per il livello su disco. Se None, usa
+                                     config.CACHE_DB_PATH (None = livello disattivato).
+        """
+        self.max_entries = max_entries or config.CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.CACHE_TTL_SECONDS
+        self.db_path = db_path if db_path is not None else config.CACHE_DB_PATH
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db = None
+        if self.db_path:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _is_expired(self, created_at, now):
+        return self.ttl_seconds and now - created_at > self.ttl_seconds
+
+    def _store_in_memory(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key):
+        """Restituisce il valore in cache o None se assente/scaduto."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._is_expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM predictions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._is_expired(row[1], now):
+                    value = json.loads(row[0])
+                    self._store_in_memory(key, value, row[1])
+                    self._counters["disk_hits"] += 1
+                    return value
+
+            self._counters["misses"] += 1
+            return None
+
+    def put_many(self, items):
+        """Salva in cache una lista di coppie (chiave, valore)."""
+        now = time.time()
+        with self._lock:
+            for key, value in items:
+                self._store_in_memory(key, value, now)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO predictions (key, value, created_at) VALUES (?, ?, ?)",
+                    [(key, json.dumps(value), now) for key, value in items]
+                )
+                self._db.commit()
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def stats(self):
+        """Contatori di hit/miss e occupazione della cache."""
+        with self._lock:
+            lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_enabled": self._db is not None,
+            }
+
+
+class CachedPipeline:
+    """
+    Avvolge una pipeline (o un MicroBatcher) e ne memorizza le predizioni.
+    Solo i testi non presenti in cache vengono inviati al modello.
+
+    La chiave è: impronta del modello + testo esatto (+ eventuali parametri che
+    cambiano l'output, come `top_k`). Il testo non viene normalizzato: il tokenizer
+    BPE a livello di byte distingue spazi, a capo e forme Unicode, quindi due testi
+    "uguali a meno degli spazi" possono avere predizioni diverse. Se il modello
+    viene ri-addestrato l'impronta cambia e le vecchie predizioni non vengono più
+    restituite.
+    """
+
+    # Parametri della pipeline che non influenzano l'output
+    _NEUTRAL_KWARGS = {"batch_size"}
+
+    def __init__(self, sentiment_pipeline, cache=None, fingerprint=None):
+        """
+        Args:
+            sentiment_pipeline: Pipeline (o oggetto compatibile) da avvolgere.
+            cache (PredictionCache, optional): Se None, ne crea una con i valori di config.
+            fingerprint (str, optional): Impronta del modello. Se None viene calcolata
+                                         dalla pipeline con `model_fingerprint`.
+        """
+        self.pipeline = sentiment_pipeline
+        self.cache = cache if cache is not None else PredictionCache()
+        self.fingerprint = fingerprint or model_fingerprint(sentiment_pipeline)
+
+    def _make_key(self, text, kwargs):
+        relevant = sorted((k, v) for k, v in kwargs.items() if k not in self._NEUTRAL_KWARGS)
+        payload = f"{self.fingerprint}\x00{text}\x00{relevant!r}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def __call__(self, inputs, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        keys = [self._make_key(text, kwargs) for text in texts]
+
+        results = [self.cache.get(key) for key in keys]
+
+        # Raggruppiamo i miss: testi identici nella stessa chiamata vengono calcolati una volta
+        missing = OrderedDict()
+        for text, key, result in zip(texts, keys, results):
+            if result is None and key not in missing:
+                missing[key] = text
+
+        if missing:
+            outputs = self.pipeline(list(missing.values()), **kwargs)
+            computed = dict(zip(missing.keys(), outputs))
+            self.cache.put_many(list(computed.items()))
+            results = [computed[key] if result is None else result for key, result in zip(keys, results)]
+
+        return results
+
+    def stats(self):
+        return self.cache.stats()
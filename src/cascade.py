@@ -0,0 +1,301 @@
+# src/cascade.py
+
+import argparse
+import hashlib
+import os
+from datetime import datetime
+
+import numpy as np
+
+from src import config
+from src.dedup import canonicalize_text
+from src.scoring import accuracy, class_probabilities, label_ids, predicted_ids
+
+
+class FirstStageModel:
+    """
+    Primo stadio della cascata: classificatore lineare (regressione logistica con SGD)
+    su unigrammi e bigrammi di parole trasformati con l'hashing trick.
+    Nessun vocabolario da salvare e predizioni in microsecondi su CPU.
+    """
+
+    def __init__(self, num_features=None, threshold=None):
+        # Import locale: scikit-learn serve solo quando la cascata è attiva
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.linear_model import SGDClassifier
+
+        self.vectorizer = HashingVectorizer(
+            n_features=num_features or config.CASCADE_NUM_FEATURES,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            preprocessor=canonicalize_text,
+        )
+        self.classifier = SGDClassifier(loss="log_loss", alpha=1e-5, max_iter=20, tol=None, random_state=0)
+        self.threshold = threshold if threshold is not None else config.CASCADE_DEFAULT_THRESHOLD
+        self.calibration = None
+
+    def fit(self, texts, labels):
+        self.classifier.fit(self.vectorizer.transform(texts), np.asarray(labels))
+        return self
+
+    def predict_proba(self, texts):
+        """Probabilità (len(texts), len(config.LABELS)) nell'ordine di config.LABELS."""
+        probabilities = np.zeros((len(texts), len(config.LABELS)), dtype=np.float32)
+        if len(texts):
+            probabilities[:, self.classifier.classes_] = self.classifier.predict_proba(self.vectorizer.transform(texts))
+        return probabilities
+
+    def fingerprint(self):
+        hasher = hashlib.sha256(self.classifier.coef_.tobytes())
+        hasher.update(repr(self.threshold).encode("utf-8"))
+        return hasher.hexdigest()[:16]
+
+    def save(self, path=None):
+        import joblib
+
+        path = path or config.CASCADE_MODEL_PATH
+        tmp_path = path + ".tmp"
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path=None):
+        import joblib
+
+        return joblib.load(path or config.CASCADE_MODEL_PATH)
+
+
+def calibrate_threshold(first_stage_probabilities, transformer_pred_ids, true_ids, max_accuracy_loss=None):
+    """
+    Sceglie la soglia di confidenza più bassa (cioè il maggior numero di testi risolti dal
+    primo stadio) per cui l'accuratezza della cascata non perde più di `max_accuracy_loss`
+    rispetto al solo transformer. Tutte le soglie candidate vengono valutate insieme
+    con somme cumulative sui testi ordinati per confidenza decrescente.
+
+    Returns:
+        dict: soglia, tasso di escalation e accuratezze attese.
+    """
+    max_accuracy_loss = config.CASCADE_MAX_ACCURACY_LOSS if max_accuracy_loss is None else max_accuracy_loss
+    true_ids = np.asarray(true_ids)
+    confidence = first_stage_probabilities.max(axis=1)
+    order = np.argsort(-confidence, kind="stable")
+    sorted_confidence = confidence[order]
+
+    first_correct = (predicted_ids(first_stage_probabilities) == true_ids)[order]
+    transformer_correct = (np.asarray(transformer_pred_ids) == true_ids)[order]
+    n = len(true_ids)
+
+    # accepted[k] = testi risolti dal primo stadio accettandone i k più sicuri (k = 0..n)
+    accepted = np.arange(n + 1)
+    first_hits = np.concatenate([[0], np.cumsum(first_correct)])
+    transformer_hits = transformer_correct.sum() - np.concatenate([[0], np.cumsum(transformer_correct)])
+    cascade_accuracy = (first_hits + transformer_hits) / n
+    transformer_accuracy = transformer_correct.mean()
+
+    # Una soglia accetta tutti i testi con confidenza >= soglia: i pareggi non si possono dividere
+    valid = np.ones(n + 1, dtype=bool)
+    valid[1:n] = sorted_confidence[:-1] > sorted_confidence[1:]
+    candidates = np.flatnonzero(valid & (transformer_accuracy - cascade_accuracy <= max_accuracy_loss + 1e-12))
+    k = int(candidates.max())
+
+    return {
+        "threshold": float(sorted_confidence[k - 1]) if k > 0 else float("inf"),
+        "escalation_rate": (n - k) / n,
+        "cascade_accuracy": float(cascade_accuracy[k]),
+        "transformer_accuracy": float(transformer_accuracy),
+        "first_stage_accuracy_on_accepted": float(first_hits[k] / k) if k else None,
+        "samples": n,
+    }
+
+
+class CascadePipeline:
+    """
+    Cascata a due stadi compatibile con la pipeline di sentiment.
+
+    Il primo stadio (FirstStageModel) valuta tutti i testi; quelli con confidenza
+    >= soglia ricevono subito la sua risposta, solo gli altri vengono inviati al
+    transformer (`escalation_pipeline`, quella di `load_sentiment_pipeline`).
+    """
+
+    def __init__(self, first_stage, escalation_pipeline, threshold=None):
+        self.first_stage = first_stage
+        self.escalation_pipeline = escalation_pipeline
+        self.threshold = first_stage.threshold if threshold is None else threshold
+        # Per l'impronta della cache e la pre-tokenizzazione dell'inferenza in blocco
+        self.model = getattr(escalation_pipeline, 'model', None)
+        self.model_dir = getattr(escalation_pipeline, 'model_dir', None)
+        self.tokenizer = getattr(escalation_pipeline, 'tokenizer', None)
+        self.fingerprint_extra = f"cascade:{first_stage.fingerprint()}:{self.threshold!r}"
+        self.texts = 0
+        self.escalated = 0
+
+    def _route(self, texts):
+        probabilities = self.first_stage.predict_proba(texts)
+        escalate = probabilities.max(axis=1) < self.threshold
+        # Contatori approssimati in presenza di più thread: servono solo per le statistiche
+        self.texts += len(texts)
+        self.escalated += int(escalate.sum())
+        return probabilities, escalate
+
+    def predict_proba(self, texts, truncation=True):
+        """Probabilità della cascata: primo stadio per i testi sicuri, transformer per gli altri."""
+        texts = list(texts)
+        probabilities, escalate = self._route(texts)
+        if escalate.any():
+            escalated_texts = [text for text, flag in zip(texts, escalate) if flag]
+            probabilities[escalate] = class_probabilities(self.escalation_pipeline, escalated_texts, truncation)
+        return probabilities
+
+    def __call__(self, inputs, batch_size=None, truncation=True, top_k=1, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        probabilities, escalate = self._route(texts)
+
+        results = [None] * len(texts)
+        escalated_positions = np.flatnonzero(escalate)
+        if len(escalated_positions):
+            outputs = self.escalation_pipeline([texts[i] for i in escalated_positions],
+                                               batch_size=batch_size or len(escalated_positions),
+                                               truncation=truncation, top_k=top_k, **kwargs)
+            for position, output in zip(escalated_positions, outputs):
+                results[position] = output
+
+        for position in np.flatnonzero(~escalate):
+            row = probabilities[position]
+            distribution = sorted(({'label': label, 'score': float(score)} for label, score in zip(config.LABELS, row)),
+                                  key=lambda item: item['score'], reverse=True)
+            results[position] = distribution if top_k is None else distribution[0]
+        return results
+
+    def close(self):
+        close = getattr(self.escalation_pipeline, 'close', None)
+        if close is not None:
+            close()
+
+    def stats(self):
+        return {
+            "texts": self.texts,
+            "escalated": self.escalated,
+            "escalation_rate": self.escalated / self.texts if self.texts else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+def load_cascade(escalation_pipeline, path=None):
+    """
+    Avvolge la pipeline nella cascata se il primo stadio è stato addestrato,
+    altrimenti restituisce la pipeline invariata.
+    """
+    path = path or config.CASCADE_MODEL_PATH
+    if not os.path.exists(path):
+        print(f"⚠️ Cascata attiva ma primo stadio assente ('{path}'): si usa solo il transformer. "
+              "Addestrarlo con: python -m src.cascade")
+        return escalation_pipeline
+    first_stage = FirstStageModel.load(path)
+    print(f"✅ Cascata attiva: primo stadio '{path}', soglia di confidenza {first_stage.threshold:.3f}.")
+    return CascadePipeline(first_stage, escalation_pipeline)
+
+
+def cascade_report(cascade, texts, true_ids, probabilities):
+    """
+    Statistiche per stadio di una valutazione: tasso di escalation e accuratezza del
+    primo stadio (sui testi che ha risolto) e del transformer (sui testi ricevuti).
+    `probabilities` sono le probabilità finali della cascata sugli stessi testi.
+    """
+    true_ids = np.asarray(true_ids)
+    first_stage_probabilities = cascade.first_stage.predict_proba(texts)
+    escalate = first_stage_probabilities.max(axis=1) < cascade.threshold
+    final_ids = predicted_ids(probabilities)
+    return {
+        "threshold": cascade.threshold,
+        "escalation_rate": float(escalate.mean()) if len(texts) else 0.0,
+        "first_stage_accuracy": accuracy(true_ids[~escalate], final_ids[~escalate]) if (~escalate).any() else None,
+        "transformer_accuracy": accuracy(true_ids[escalate], final_ids[escalate]) if escalate.any() else None,
+        "first_stage_accuracy_all": accuracy(true_ids, predicted_ids(first_stage_probabilities)),
+    }
+
+
+# --- ADDESTRAMENTO ---
+
+def load_training_data():
+    """Train set di TweetEval più le correzioni degli utenti, come in retrain.py."""
+    from src.data_loader import load_sentiment_dataset
+    from src.feedback_store import FeedbackStore
+
+    dataset = load_sentiment_dataset()
+    texts = list(dataset['train']['text'])
+    labels = list(dataset['train']['label'])
+
+    if os.path.exists(config.FEEDBACK_DB_PATH):
+        store = FeedbackStore()
+        corrections = store.read_since(0).dropna(subset=['text', 'user_correction'])
+        store.close()
+        correction_ids = label_ids(corrections['user_correction'].to_numpy())
+        valid = correction_ids >= 0
+        texts += corrections['text'].to_numpy()[valid].tolist()
+        labels += correction_ids[valid].tolist()
+        print(f"Aggiunte {int(valid.sum())} correzioni degli utenti.")
+    return dataset, texts, labels
+
+
+def train_cascade(sentiment_pipeline=None, path=None, max_accuracy_loss=None, calibration_size=None):
+    """
+    Addestra il primo stadio e, se viene passata la pipeline del transformer, calibra la
+    soglia sul validation set di TweetEval per la perdita di accuratezza indicata.
+    """
+    from src.bulk_inference import predict_proba_sorted_by_length
+
+    dataset, texts, labels = load_training_data()
+    print(f"Addestramento del primo stadio su {len(texts)} esempi...")
+    first_stage = FirstStageModel().fit(texts, labels)
+
+    if sentiment_pipeline is not None:
+        calibration_size = calibration_size or config.CASCADE_CALIBRATION_SIZE
+        validation = dataset['validation'].shuffle(seed=42)
+        validation = validation.select(range(min(calibration_size, len(validation))))
+        validation_texts = list(validation['text'])
+        true_ids = np.asarray(validation['label'])
+
+        print(f"Calibrazione della soglia su {len(validation_texts)} esempi di validazione...")
+        transformer_probabilities, _ = predict_proba_sorted_by_length(sentiment_pipeline, validation_texts)
+        calibration = calibrate_threshold(first_stage.predict_proba(validation_texts),
+                                          predicted_ids(transformer_probabilities), true_ids, max_accuracy_loss)
+        first_stage.threshold = calibration["threshold"]
+        first_stage.calibration = {**calibration, "calibrated_at": datetime.now().isoformat()}
+        print(f"Soglia calibrata: {calibration['threshold']:.3f} — escalation attesa "
+              f"{calibration['escalation_rate']:.1%}, accuratezza {calibration['cascade_accuracy']:.4f} "
+              f"contro {calibration['transformer_accuracy']:.4f} del solo transformer.")
+    else:
+        print(f"Soglia non calibrata: si usa config.CASCADE_DEFAULT_THRESHOLD ({first_stage.threshold}).")
+
+    first_stage.save(path)
+    print(f"✅ Primo stadio salvato in '{path or config.CASCADE_MODEL_PATH}'.")
+    return first_stage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Addestra e calibra il primo stadio della cascata.")
+    parser.add_argument("--model", default=None,
+                        help="Transformer per la calibrazione (default: fine-tuned se presente, altrimenti base).")
+    parser.add_argument("--max-accuracy-loss", type=float, default=config.CASCADE_MAX_ACCURACY_LOSS,
+                        help="Perdita di accuratezza massima accettata rispetto al solo transformer.")
+    parser.add_argument("--no-calibrate", action="store_true",
+                        help="Non calibrare la soglia (usa config.CASCADE_DEFAULT_THRESHOLD).")
+    parser.add_argument("--output", default=config.CASCADE_MODEL_PATH, help="File del primo stadio.")
+    args = parser.parse_args()
+
+    sentiment_pipeline = None
+    if not args.no_calibrate:
+        from src.model import load_sentiment_pipeline
+
+        model_to_use = args.model
+        local_model_path = "./fine_tuned_model"
+        if model_to_use is None and os.path.isdir(local_model_path) and "config.json" in os.listdir(local_model_path):
+            model_to_use = os.path.abspath(local_model_path)
+        sentiment_pipeline = load_sentiment_pipeline(device="cpu", model_name=model_to_use,
+                                                      profile=config.RUNTIME_PROFILE_BATCH)
+
+    train_cascade(sentiment_pipeline, path=args.output, max_accuracy_loss=args.max_accuracy_loss)
+
+
+if __name__ == "__main__":
+    main()
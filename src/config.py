@@ -10,4 +10,161 @@ DATASET_SUBSET = "sentiment"
 # Mappatura delle etichette per la classificazione
 LABELS = ["negative", "neutral", "positive"]
 ID2LABEL = {i: label for i, label in enumerate(LABELS)}
-LABEL2ID = {label: i for i, label in enumerate(LABELS)}
\ No newline at end of file
+LABEL2ID = {label: i for i, label in enumerate(LABELS)}
+
+# Micro-batching delle richieste online (app.py)
+# Il batch viene inviato al modello quando raggiunge BATCH_MAX_SIZE testi
+# oppure quando il primo testo in coda ha atteso BATCH_MAX_WAIT_MS millisecondi.
+BATCH_MAX_SIZE = 16
+BATCH_MAX_WAIT_MS = 10
+
+# Dimensione dei batch per l'inferenza in blocco (valutazione e benchmark)
+BULK_BATCH_SIZE = 32
+
+# Cache delle predizioni (app.py e monitor.py)
+CACHE_MAX_ENTRIES = 10000        # Elementi massimi nel livello in memoria (LRU)
+CACHE_TTL_SECONDS = 24 * 3600    # Validità di una predizione in cache
+CACHE_DB_PATH = None             # File SQLite per il livello su disco (None = disattivato)
+
+# Quantizzazione dinamica int8 per l'inferenza su CPU
+QUANTIZE_INT8 = False                   # Attiva il modello quantizzato (solo device 'cpu')
+QUANTIZATION_ACCURACY_TOLERANCE = 0.01  # Perdita massima di accuratezza accettata rispetto a fp32
+QUANTIZATION_GUARD_SAMPLE_SIZE = 500    # Elementi del test set usati dalla guardia di accuratezza
+
+# Backend di inferenza: "auto" usa il grafo TorchScript esportato se presente,
+# "eager" forza la pipeline di transformers, "traced" richiede l'artefatto esportato.
+INFERENCE_BACKEND = "auto"
+TRACED_MODEL_FILENAME = "traced_model.pt"
+EXPORT_DIR = "./exported_model"   # Destinazione dell'export per il modello base del Hub
+EXPORT_PARITY_ATOL = 1e-4         # Differenza massima tollerata sulle probabilità eager/esportato
+
+# Pool di processi di inferenza con pesi condivisi (app.py e valutazione)
+WORKER_POOL_SIZE = 0     # Numero di processi worker (0 = inferenza nel processo principale)
+WORKER_THREADS = None    # Thread torch per worker (None = numero di core assegnati al worker)
+WORKER_START_METHOD = "forkserver"   # Avvio dei processi di inferenza e valutazione (fork si blocca dopo un'inferenza)
+WORKER_LIVENESS_INTERVAL_S = 1.0   # Intervallo del controllo dei processi (pool e valutazione) terminati in modo anomalo
+
+# Scoring in streaming di file di grandi dimensioni (score_file.py)
+SCORING_CHUNK_SIZE = 10000   # Righe lette, elaborate e scritte per ogni blocco
+SCORING_QUEUE_SIZE = 2       # Blocchi in attesa tra uno stadio e l'altro (limita la memoria)
+
+# Monitoraggio incrementale del log delle correzioni (src/monitor.py)
+MONITOR_WINDOW_SIZE = 1000    # Correzioni più recenti considerate nella finestra mobile
+DRIFT_PSI_THRESHOLD = 0.2     # PSI oltre il quale la distribuzione delle etichette è cambiata
+MONITOR_CACHE_DB_PATH = "monitor_cache.db"   # Cache su disco delle predizioni del monitoraggio (persiste tra le esecuzioni)
+
+# Archivio delle correzioni degli utenti (src/feedback_store.py)
+FEEDBACK_DB_PATH = "feedback.db"        # File SQLite (WAL) con le correzioni
+FEEDBACK_FLUSH_INTERVAL_MS = 50         # Attesa massima prima del commit di un gruppo di correzioni
+FEEDBACK_MAX_BATCH = 256                # Correzioni massime per transazione
+FEEDBACK_BUSY_TIMEOUT_S = 30            # Attesa sul lock quando più processi scrivono insieme
+
+# Cache delle feature tokenizzate per il retraining (src/token_cache.py)
+TOKEN_CACHE_DIR = "./token_cache"
+TOKEN_CACHE_MAX_SHARDS = 16   # Oltre questo numero di shard la cache viene compattata in uno solo
+
+# Modello minuscolo generato in locale per benchmark e test offline (src/tiny_model.py)
+TINY_MODEL_DIR = "./.tiny_model"
+TINY_MODEL_MAX_LENGTH = 512   # Come il modello reale: stessi limiti di lunghezza nei test
+
+# Benchmark di prestazioni (benchmark_performance.py)
+BENCHMARK_BATCH_SIZES = [1, 8, 32]
+BENCHMARK_SEQ_LENGTHS = [16, 64, 128]        # Lunghezze sintetiche in token
+BENCHMARK_HISTORY_FILE = "benchmark_history.json"
+BENCHMARK_REGRESSION_THRESHOLD = 0.10       # Peggioramento relativo segnalato come regressione
+
+# Metriche e profiling dell'applicazione (src/metrics.py, src/profiler.py)
+METRICS_PORT = None                      # Endpoint /metrics in formato Prometheus, opt-in (es. 9464; None = disattivato)
+METRICS_HOST = "127.0.0.1"               # Solo locale: esporre su altre interfacce solo dietro un proxy autenticato
+PROFILER_ENDPOINT_ENABLED = False        # /profile/start e /profile/stop sul server delle metriche (opt-in)
+METRICS_DUMP_PATH = None                 # Se impostato, le metriche vengono scritte anche su file
+METRICS_DUMP_INTERVAL_S = 15
+METRICS_LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+PROFILER_INTERVAL_MS = 10
+
+# Esempi inequivocabili che ogni modello in servizio deve classificare correttamente
+# (test anti-degrado e verifica prima del ricaricamento a caldo)
+GOLDEN_EXAMPLES = {
+    "I absolutely love this product, it is amazing!": "positive",
+    "Worst experience ever, I hate it.": "negative",
+    "The package arrived on Tuesday.": "neutral",  # Fatto oggettivo
+    "Excellent service and great quality.": "positive",
+    "Disgusting food and rude staff.": "negative",
+}
+
+# Ricaricamento a caldo del modello (src/hot_reload.py)
+MODEL_RELOAD_ENABLED = True    # Osserva la cartella del modello fine-tuned e ricarica quando cambia
+MODEL_RELOAD_POLL_S = 5
+MODEL_RELOAD_CHECK_TIMEOUT_S = 120   # Tempo massimo della verifica del nuovo modello prima di scartarlo
+
+# Avvio dell'applicazione: modello e archivio vengono caricati in background subito dopo
+# l'avvio (False = al primo utilizzo). /readyz risponde 200 solo a caricamento completato.
+PRELOAD_AT_STARTUP = True
+
+# Server HTTP dell'applicazione (interfaccia Gradio e API JSON /v1/predict)
+SERVER_HOST = "127.0.0.1"   # GRADIO_SERVER_NAME / GRADIO_SERVER_PORT, se impostate, hanno la precedenza
+SERVER_PORT = 7860
+
+# Controllo di ammissione delle richieste di predizione (src/async_inference.py)
+ASYNC_MAX_CONCURRENCY = None             # Richieste in esecuzione insieme (None = BATCH_MAX_SIZE corrente, che riempie un micro-batch)
+ASYNC_MAX_QUEUE = 256                    # Richieste in attesa oltre le quali si rifiuta subito (429)
+ASYNC_QUEUE_BUDGET_MS = 500              # Attesa massima in coda prima del rifiuto (429)
+ASYNC_DEADLINE_MS = 5000                 # Scadenza predefinita di una richiesta (504)
+ASYNC_MAX_DEADLINE_MS = 60000            # Valore massimo accettato per deadline_ms nelle richieste
+
+# Deduplicazione dei testi quasi identici (src/dedup.py): retraining e scoring in blocco
+DEDUP_SIMILARITY_THRESHOLD = 0.8   # Somiglianza di Jaccard stimata minima tra testi dello stesso cluster
+DEDUP_NUM_PERM = 64                # Funzioni hash della firma MinHash
+DEDUP_BANDS = 16                   # Bande LSH (DEDUP_NUM_PERM / DEDUP_BANDS righe per banda)
+DEDUP_SHINGLE_SIZE = 4             # Lunghezza in caratteri degli shingle
+DEDUP_CORRECTIONS = True           # Collassa le correzioni quasi identiche prima del retraining
+DEDUP_LABEL_POLICY = "majority"    # Etichette in conflitto: "majority" (voto) o "latest" (più recente)
+
+# Valutazione parallela a shard sull'intero test set (src/evaluate.py, benchmark_baseline.py)
+EVAL_NUM_SHARDS = None          # Processi di valutazione (None = uno per gruppo di core disponibile)
+EVAL_BOOTSTRAP_SAMPLES = 1000   # Campioni bootstrap per gli intervalli di confidenza
+EVAL_CONFIDENCE_LEVEL = 0.95
+
+# Archivio locale di snapshot di dataset e modelli (src/artifact_store.py)
+# "off": sempre dal Hub; "prefer": snapshot locale se presente, altrimenti Hub;
+# "offline": solo snapshot locali (errore se mancano, nessun accesso alla rete).
+ARTIFACT_STORE_DIR = "./artifact_store"
+ARTIFACT_STORE_MODE = "prefer"
+
+# Retraining incrementale (retrain.py --incremental)
+RETRAIN_STATE_FILENAME = "training_state.json"   # Watermark salvato nella cartella del modello
+REPLAY_CORRECTIONS = 200    # Correzioni già usate riproposte a ogni addestramento incrementale
+REPLAY_TWEETEVAL = 500      # Esempi del train set di TweetEval riproposti contro il forgetting
+REPLAY_SEED = 42
+RETRAIN_EVAL_TWEETEVAL = 200  # Esempi della validation di TweetEval nell'eval set del retraining
+
+# Cascata di modelli per l'inferenza (src/cascade.py): un classificatore lineare su n-grammi
+# risponde quando è sicuro, solo i testi incerti arrivano al transformer.
+# Addestramento e calibrazione della soglia: python -m src.cascade
+CASCADE_ENABLED = False
+CASCADE_MODEL_PATH = "./cascade_stage1.joblib"
+CASCADE_DEFAULT_THRESHOLD = 0.9      # Soglia usata se il primo stadio non è stato calibrato
+CASCADE_MAX_ACCURACY_LOSS = 0.01     # Perdita di accuratezza accettata in calibrazione
+CASCADE_NUM_FEATURES = 2 ** 18       # Dimensione dello spazio delle feature (hashing trick)
+CASCADE_CALIBRATION_SIZE = 2000      # Esempi di validazione usati per calibrare la soglia
+
+# Lunghezza massima degli input e testi lunghi (src/long_text.py)
+# Un testo incollato molto lungo non deve costare un forward pass da 512 token a tutto il suo batch.
+INPUT_MAX_TOKENS = 128               # Token massimi per testo (inclusi quelli speciali)
+INPUT_MAX_TOKENS_LIMIT = 512         # Valore massimo accettato per max_tokens nelle richieste
+TRUNCATION_STRATEGY = "head+tail"    # "head", "tail", "head+tail" o "chunk" (blocchi valutati e aggregati)
+TRUNCATION_HEAD_FRACTION = 0.25      # Con "head+tail": quota del limite data all'inizio del testo
+CHUNK_OVERLAP_TOKENS = 16            # Con "chunk": token in comune tra blocchi consecutivi
+CHUNK_MAX_CHUNKS = 8                 # Con "chunk": blocchi massimi per testo (oltre si valuta solo l'inizio)
+INPUT_TOKEN_BUCKETS = [16, 32, 64, 128, 256, 512, 1024, 2048, 4096]
+INPUT_SEGMENT_BUCKETS = [1, 2, 4, 8, 16]
+
+# Profili di esecuzione (src/runtime_profile.py): thread, allocatore, sola inferenza e batch.
+# "latency": singola richiesta; "throughput": batch grandi; "off": impostazioni di torch.
+# Calibrazione per l'host: python -m src.runtime_profile calibrate
+RUNTIME_PROFILE_APP = "latency"          # app.py
+RUNTIME_PROFILE_BATCH = "throughput"     # monitor, benchmark_baseline.py, score_file.py
+RUNTIME_PROFILE_PATH = "./runtime_profile.json"
+RUNTIME_CALIBRATION_TEXTS = 256
+RUNTIME_CALIBRATION_BATCH_SIZES = [8, 16, 32, 64]
+RUNTIME_CALIBRATION_TOLERANCE = 0.05     # A prestazioni entro il 5% si preferiscono meno thread
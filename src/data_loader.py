@@ -1,13 +1,24 @@
 # src/data_loader.py
 
-from datasets import load_dataset
+import time
+
 from src import config
+from src.artifact_store import load_dataset_snapshot
 
 def load_sentiment_dataset():
     """
-    Carica il dataset per l'analisi del sentiment da Hugging Face.
+    Carica il dataset per l'analisi del sentiment: dallo snapshot locale (memory-map)
+    se presente, altrimenti da Hugging Face (vedi config.ARTIFACT_STORE_MODE).
     """
+    dataset = load_dataset_snapshot()
+    if dataset is not None:
+        return dataset
+
+    # Import locale: con lo snapshot la risoluzione sul Hub non serve
+    from datasets import load_dataset
+
     print(f"Caricamento del dataset '{config.DATASET_NAME}/{config.DATASET_SUBSET}'...")
+    start = time.perf_counter()
     dataset = load_dataset(config.DATASET_NAME, config.DATASET_SUBSET)
-    print("Caricamento completato.")
-    return dataset
\ No newline at end of file
+    print(f"Caricamento completato in {time.perf_counter() - start:.2f}s.")
+    return dataset
@@ -0,0 +1,195 @@
+# src/dedup.py
+
+import hashlib
+import re
+import unicodedata
+
+import numpy as np
+
+from src import config
+
+# Primo di Mersenne 2^31 - 1: a * x + b resta entro i 64 bit con valori a 31 bit
+_MERSENNE_PRIME = (1 << 31) - 1
+
+_URL_PATTERN = re.compile(r"(https?://|www\.)\S+")
+_MENTION_PATTERN = re.compile(r"@\w+")
+_REPEATED_PUNCTUATION = re.compile(r"([!?.])\1+")
+
+
+def canonicalize_text(text):
+    """
+    Forma canonica usata solo per riconoscere i quasi duplicati: link e menzioni
+    vengono sostituiti da segnaposto (come nel preprocessing dei modelli cardiffnlp),
+    maiuscole/minuscole, punteggiatura ripetuta e spazi vengono uniformati.
+    Il testo inviato al modello resta quello originale.
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _URL_PATTERN.sub("http", text)
+    text = _MENTION_PATTERN.sub("@user", text)
+    text = _REPEATED_PUNCTUATION.sub(r"\1", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _shingle_hashes(canonical, shingle_size):
+    """Hash stabili (31 bit, uguali in ogni processo) degli shingle di caratteri del testo."""
+    if len(canonical) <= shingle_size:
+        shingles = {canonical}
+    else:
+        shingles = {canonical[i:i + shingle_size] for i in range(len(canonical) - shingle_size + 1)}
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+        for shingle in shingles
+    ]
+    return np.array(hashes, dtype=np.uint64) & np.uint64(_MERSENNE_PRIME)
+
+
+class NearDuplicateIndex:
+    """
+    Indice MinHash + LSH che raggruppa i testi quasi identici in cluster.
+
+    Ogni testo riceve una firma MinHash sugli shingle di caratteri della sua forma
+    canonica; le bande della firma fanno da chiavi LSH, così un nuovo testo viene
+    confrontato solo con i cluster che condividono almeno una banda. Entra nel
+    cluster il cui rappresentante ha somiglianza stimata >= `threshold`, altrimenti
+    apre un nuovo cluster. I testi con la stessa forma canonica vengono riconosciuti
+    subito, senza calcolare la firma.
+    """
+
+    def __init__(self, threshold=None, num_perm=None, bands=None, shingle_size=None, seed=0):
+        """
+        Args:
+            threshold (float, optional): Default: config.DEDUP_SIMILARITY_THRESHOLD.
+            num_perm (int, optional): Default: config.DEDUP_NUM_PERM.
+            bands (int, optional): Deve dividere num_perm. Default: config.DEDUP_BANDS.
+            shingle_size (int, optional): Default: config.DEDUP_SHINGLE_SIZE.
+            seed (int): Seme delle funzioni hash (indici con lo stesso seme sono confrontabili).
+        """
+        self.threshold = threshold if threshold is not None else config.DEDUP_SIMILARITY_THRESHOLD
+        self.num_perm = num_perm or config.DEDUP_NUM_PERM
+        self.bands = bands or config.DEDUP_BANDS
+        self.shingle_size = shingle_size or config.DEDUP_SHINGLE_SIZE
+        if self.num_perm % self.bands:
+            raise ValueError(f"num_perm ({self.num_perm}) deve essere un multiplo di bands ({self.bands}).")
+        self.rows_per_band = self.num_perm // self.bands
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=(self.num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=(self.num_perm, 1), dtype=np.uint64)
+
+        self._by_canonical = {}
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = []
+        self.representatives = []
+
+    def __len__(self):
+        return len(self.representatives)
+
+    def signature(self, canonical):
+        hashes = _shingle_hashes(canonical, self.shingle_size)
+        return ((self._a * hashes + self._b) % np.uint64(_MERSENNE_PRIME)).min(axis=1)
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows_per_band:(i + 1) * self.rows_per_band].tobytes() for i in range(self.bands)]
+
+    def add(self, text):
+        """Restituisce l'id del cluster del testo (nuovo se non ha quasi duplicati)."""
+        canonical = canonicalize_text(text)
+        cluster_id = self._by_canonical.get(canonical)
+        if cluster_id is not None:
+            return cluster_id
+
+        signature = self.signature(canonical)
+        band_keys = self._band_keys(signature)
+
+        candidates = set()
+        for bucket, key in zip(self._buckets, band_keys):
+            candidates.update(bucket.get(key, ()))
+
+        best_id, best_similarity = None, self.threshold
+        for candidate in sorted(candidates):
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best_id, best_similarity = candidate, similarity
+
+        if best_id is None:
+            best_id = len(self.representatives)
+            self.representatives.append(text)
+            self._signatures.append(signature)
+            for bucket, key in zip(self._buckets, band_keys):
+                bucket.setdefault(key, []).append(best_id)
+
+        self._by_canonical[canonical] = best_id
+        return best_id
+
+    def assign(self, texts):
+        """Id del cluster di ogni testo, come array."""
+        return np.array([self.add(text) for text in texts], dtype=np.int64)
+
+
+# --- USO DELL'INDICE ---
+
+def dedup_plan(texts, index=None):
+    """
+    Prepara lo scoring "un testo per cluster".
+
+    Returns:
+        tuple: (posizioni dei testi da inviare al modello, uno per cluster;
+                array che per ogni testo indica quale di questi risultati usare)
+    """
+    index = index if index is not None else NearDuplicateIndex()
+    cluster_ids = index.assign(texts)
+    _, positions, inverse = np.unique(cluster_ids, return_index=True, return_inverse=True)
+    return positions, inverse.reshape(-1)
+
+
+def predict_deduplicated(predict_fn, texts, index=None):
+    """
+    Esegue `predict_fn` (lista di testi -> lista di risultati) una volta per cluster
+    di quasi duplicati e riporta il risultato a tutti i testi del cluster.
+
+    Returns:
+        tuple: (risultati nell'ordine di `texts`, numero di testi effettivamente valutati)
+    """
+    texts = list(texts)
+    if not texts:
+        return [], 0
+    positions, inverse = dedup_plan(texts, index)
+    outputs = predict_fn([texts[i] for i in positions])
+    return [outputs[i] for i in inverse], len(positions)
+
+
+def deduplicate_corrections(df, policy=None, text_column="text", label_column="label", index=None):
+    """
+    Collassa le correzioni quasi identiche in una riga per cluster.
+
+    Per ogni cluster si tiene la riga più recente (ultima nel DataFrame, che è ordinato
+    per id) con l'etichetta decisa da `policy`:
+      - "majority": l'etichetta più frequente nel cluster (a parità, la più recente);
+      - "latest": l'etichetta della correzione più recente.
+    La colonna `duplicates` riporta quante correzioni sono state collassate nella riga.
+    """
+    policy = policy or config.DEDUP_LABEL_POLICY
+    if policy not in ("majority", "latest"):
+        raise ValueError(f"Politica di deduplicazione non valida: '{policy}' (usare 'majority' o 'latest').")
+    if df.empty:
+        return df.assign(duplicates=np.zeros(0, dtype=np.int64))
+
+    df = df.reset_index(drop=True)
+    index = index if index is not None else NearDuplicateIndex()
+    clusters = index.assign(df[text_column].tolist())
+    positions = np.arange(len(df))
+
+    grouped = df.assign(_cluster=clusters, _position=positions)
+    latest = grouped.groupby("_cluster")["_position"].max()
+    result = df.loc[latest.to_numpy()].copy()
+    result["duplicates"] = grouped.groupby("_cluster").size().loc[latest.index].to_numpy()
+
+    if policy == "majority":
+        votes = grouped.groupby(["_cluster", label_column]).agg(
+            votes=("_position", "size"), last_seen=("_position", "max")
+        ).reset_index()
+        # Più voti prima; a parità di voti vince l'etichetta vista per ultima
+        winners = votes.sort_values(["_cluster", "votes", "last_seen"]).groupby("_cluster").tail(1)
+        result[label_column] = winners.set_index("_cluster").loc[latest.index, label_column].to_numpy()
+
+    return result.reset_index(drop=True)
@@ -1,40 +1,66 @@
 # src/evaluate.py
 
+import os
+import time
+
 import numpy as np
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-import seaborn as sns
-import matplotlib.pyplot as plt
 
 from src import config
+from src.bulk_inference import predict_proba_sorted_by_length
+from src.scoring import (accuracy as accuracy_of, bootstrap_confidence_intervals,
+                         classification_report_from_confusion, confusion_matrix, per_class_metrics, predicted_ids)
 
 
-def evaluate_model(sentiment_pipeline, dataset, sample_size=1000):
+def evaluate_model(sentiment_pipeline, dataset, sample_size=1000, batch_size=None):
     """
     Valuta le performance del modello su un campione del test set.
+
+    Args:
+        sentiment_pipeline: La pipeline da valutare.
+        dataset: Il DatasetDict restituito da `load_sentiment_dataset`.
+        sample_size (int, optional): Numero di elementi da valutare.
+                                     Se None, valuta l'intero test set.
+        batch_size (int, optional): Dimensione dei batch per l'inferenza in blocco.
+
+    Returns:
+        float: L'accuratezza sul campione valutato.
     """
-    print(f"\nInizio della valutazione su un campione di {sample_size} elementi...")
+    # Import locale: scikit-learn è lento da importare e serve solo per il report finale
+    from sklearn.metrics import classification_report
 
-    test_sample = dataset['test'].shuffle(seed=42).select(range(sample_size))
+    if sample_size is None:
+        test_sample = dataset['test']
+        print(f"\nInizio della valutazione sull'intero test set ({len(test_sample)} elementi)...")
+    else:
+        sample_size = min(sample_size, len(dataset['test']))
+        print(f"\nInizio della valutazione su un campione di {sample_size} elementi...")
+        test_sample = dataset['test'].shuffle(seed=42).select(range(sample_size))
 
     # Estrai i testi e le etichette reali
-    true_labels_ids = test_sample['label']
+    true_labels_ids = np.asarray(test_sample['label'])
 
     # Convertiamo esplicitamente l'output in una lista di stringhe
     texts = list(test_sample['text'])
     # ---------------------------
 
-    # Ottieni le predizioni dal modello
+    # Ottieni le predizioni dal modello (batch ordinati per lunghezza, ordine originale ripristinato)
     print("Esecuzione delle predizioni...")
-    model_outputs = sentiment_pipeline(texts)
+    probabilities, inference_stats = predict_proba_sorted_by_length(sentiment_pipeline, texts, batch_size=batch_size)
+    print(f"Throughput: {inference_stats['texts_per_sec']:.1f} testi/sec "
+          f"({inference_stats['seconds']:.2f}s totali)")
+    print(f"Padding sprecato: {inference_stats['padding_waste']:.1%} "
+          f"(senza ordinamento sarebbe stato {inference_stats['padding_waste_unsorted']:.1%})")
 
-    # Estrai e normalizza le etichette predette
-    predicted_labels_str = [output['label'].lower() for output in model_outputs]
-    predicted_labels_ids = [config.LABEL2ID[label] for label in predicted_labels_str]
+    # Etichette predette: argmax sulla matrice delle probabilità (colonne nell'ordine di config.LABELS)
+    predicted_labels_ids = predicted_ids(probabilities)
 
     # Calcola e stampa le metriche
-    accuracy = accuracy_score(true_labels_ids, predicted_labels_ids)
+    accuracy = accuracy_of(true_labels_ids, predicted_labels_ids)
     print(f"\n--- Report di Valutazione ---")
     print(f"Accuratezza sul campione del test set: {accuracy:.4f}")
+    print(f"Confidenza media della predizione: {probabilities.max(axis=1).mean():.4f}")
+    print("Matrice di confusione (righe = etichetta reale, colonne = predizione):")
+    print(confusion_matrix(true_labels_ids, predicted_labels_ids))
 
     print("\nReport di Classificazione Dettagliato:")
     print(classification_report(
@@ -42,3 +68,171 @@ def evaluate_model(sentiment_pipeline, dataset, sample_size=1000):
         predicted_labels_ids,
         target_names=config.LABELS
     ))
+
+    # Cascata (src/cascade.py): quanti testi arrivano al transformer e accuratezza di ogni stadio
+    if getattr(sentiment_pipeline, 'first_stage', None) is not None:
+        from src.cascade import cascade_report
+
+        report = cascade_report(sentiment_pipeline, texts, true_labels_ids, probabilities)
+        print(f"\n--- Cascata (soglia di confidenza {report['threshold']:.3f}) ---")
+        print(f"Tasso di escalation al transformer: {report['escalation_rate']:.1%}")
+        for name, key in (("del primo stadio sui testi risolti", 'first_stage_accuracy'),
+                          ("del transformer sui testi inoltrati", 'transformer_accuracy')):
+            value = report[key]
+            print(f"Accuratezza {name}: {'n/d' if value is None else f'{value:.4f}'}")
+        print(f"Accuratezza del primo stadio su tutti i testi: {report['first_stage_accuracy_all']:.4f}")
+
+    return accuracy
+
+
+# --- VALUTAZIONE PARALLELA A SHARD ---
+
+def _evaluate_shard(sentiment_pipeline, texts, shard_indices, core_set, batch_size, result_queue):
+    """
+    Processo di valutazione: predice il proprio shard e restituisce le etichette predette.
+    I pesi del modello (in memoria condivisa) e i testi arrivano dal processo padre.
+    """
+    import torch
+
+    if core_set and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, core_set)
+    torch.set_num_threads(max(1, len(core_set)))
+
+    try:
+        shard_texts = [texts[i] for i in shard_indices]
+        probabilities, _ = predict_proba_sorted_by_length(sentiment_pipeline, shard_texts, batch_size=batch_size)
+        result_queue.put((shard_indices, predicted_ids(probabilities), None))
+    except Exception as e:
+        result_queue.put((shard_indices, None, repr(e)))
+
+
+def _collect_shard_results(workers, result_queue, predicted_labels_ids):
+    """
+    Raccoglie le predizioni di tutti gli shard in `predicted_labels_ids` e restituisce gli errori.
+    L'attesa controlla periodicamente i processi: se uno termina senza aver inviato il
+    risultato (es. ucciso dall'OOM killer) solleva RuntimeError invece di bloccarsi.
+    """
+    import queue
+
+    errors = []
+    remaining = len(workers)
+    # I risultati vanno letti prima del join: un processo non termina finché la coda non è svuotata
+    while remaining:
+        try:
+            shard_indices, shard_predictions, error = result_queue.get(timeout=config.WORKER_LIVENESS_INTERVAL_S)
+        except queue.Empty:
+            crashed = [worker for worker in workers if worker.exitcode not in (None, 0)]
+            if crashed:
+                raise RuntimeError(f"Il processo di valutazione PID {crashed[0].pid} è terminato "
+                                   f"(exitcode {crashed[0].exitcode}) senza restituire il suo shard.")
+            if all(worker.exitcode is not None for worker in workers):
+                raise RuntimeError(f"{remaining} shard senza risultato: i processi di valutazione sono terminati.")
+            continue
+        remaining -= 1
+        if error is not None:
+            errors.append(error)
+        else:
+            predicted_labels_ids[shard_indices] = shard_predictions
+    return errors
+
+
+def evaluate_sharded(sentiment_pipeline, dataset, num_shards=None, sample_size=None, batch_size=None,
+                     bootstrap_samples=None, confidence=None):
+    """
+    Valuta il modello sull'intero test set (o su un campione) dividendolo tra più processi.
+
+    Ogni processo è vincolato a un gruppo di core e predice uno shard del test set
+    (assegnazione a passo fisso, così gli shard hanno lunghezze dei testi simili).
+    Le predizioni vengono unite in un'unica matrice di confusione: accuratezza e report
+    di classificazione sono esatti, come con una valutazione seriale. Gli intervalli di
+    confidenza bootstrap misurano quanto il risultato dipende dal campione valutato.
+
+    Args:
+        sentiment_pipeline: Pipeline eager su CPU (i pesi vengono condivisi con i processi).
+        dataset: Il DatasetDict restituito da `load_sentiment_dataset`.
+        num_shards (int, optional): Processi di valutazione. Default: config.EVAL_NUM_SHARDS
+                                    o uno per core disponibile.
+        sample_size (int, optional): Se indicato, valuta solo un campione (come `evaluate_model`).
+        batch_size (int, optional): Dimensione dei batch di ogni processo.
+        bootstrap_samples (int, optional): Default: config.EVAL_BOOTSTRAP_SAMPLES.
+        confidence (float, optional): Livello degli intervalli. Default: config.EVAL_CONFIDENCE_LEVEL.
+
+    Returns:
+        dict: accuratezza, macro-F1, intervalli di confidenza, matrice di confusione e tempi.
+    """
+    from src.worker_pool import assign_core_sets, process_context
+
+    test_sample = dataset['test']
+    if sample_size is not None:
+        sample_size = min(sample_size, len(test_sample))
+        test_sample = test_sample.shuffle(seed=42).select(range(sample_size))
+
+    texts = list(test_sample['text'])
+    true_labels_ids = np.asarray(test_sample['label'])
+    available_cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    num_shards = max(1, min(num_shards or config.EVAL_NUM_SHARDS or available_cores or 1, len(texts)))
+
+    print(f"\nValutazione di {len(texts)} elementi su {num_shards} processi...")
+    start_time = time.perf_counter()
+
+    predicted_labels_ids = np.zeros(len(texts), dtype=np.int64)
+    if num_shards == 1:
+        probabilities, _ = predict_proba_sorted_by_length(sentiment_pipeline, texts, batch_size=batch_size)
+        predicted_labels_ids[:] = predicted_ids(probabilities)
+    else:
+        model = getattr(sentiment_pipeline, 'model', None)
+        if hasattr(model, "share_memory"):
+            model.share_memory()
+
+        # Forkserver e non fork: la pipeline può aver già eseguito inferenze in questo processo
+        context = process_context()
+        result_queue = context.Queue()
+        shards = [np.arange(shard, len(texts), num_shards) for shard in range(num_shards)]
+        workers = [
+            context.Process(target=_evaluate_shard,
+                            args=(sentiment_pipeline, texts, shard_indices, core_set, batch_size, result_queue),
+                            daemon=True)
+            for shard_indices, core_set in zip(shards, assign_core_sets(num_shards))
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            errors = _collect_shard_results(workers, result_queue, predicted_labels_ids)
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+        if errors:
+            raise RuntimeError(f"Errore in un processo di valutazione: {errors[0]}")
+
+    elapsed = time.perf_counter() - start_time
+    confusion = confusion_matrix(true_labels_ids, predicted_labels_ids)
+    accuracy = accuracy_of(true_labels_ids, predicted_labels_ids)
+    macro_f1 = float(per_class_metrics(confusion)[2].mean())
+    intervals = bootstrap_confidence_intervals(true_labels_ids, predicted_labels_ids,
+                                               num_samples=bootstrap_samples, confidence=confidence)
+    confidence = confidence or config.EVAL_CONFIDENCE_LEVEL
+
+    print(f"Throughput: {len(texts) / elapsed:.1f} testi/sec ({elapsed:.2f}s totali)")
+    print(f"\n--- Report di Valutazione ({len(texts)} elementi) ---")
+    print(f"Accuratezza: {accuracy:.4f} "
+          f"(IC {confidence:.0%}: {intervals['accuracy'][0]:.4f} - {intervals['accuracy'][1]:.4f})")
+    print(f"Macro-F1: {macro_f1:.4f} "
+          f"(IC {confidence:.0%}: {intervals['macro_f1'][0]:.4f} - {intervals['macro_f1'][1]:.4f})")
+    print("Matrice di confusione (righe = etichetta reale, colonne = predizione):")
+    print(confusion)
+    print("\nReport di Classificazione Dettagliato:")
+    print(classification_report_from_confusion(confusion))
+
+    return {
+        "texts": len(texts),
+        "shards": num_shards,
+        "seconds": elapsed,
+        "accuracy": accuracy,
+        "accuracy_ci": intervals['accuracy'],
+        "macro_f1": macro_f1,
+        "macro_f1_ci": intervals['macro_f1'],
+        "confusion_matrix": confusion.tolist(),
+    }
@@ -0,0 +1,217 @@
+# src/export.py
+
+import argparse
+import os
+import time
+
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+
+from src import config
+from src.artifact_store import resolve_model_path
+
+# Frasi usate per il controllo di parità tra modello eager e modello esportato
+PARITY_TEXTS = [
+    "I absolutely love this product, it is amazing!",
+    "Worst experience ever, I hate it.",
+    "The package arrived on Tuesday.",
+    "ok",
+    "Just love waiting 2 hours for customer support... #not",
+]
+
+# Batch del controllo di parità: oltre all'esempio del tracing, forme diverse da quella
+# tracciata (un solo testo corto, un batch più grande con un testo lungo e molto padding),
+# così un grafo che ha fissato batch size o lunghezza della sequenza viene scartato
+PARITY_BATCHES = [
+    PARITY_TEXTS,
+    ["ok"],
+    [" ".join(PARITY_TEXTS) * 8] + PARITY_TEXTS + ["meh"],
+]
+
+# Pesi del modello: se sono più recenti dell'artefatto, l'artefatto è obsoleto
+WEIGHT_FILES = ["model.safetensors", "pytorch_model.bin"]
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Adattatore per il tracing: restituisce solo il tensore dei logits."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=False)[0]
+
+
+def default_export_dir(model_name=None):
+    """
+    Cartella dove salvare/cercare l'artefatto: accanto ai pesi per un modello locale,
+    altrimenti config.EXPORT_DIR (per il modello base scaricato dal Hub).
+    """
+    if model_name and os.path.isdir(model_name):
+        return model_name
+    return config.EXPORT_DIR
+
+
+def find_traced_artifact(model_name=None):
+    """
+    Restituisce il percorso dell'artefatto TorchScript se presente e aggiornato, altrimenti None.
+    """
+    model_dir = default_export_dir(model_name)
+    artifact_path = os.path.join(model_dir, config.TRACED_MODEL_FILENAME)
+    if not os.path.isfile(artifact_path):
+        return None
+
+    artifact_mtime = os.path.getmtime(artifact_path)
+    for weight_file in WEIGHT_FILES:
+        weight_path = os.path.join(model_dir, weight_file)
+        if os.path.isfile(weight_path) and os.path.getmtime(weight_path) > artifact_mtime:
+            print(f"⚠️ Artefatto '{artifact_path}' più vecchio dei pesi: viene ignorato. Rieseguire l'export.")
+            return None
+
+    return artifact_path
+
+
+def _softmax_probabilities(logits):
+    return torch.softmax(logits.float(), dim=-1)
+
+
+class TracedSentimentPipeline:
+    """
+    Backend di inferenza basato sul grafo TorchScript esportato.
+
+    Si comporta come la pipeline `sentiment-analysis` di transformers:
+    accetta una stringa o una lista e restituisce [{'label': ..., 'score': ...}].
+    """
+
+    def __init__(self, model_dir, device="cpu"):
+        self.model_dir = model_dir
+        self.device = device
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.config = AutoConfig.from_pretrained(model_dir)
+        self.model = torch.jit.load(os.path.join(model_dir, config.TRACED_MODEL_FILENAME), map_location=device)
+        self.model.eval()
+
+    def warmup(self):
+        """Prima esecuzione a vuoto: il runtime TorchScript ottimizza il grafo alla prima chiamata."""
+        self(PARITY_TEXTS, batch_size=len(PARITY_TEXTS))
+
+    def preprocess(self, texts, truncation=True):
+        return self.tokenizer(texts, padding=True, truncation=truncation, return_tensors="pt")
+
+    def forward(self, encodings):
+        with torch.inference_mode():
+            return self.model(encodings['input_ids'].to(self.device), encodings['attention_mask'].to(self.device))
+
+    def logits(self, texts, truncation=True):
+        return self.forward(self.preprocess(texts, truncation))
+
+    def __call__(self, inputs, batch_size=None, truncation=True, top_k=1, **kwargs):
+        """Con `top_k=None` restituisce per ogni testo la distribuzione completa, come transformers."""
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        batch_size = batch_size or 1
+
+        results = []
+        for start in range(0, len(texts), batch_size):
+            probabilities = _softmax_probabilities(self.logits(texts[start:start + batch_size], truncation))
+            if top_k is None:
+                for row in probabilities.tolist():
+                    distribution = [{'label': self.config.id2label[i], 'score': score} for i, score in enumerate(row)]
+                    results.append(sorted(distribution, key=lambda item: item['score'], reverse=True))
+                continue
+            scores, label_ids = probabilities.max(dim=-1)
+            for score, label_id in zip(scores.tolist(), label_ids.tolist()):
+                results.append({'label': self.config.id2label[label_id], 'score': score})
+        return results
+
+
+def check_parity(eager_model, traced_model, tokenizer, texts=None, atol=None):
+    """
+    Confronta le probabilità del modello eager e di quello esportato.
+
+    Se `texts` è None il confronto si fa su tutti i PARITY_BATCHES, cioè anche su
+    batch size e lunghezze di sequenza diverse da quelle usate per il tracing.
+
+    Returns:
+        tuple: (parità rispettata (bool), massima differenza assoluta)
+    """
+    batches = [texts] if texts else PARITY_BATCHES
+    atol = atol if atol is not None else config.EXPORT_PARITY_ATOL
+
+    max_diff = 0.0
+    same_labels = True
+    for batch in batches:
+        encodings = tokenizer(batch, padding=True, truncation=True, return_tensors="pt")
+        with torch.inference_mode():
+            eager_probs = _softmax_probabilities(
+                eager_model(input_ids=encodings['input_ids'], attention_mask=encodings['attention_mask']).logits
+            )
+            try:
+                traced_probs = _softmax_probabilities(
+                    traced_model(encodings['input_ids'], encodings['attention_mask'])
+                )
+            except RuntimeError:
+                # Il grafo non accetta questa forma (dimensioni fissate durante il tracing)
+                return False, float("inf")
+
+        if eager_probs.shape != traced_probs.shape:
+            return False, float("inf")
+        max_diff = max(max_diff, (eager_probs - traced_probs).abs().max().item())
+        same_labels = same_labels and torch.equal(eager_probs.argmax(dim=-1), traced_probs.argmax(dim=-1))
+    return same_labels and max_diff <= atol, max_diff
+
+
+def export_traced_model(model_name=None, output_dir=None):
+    """
+    Esporta il modello (base o fine-tuned) come grafo TorchScript tracciato.
+
+    L'artefatto viene salvato accanto ai pesi (o in config.EXPORT_DIR per il modello
+    del Hub) insieme a tokenizer e configurazione, e viene mantenuto solo se le sue
+    uscite coincidono con quelle del modello eager.
+
+    Returns:
+        str | None: Il percorso dell'artefatto, oppure None se il controllo di parità fallisce.
+    """
+    target_model = model_name if model_name else config.MODEL_NAME
+    output_dir = output_dir or default_export_dir(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Export TorchScript del modello '{target_model}' in '{output_dir}'...")
+    source = resolve_model_path(target_model)
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    model = AutoModelForSequenceClassification.from_pretrained(source)
+    model.eval()
+
+    if os.path.abspath(output_dir) != os.path.abspath(target_model):
+        # Il backend esportato deve poter partire senza accedere al Hub
+        tokenizer.save_pretrained(output_dir)
+        model.config.save_pretrained(output_dir)
+
+    example = tokenizer(PARITY_TEXTS, padding=True, truncation=True, return_tensors="pt")
+    start_time = time.perf_counter()
+    with torch.no_grad():
+        traced = torch.jit.trace(_LogitsOnly(model), (example['input_ids'], example['attention_mask']),
+                                 check_trace=False)
+    traced = torch.jit.freeze(traced.eval())
+    print(f"Tracing completato in {time.perf_counter() - start_time:.2f}s.")
+
+    parity_ok, max_diff = check_parity(model, traced, tokenizer)
+    if not parity_ok:
+        print(f"❌ Controllo di parità fallito (differenza massima {max_diff:.2e}): artefatto non salvato.")
+        return None
+
+    artifact_path = os.path.join(output_dir, config.TRACED_MODEL_FILENAME)
+    traced.save(artifact_path)
+    print(f"✅ Parità verificata (differenza massima {max_diff:.2e}). Artefatto salvato in: {artifact_path}")
+    return artifact_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Esporta il modello di sentiment come grafo TorchScript.")
+    parser.add_argument("--model", default=None,
+                        help="Percorso o nome del modello (default: modello base di config).")
+    parser.add_argument("--output-dir", default=None,
+                        help="Cartella di destinazione (default: accanto ai pesi o config.EXPORT_DIR).")
+    args = parser.parse_args()
+
+    export_traced_model(args.model, args.output_dir)
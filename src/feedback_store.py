@@ -0,0 +1,253 @@
+# src/feedback_store.py
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+import pandas as pd
+
+from src import config
+
+COLUMNS = ["timestamp", "text", "model_prediction", "user_correction"]
+
+# Marcatore accodato da flush(): viene completato dopo il commit dei record precedenti
+_FLUSH = object()
+
+
+class FeedbackStore:
+    """
+    Archivio append-only delle correzioni degli utenti, basato su SQLite in modalità WAL.
+
+    Le scritture vengono bufferizzate da un thread dedicato e salvate con un "group
+    commit": tutte le correzioni arrivate nello stesso intervallo finiscono in un'unica
+    transazione. Più processi (es. worker Gradio) possono scrivere sullo stesso file:
+    SQLite serializza le transazioni e i lettori non bloccano gli scrittori.
+
+    Ogni record ha un `id` crescente e un indice sul timestamp, così retraining e
+    monitoraggio possono leggere solo i record nuovi.
+    """
+
+    def __init__(self, db_path=None, flush_interval_ms=None, max_batch=None):
+        """
+        Args:
+            db_path (str, optional): File SQLite. Default: config.FEEDBACK_DB_PATH.
+            flush_interval_ms (float, optional): Attesa massima prima del commit di un gruppo.
+                                                 Default: config.FEEDBACK_FLUSH_INTERVAL_MS.
+            max_batch (int, optional): Record massimi per commit. Default: config.FEEDBACK_MAX_BATCH.
+        """
+        self.db_path = db_path or config.FEEDBACK_DB_PATH
+        flush_interval_ms = flush_interval_ms if flush_interval_ms is not None else config.FEEDBACK_FLUSH_INTERVAL_MS
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch or config.FEEDBACK_MAX_BATCH
+
+        self._db = self._connect()
+        self._db_lock = threading.Lock()
+        self._create_schema()
+
+        self._queue = Queue()
+        self._writer = threading.Thread(target=self._run_writer, name="feedback-writer", daemon=True)
+        self._writer.start()
+
+    # --- CONNESSIONE E SCHEMA ---
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self.db_path,
+            timeout=config.FEEDBACK_BUSY_TIMEOUT_S,
+            check_same_thread=False,
+            isolation_level=None  # Transazioni gestite esplicitamente
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _create_schema(self):
+        with self._db_lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS corrections ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "timestamp TEXT NOT NULL, "
+                "text TEXT NOT NULL, "
+                "model_prediction TEXT, "
+                "user_correction TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_corrections_timestamp ON corrections (timestamp)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    # --- SCRITTURA ---
+
+    def append(self, timestamp, text, model_prediction, user_correction):
+        """
+        Accoda una correzione per il prossimo commit di gruppo.
+
+        Returns:
+            Future: Completato con l'id del record quando la transazione è stata salvata.
+        """
+        future = Future()
+        self._queue.put(((timestamp, text, model_prediction, user_correction), future))
+        return future
+
+    def append_many(self, records, metadata=None):
+        """
+        Scrive subito una lista di tuple (timestamp, text, model_prediction, user_correction).
+        Le coppie in `metadata` vengono salvate nella stessa transazione.
+        """
+        return self._commit(list(records), metadata)
+
+    def _commit(self, records, metadata=None):
+        if not records and not metadata:
+            return []
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._db.executemany(
+                    "INSERT INTO corrections (timestamp, text, model_prediction, user_correction) "
+                    "VALUES (?, ?, ?, ?)",
+                    records
+                )
+                inserted = cursor.rowcount if records else 0
+                last_id = self._db.execute("SELECT last_insert_rowid()").fetchone()[0]
+                for key, value in (metadata or {}).items():
+                    self._db.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)", (key, str(value)))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        # La transazione è esclusiva: gli id inseriti sono contigui fino a last_id
+        return list(range(last_id - inserted + 1, last_id + 1))
+
+    def _run_writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    next_item = self._queue.get(timeout=remaining)
+                except Empty:
+                    break
+                if next_item is None:
+                    stop = True
+                    break
+                batch.append(next_item)
+
+            records = [(record, future) for record, future in batch if record is not _FLUSH]
+            try:
+                ids = self._commit([record for record, _ in records])
+                for (_, future), record_id in zip(records, ids):
+                    future.set_result(record_id)
+            except Exception as e:
+                for _, future in records:
+                    future.set_exception(e)
+
+            for record, future in batch:
+                if record is _FLUSH:
+                    future.set_result(None)
+
+            if stop:
+                return
+
+    def flush(self):
+        """Attende che tutte le correzioni accodate finora siano salvate."""
+        marker = Future()
+        self._queue.put((_FLUSH, marker))
+        marker.result()
+
+    def close(self):
+        """Salva le correzioni in coda e chiude l'archivio."""
+        self._queue.put(None)
+        self._writer.join()
+        with self._db_lock:
+            self._db.close()
+
+    # --- LETTURA ---
+
+    def read_since(self, last_id=0, limit=None):
+        """
+        Restituisce un DataFrame con i record con id > last_id, ordinati per id.
+        I lettori salvano l'ultimo id visto per leggere solo i record nuovi.
+        """
+        query = ("SELECT id, timestamp, text, model_prediction, user_correction "
+                 "FROM corrections WHERE id > ? ORDER BY id")
+        params = [last_id]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._db_lock:
+            return pd.read_sql_query(query, self._db, params=params)
+
+    def sample_until(self, until_id, limit):
+        """
+        Campione casuale di al più `limit` record con id <= until_id, ordinato per id.
+        Il campionamento avviene in SQLite: in memoria arrivano solo le righe estratte.
+        """
+        query = ("SELECT id, timestamp, text, model_prediction, user_correction FROM ("
+                 "SELECT * FROM corrections WHERE id <= ? ORDER BY random() LIMIT ?) ORDER BY id")
+        with self._db_lock:
+            return pd.read_sql_query(query, self._db, params=[until_id, limit])
+
+    def read_since_timestamp(self, timestamp):
+        """Restituisce i record con timestamp successivo a quello dato (usa l'indice)."""
+        query = ("SELECT id, timestamp, text, model_prediction, user_correction "
+                 "FROM corrections WHERE timestamp > ? ORDER BY id")
+        with self._db_lock:
+            return pd.read_sql_query(query, self._db, params=[timestamp])
+
+    def count(self):
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM corrections").fetchone()[0]
+
+    def max_id(self):
+        with self._db_lock:
+            return self._db.execute("SELECT COALESCE(MAX(id), 0) FROM corrections").fetchone()[0]
+
+    # --- METADATI ---
+
+    def get_metadata(self, key, default=None):
+        with self._db_lock:
+            row = self._db.execute("SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_metadata(self, key, value):
+        with self._db_lock:
+            self._db.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def migrate_csv(csv_path, store, chunk_size=10000):
+    """
+    Importa nel FeedbackStore le correzioni del vecchio CSV (flagged_data_corrected.csv).
+
+    La migrazione è idempotente e incrementale: il numero di righe già importate viene
+    salvato nei metadati, quindi eseguirla di nuovo importa solo le righe aggiunte al CSV.
+
+    Returns:
+        int: Numero di righe importate.
+    """
+    if not os.path.exists(csv_path):
+        return 0
+
+    metadata_key = f"migrated_csv:{os.path.abspath(csv_path)}"
+    already_imported = int(store.get_metadata(metadata_key, 0))
+
+    imported = 0
+    reader = pd.read_csv(csv_path, chunksize=chunk_size, skiprows=range(1, already_imported + 1),
+                         dtype=str, keep_default_na=False)
+    for chunk in reader:
+        records = [tuple(row) for row in chunk[COLUMNS].itertuples(index=False)]
+        imported += len(records)
+        # Record e contatore nella stessa transazione: un'interruzione non crea duplicati
+        store.append_many(records, metadata={metadata_key: already_imported + imported})
+
+    if imported:
+        print(f"Migrate {imported} correzioni da '{csv_path}' a '{store.db_path}'.")
+    return imported
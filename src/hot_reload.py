@@ -0,0 +1,300 @@
+# src/hot_reload.py
+
+import gc
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from src import config
+
+
+def check_golden_examples(sentiment_pipeline, golden_examples=None):
+    """
+    Verifica il modello sulle frasi inequivocabili di config.GOLDEN_EXAMPLES
+    (le stesse del test anti-degrado in tests/test_model.py).
+
+    Returns:
+        list[tuple]: Gli esempi sbagliati come (testo, etichetta attesa, etichetta predetta).
+                     Lista vuota se il modello li classifica tutti correttamente.
+    """
+    golden_examples = golden_examples or config.GOLDEN_EXAMPLES
+    texts = list(golden_examples)
+    results = sentiment_pipeline(texts, batch_size=len(texts))
+    return [
+        (text, golden_examples[text], result['label'].lower())
+        for text, result in zip(texts, results)
+        if result['label'].lower() != golden_examples[text]
+    ]
+
+
+def directory_signature(paths):
+    """
+    Impronta dei file contenuti nelle cartelle (nome, dimensione, data di modifica).
+    Cambia quando un retraining sovrascrive il modello o il suo export.
+    """
+    signature = []
+    for path in paths:
+        if not os.path.isdir(path):
+            continue
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue  # File rimosso durante la scansione
+                signature.append((file_path, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(signature))
+
+
+class ServingStack:
+    """
+    Pipeline del modello con il micro-batcher e la cache costruiti sopra di essa
+    e il limite di lunghezza degli input (legato al tokenizer del modello).
+    `model_name` è il percorso o nome del modello caricato (mostrato nell'interfaccia).
+    """
+
+    def __init__(self, sentiment_pipeline, batcher, cached_pipeline, length_policy=None, model_name=None):
+        self.sentiment_pipeline = sentiment_pipeline
+        self.batcher = batcher
+        self.cached_pipeline = cached_pipeline
+        self.length_policy = length_policy
+        self.model_name = model_name
+
+    def close(self):
+        """Smaltisce le richieste già in coda e ferma batcher ed eventuali worker."""
+        self.batcher.close()
+        close = getattr(self.sentiment_pipeline, 'close', None)
+        if close is not None:
+            close()
+
+
+class _Slot:
+    def __init__(self, value):
+        self.value = value
+        self.active_requests = 0
+        self.retired = False
+
+
+class HotSwapper:
+    """
+    Riferimento al modello in servizio, sostituibile senza fermare l'applicazione.
+
+    Ogni richiesta usa `acquire()` per tutta la sua durata: dopo `swap()` le nuove
+    richieste vedono il nuovo modello, mentre quelle già in corso terminano sul
+    vecchio. Il vecchio modello viene chiuso e la sua memoria liberata solo quando
+    l'ultima richiesta che lo sta usando è terminata.
+    """
+
+    def __init__(self, initial, release=None):
+        """
+        Args:
+            initial: L'oggetto in servizio all'avvio (es. un ServingStack).
+            release (callable, optional): Chiamata con l'oggetto sostituito quando non è
+                                          più usato. Default: `release_stack`.
+        """
+        self._lock = threading.Lock()
+        self._slot = _Slot(initial)
+        self._release = release or release_stack
+
+    @property
+    def current(self):
+        return self._slot.value
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            slot = self._slot
+            slot.active_requests += 1
+        try:
+            yield slot.value
+        finally:
+            with self._lock:
+                slot.active_requests -= 1
+                release_now = slot.retired and slot.active_requests == 0
+            if release_now:
+                self._release(slot.value)
+
+    def swap(self, new_value):
+        """Mette in servizio `new_value` e restituisce l'oggetto sostituito."""
+        with self._lock:
+            old_slot = self._slot
+            self._slot = _Slot(new_value)
+            old_slot.retired = True
+            release_now = old_slot.active_requests == 0
+        if release_now:
+            self._release(old_slot.value)
+        return old_slot.value
+
+
+def release_stack(stack):
+    """Chiude un ServingStack sostituito e restituisce la sua memoria."""
+    import torch
+
+    stack.close()
+    del stack
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    print("♻️ Modello precedente rilasciato.")
+
+
+class ModelReloader:
+    """
+    Ricarica il modello in background quando cambia la sua cartella o su segnale.
+
+    Il nuovo modello viene caricato mentre il vecchio continua a servire le richieste,
+    e il suo ServingStack (pool di worker compreso) viene costruito subito. La verifica
+    sugli esempi di config.GOLDEN_EXAMPLES passa dallo stack, cioè dallo stesso percorso
+    delle richieste, entro config.MODEL_RELOAD_CHECK_TIMEOUT_S: se il modello sbaglia
+    anche un esempio, o la verifica non termina, lo stack viene scartato. Solo uno stack
+    valido viene messo in servizio con `HotSwapper.swap`.
+
+    Poiché `retrain.py` scrive i file uno alla volta, un cambiamento viene considerato
+    completo solo quando l'impronta della cartella resta uguale per due controlli di fila.
+    """
+
+    def __init__(self, swapper, load_pipeline, build_stack, watch_dirs, poll_interval_s=None,
+                 golden_examples=None, metrics=None, check_timeout_s=None, release=None):
+        """
+        Args:
+            swapper (HotSwapper): Riferimento al modello in servizio.
+            load_pipeline (callable): Carica e restituisce la nuova pipeline.
+            build_stack (callable): Costruisce il ServingStack a partire dalla pipeline.
+            watch_dirs (list[str]): Cartelle da osservare (modello ed eventuale export).
+            poll_interval_s (float, optional): Default: config.MODEL_RELOAD_POLL_S.
+            golden_examples (dict, optional): Default: config.GOLDEN_EXAMPLES.
+            metrics (Metrics, optional): Registro in cui contare i ricaricamenti.
+            check_timeout_s (float, optional): Default: config.MODEL_RELOAD_CHECK_TIMEOUT_S.
+            release (callable, optional): Rilascia uno stack scartato. Default: quello dello swapper.
+        """
+        self.swapper = swapper
+        self.load_pipeline = load_pipeline
+        self.build_stack = build_stack
+        self.watch_dirs = list(watch_dirs)
+        self.poll_interval = poll_interval_s or config.MODEL_RELOAD_POLL_S
+        self.golden_examples = golden_examples
+        self.metrics = metrics
+        self.check_timeout = check_timeout_s or config.MODEL_RELOAD_CHECK_TIMEOUT_S
+        self.release = release or swapper._release
+
+        self._reload_lock = threading.Lock()
+        self._loaded_signature = directory_signature(self.watch_dirs)
+        self._pending_signature = None
+        self._stop_event = threading.Event()
+        self._watcher = None
+
+    def _count(self, result):
+        if self.metrics is not None:
+            self.metrics.inc("model_reloads", result=result)
+
+    def reload(self):
+        """
+        Carica, verifica e mette in servizio un nuovo modello (bloccante).
+
+        Returns:
+            bool: True se il nuovo modello è in servizio.
+        """
+        with self._reload_lock:
+            print("🔄 Ricaricamento del modello in background...")
+            try:
+                start = time.perf_counter()
+                new_stack = self.build_stack(self.load_pipeline())
+                load_seconds = time.perf_counter() - start
+            except Exception as e:
+                print(f"❌ Ricaricamento fallito, resta in servizio il modello attuale: {e!r}")
+                self._count("error")
+                return False
+
+            try:
+                # La verifica serve anche da warm-up prima di ricevere traffico
+                failures = self._check_stack(new_stack)
+            except Exception as e:
+                print(f"❌ Verifica del nuovo modello fallita, resta in servizio il modello attuale: {e!r}")
+                self._count("error")
+                # Uno stack bloccato potrebbe non chiudersi: il rilascio avviene in background
+                threading.Thread(target=self.release, args=(new_stack,), name="model-release", daemon=True).start()
+                return False
+
+            if failures:
+                print("❌ Nuovo modello rifiutato: sbaglia gli esempi di riferimento:")
+                for text, expected, predicted in failures:
+                    print(f"   '{text}': {predicted} invece di {expected}")
+                self._count("rejected")
+                self.release(new_stack)
+                return False
+
+            self.swapper.swap(new_stack)
+            if self.metrics is not None:
+                self.metrics.set_gauge("model_load_seconds", load_seconds)
+            self._count("ok")
+            print(f"✅ Nuovo modello in servizio (caricato in {load_seconds:.1f}s).")
+            return True
+
+    def _check_stack(self, stack):
+        """
+        Esegue `check_golden_examples` sulla pipeline dello stack (pool e cascata compresi)
+        in un thread separato. Solleva TimeoutError se non termina entro il tempo massimo.
+        """
+        target = getattr(stack, 'sentiment_pipeline', stack)
+        result = Future()
+
+        def run():
+            try:
+                result.set_result(check_golden_examples(target, self.golden_examples))
+            except Exception as e:
+                result.set_exception(e)
+
+        threading.Thread(target=run, name="model-reload-check", daemon=True).start()
+        return result.result(timeout=self.check_timeout)
+
+    def check_for_changes(self):
+        """
+        Controlla le cartelle osservate e ricarica il modello se sono cambiate e stabili.
+
+        Returns:
+            bool: True se è stato tentato un ricaricamento.
+        """
+        signature = directory_signature(self.watch_dirs)
+        if not signature or signature == self._loaded_signature:
+            self._pending_signature = None
+            return False
+        if signature != self._pending_signature:
+            # Scrittura forse ancora in corso: aspettiamo il prossimo controllo
+            self._pending_signature = signature
+            return False
+
+        # Anche un modello rifiutato non viene ritentato finché i file non cambiano di nuovo
+        self._loaded_signature = signature
+        self._pending_signature = None
+        self.reload()
+        return True
+
+    def request_reload(self):
+        """Avvia un ricaricamento in un thread separato (es. da un gestore di segnale)."""
+        threading.Thread(target=self.reload, name="model-reload", daemon=True).start()
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.check_for_changes()
+            except Exception as e:
+                print(f"⚠️ Errore nel controllo della cartella del modello: {e!r}")
+
+    def start(self, reload_signal=getattr(signal, "SIGHUP", None)):
+        """
+        Avvia il controllo periodico delle cartelle e, se possibile, installa un gestore
+        per `reload_signal` (es. `kill -HUP <pid>` forza il ricaricamento).
+        """
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+        if reload_signal is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(reload_signal, lambda signum, frame: self.request_reload())
+
+    def stop(self):
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join()
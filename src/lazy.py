@@ -0,0 +1,57 @@
+# src/lazy.py
+
+import threading
+import time
+
+
+class LazyResource:
+    """
+    Risorsa costosa (modello, archivio, ...) creata solo al primo utilizzo.
+
+    `get()` crea la risorsa la prima volta e poi restituisce sempre la stessa istanza;
+    chiamate concorrenti durante la creazione attendono lo stesso caricamento.
+    `preload()` avvia la creazione in background, così il processo è subito pronto
+    a rispondere (es. ai controlli di salute) mentre il modello si carica.
+    """
+
+    def __init__(self, factory, name):
+        """
+        Args:
+            factory (callable): Funzione senza argomenti che crea la risorsa.
+            name (str): Nome usato nei messaggi di log.
+        """
+        self.factory = factory
+        self.name = name
+        self.load_seconds = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                # Se la creazione fallisce non viene salvato nulla: la prossima chiamata riprova
+                self._value = self.factory()
+                self.load_seconds = time.perf_counter() - start
+                self._loaded = True
+                print(f"✅ {self.name} pronto in {self.load_seconds:.1f}s.")
+        return self._value
+
+    def preload(self):
+        """Avvia la creazione della risorsa in un thread in background."""
+        def run():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"⚠️ Precaricamento di {self.name} fallito (verrà ritentato alla prima richiesta): {e!r}")
+
+        thread = threading.Thread(target=run, name=f"preload-{self.name}", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,160 @@
+# src/long_text.py
+
+import numpy as np
+
+from src import config
+
+# Strategie per i testi più lunghi del limite di token
+TRUNCATION_STRATEGIES = ("head", "tail", "head+tail", "chunk")
+# Limite minimo accettato: sotto questa soglia resterebbero solo i token speciali
+MIN_MAX_TOKENS = 8
+
+
+class LengthPolicy:
+    """
+    Limite di lunghezza degli input prima del modello.
+
+    I testi entro `max_tokens` passano invariati. Quelli più lunghi vengono tagliati
+    (inizio, fine o inizio + fine) oppure divisi in blocchi sovrapposti che vengono
+    valutati insieme e aggregati. Il taglio avviene sul testo originale, usando le
+    posizioni dei token nel testo: funziona con qualsiasi backend (eager, TorchScript,
+    pool di worker, cascata) e la cache continua a lavorare sui testi.
+    """
+
+    def __init__(self, tokenizer, max_tokens=None, strategy=None, head_fraction=None, chunk_overlap=None,
+                 max_chunks=None, metrics=None):
+        """
+        Args:
+            tokenizer: Tokenizer del modello in servizio (None = nessun limite applicato).
+            max_tokens (int, optional): Token massimi per testo, inclusi quelli speciali.
+                                        Default: config.INPUT_MAX_TOKENS.
+            strategy (str, optional): Una di TRUNCATION_STRATEGIES. Default: config.TRUNCATION_STRATEGY.
+            head_fraction (float, optional): Quota del limite data all'inizio del testo con "head+tail".
+            chunk_overlap (int, optional): Token in comune tra blocchi consecutivi con "chunk".
+            max_chunks (int, optional): Blocchi massimi per testo; oltre si valuta solo l'inizio.
+            metrics (Metrics, optional): Registro in cui contare percorsi e lunghezze degli input.
+        """
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens or config.INPUT_MAX_TOKENS
+        self.strategy = strategy or config.TRUNCATION_STRATEGY
+        self.head_fraction = head_fraction if head_fraction is not None else config.TRUNCATION_HEAD_FRACTION
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else config.CHUNK_OVERLAP_TOKENS
+        self.max_chunks = max_chunks or config.CHUNK_MAX_CHUNKS
+        self.metrics = metrics
+        self._special_tokens = tokenizer.num_special_tokens_to_add(pair=False) if tokenizer is not None else 0
+        validate_options(self.max_tokens, self.strategy)
+
+    def split(self, text, max_tokens=None, strategy=None):
+        """
+        Prepara un testo per il modello.
+
+        Returns:
+            tuple: (segmenti da valutare, pesi dei segmenti, percorso seguito). Il percorso è
+                   "fits" se il testo entra nel limite, altrimenti il nome della strategia.
+        """
+        max_tokens = max_tokens or self.max_tokens
+        strategy = strategy or self.strategy
+        budget = max_tokens - self._special_tokens
+
+        # Ogni token copre almeno un byte del testo: i testi brevi (quasi tutti i tweet)
+        # non vengono nemmeno tokenizzati
+        if self.tokenizer is None or len(text.encode("utf-8")) <= budget:
+            return [text], [1.0], self._record("fits")
+
+        spans = self._token_spans(text)
+        num_tokens = len(spans)
+        if self.metrics is not None:
+            self.metrics.observe("input_tokens", num_tokens + self._special_tokens, buckets=config.INPUT_TOKEN_BUCKETS)
+        if num_tokens <= budget:
+            return [text], [1.0], self._record("fits")
+
+        if strategy == "head":
+            segments, weights = [self._fit(lambda kept: _cut(text, spans, 0, kept), budget, budget)], [1.0]
+        elif strategy == "tail":
+            segments = [self._fit(lambda kept: _cut(text, spans, num_tokens - kept, num_tokens), budget, budget)]
+            weights = [1.0]
+        elif strategy == "head+tail":
+            def head_and_tail(kept):
+                head = min(max(1, int(round(kept * self.head_fraction))), kept - 1)
+                return _cut(text, spans, 0, head) + " " + _cut(text, spans, num_tokens - (kept - head), num_tokens)
+            segments, weights = [self._fit(head_and_tail, budget, budget, min_kept=2)], [1.0]
+        else:
+            segments, weights = self._chunks(text, spans, budget)
+
+        if self.metrics is not None:
+            kept = sum(weights) if strategy == "chunk" else budget
+            self.metrics.inc("input_tokens_dropped", max(0, num_tokens - int(kept)))
+            self.metrics.observe("input_segments", len(segments), buckets=config.INPUT_SEGMENT_BUCKETS)
+        return segments, weights, self._record(strategy)
+
+    def _chunks(self, text, spans, budget):
+        """Blocchi di `budget` token sovrapposti di `chunk_overlap`; il peso è il numero di token nuovi."""
+        stride = max(1, budget - min(self.chunk_overlap, budget - 1))
+        segments, weights = [], []
+        start = previous_end = 0
+        while len(segments) < self.max_chunks:
+            end = min(start + budget, len(spans))
+            segments.append(self._fit(lambda kept: _cut(text, spans, start, start + kept), end - start, budget))
+            # Ogni token conta una volta sola: la sovrapposizione non pesa due volte
+            weights.append(float(end - previous_end))
+            if end == len(spans):
+                break
+            start, previous_end = start + stride, end
+        return segments, weights
+
+    def _fit(self, cut, kept, budget, min_kept=1):
+        """
+        Segmento `cut(kept)` con al massimo `budget` token una volta ritokenizzato da solo.
+
+        I token di un segmento tagliato dal testo non sono sempre quelli che il tokenizer
+        produce sul segmento: ai bordi tagliati (a metà parola o alla giunzione di inizio +
+        fine) le fusioni BPE cambiano e i token possono aumentare. In quel caso si tolgono
+        dal segmento tanti token quanti sono quelli in eccesso e si ricontrolla.
+        """
+        while True:
+            segment = cut(kept)
+            excess = len(self._token_spans(segment)) - budget
+            if excess <= 0 or kept <= min_kept:
+                return segment
+            kept = max(min_kept, kept - excess)
+
+    def _token_spans(self, text):
+        """Posizioni (inizio, fine) nel testo di ogni token, senza token speciali (tokenizer "fast")."""
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return encoding["offset_mapping"]
+
+    def _record(self, path):
+        if self.metrics is not None:
+            self.metrics.inc("input_length_path", path=path)
+        return path
+
+
+def _cut(text, spans, start, end):
+    """Porzione del testo originale che contiene i token da `start` (incluso) a `end` (escluso)."""
+    return text[spans[start][0]:spans[end - 1][1]].strip()
+
+
+def validate_options(max_tokens, strategy):
+    """Controlla le opzioni di lunghezza (anche quelle arrivate con una richiesta)."""
+    if strategy not in TRUNCATION_STRATEGIES:
+        raise ValueError(f"Strategia di troncamento non valida: '{strategy}' "
+                         f"(valori ammessi: {', '.join(TRUNCATION_STRATEGIES)}).")
+    upper = config.INPUT_MAX_TOKENS_LIMIT
+    if not isinstance(max_tokens, int) or isinstance(max_tokens, bool) or not MIN_MAX_TOKENS <= max_tokens <= upper:
+        raise ValueError(f"max_tokens non valido: {max_tokens!r} (intero tra {MIN_MAX_TOKENS} e {upper}).")
+
+
+def aggregate_distributions(distributions, weights):
+    """
+    Media pesata delle distribuzioni dei segmenti di un testo (una lista di
+    {'label', 'score'} per segmento), ordinata dalla classe più probabile.
+    """
+    if len(distributions) == 1:
+        return distributions[0]
+    weights = np.asarray(weights, dtype=np.float64)
+    labels = sorted({item['label'] for item in distributions[0]})
+    scores = np.array([[{item['label']: item['score'] for item in distribution}.get(label, 0.0) for label in labels]
+                       for distribution in distributions])
+    averaged = weights @ scores / weights.sum()
+    return sorted(({'label': label, 'score': float(score)} for label, score in zip(labels, averaged)),
+                  key=lambda item: item['score'], reverse=True)
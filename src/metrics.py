@@ -0,0 +1,302 @@
+# src/metrics.py
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from src import config
+
+# Prefisso comune di tutte le metriche esportate
+METRIC_PREFIX = "sentiment_"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def _flatten(values, prefix=""):
+    """Appiattisce un dizionario annidato tenendo solo i valori numerici."""
+    flat = {}
+    for key, value in values.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix=f"{name}_"))
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+
+class Histogram:
+    """Istogramma a bucket fissi, cumulativo come quelli di Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[i] += 1
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "buckets": dict(zip(self.buckets, self.counts)),
+        }
+
+
+class Metrics:
+    """
+    Registro delle metriche dell'applicazione: contatori, gauge e istogrammi,
+    ognuno con etichette opzionali (es. stage="tokenize").
+
+    Le metriche già calcolate da altri componenti (statistiche del batcher e della
+    cache) vengono lette al momento dell'esportazione tramite i "collector",
+    senza duplicarne i contatori.
+    """
+
+    def __init__(self, latency_buckets=None):
+        self.latency_buckets = latency_buckets or config.METRICS_LATENCY_BUCKETS
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = float(value)
+
+    def observe(self, name, value, buckets=None, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets or self.latency_buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Misura la durata del blocco (in secondi) nell'istogramma `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def add_collector(self, name, collect):
+        """
+        Registra una funzione senza argomenti che restituisce un dizionario di statistiche
+        (es. `batcher.stats`): i valori numerici vengono esportati come gauge `<name>_<chiave>`.
+        """
+        self._collectors[name] = collect
+
+    def _collected(self):
+        collected = {}
+        for name, collect in list(self._collectors.items()):
+            for key, value in _flatten(collect(), prefix=f"{name}_").items():
+                collected[(key, ())] = value
+        return collected
+
+    # --- ESPORTAZIONE ---
+
+    def snapshot(self):
+        """Tutte le metriche in un dizionario serializzabile in JSON."""
+        def label_name(name, labels):
+            return name + _format_labels(labels)
+
+        with self._lock:
+            result = {
+                "counters": {label_name(n, l): v for (n, l), v in self._counters.items()},
+                "gauges": {label_name(n, l): v for (n, l), v in self._gauges.items()},
+                "histograms": {label_name(n, l): h.snapshot() for (n, l), h in self._histograms.items()},
+            }
+        result["gauges"].update({name: value for (name, _), value in self._collected().items()})
+        return result
+
+    def render_prometheus(self):
+        """Restituisce le metriche nel formato testuale di esposizione di Prometheus."""
+        lines = []
+
+        def group(items):
+            by_name = {}
+            for (name, labels), value in items:
+                by_name.setdefault(name, []).append((labels, value))
+            return sorted(by_name.items())
+
+        with self._lock:
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+            histograms = [(key, (list(h.buckets), list(h.counts), h.count, h.sum))
+                          for key, h in self._histograms.items()]
+        gauges += list(self._collected().items())
+
+        for name, samples in group(counters):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name}_total counter")
+            for labels, value in samples:
+                lines.append(f"{METRIC_PREFIX}{name}_total{_format_labels(labels)} {value}")
+
+        for name, samples in group(gauges):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} gauge")
+            for labels, value in samples:
+                lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {value}")
+
+        for name, samples in group(histograms):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+            for labels, (buckets, counts, count, total) in samples:
+                for upper_bound, bucket_count in zip(buckets, counts):
+                    bucket_labels = labels + (("le", repr(float(upper_bound))),)
+                    lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(bucket_labels)} {bucket_count}")
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{METRIC_PREFIX}{name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{METRIC_PREFIX}{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Registro condiviso dall'applicazione
+METRICS = Metrics()
+
+
+# --- STRUMENTAZIONE DELLA PIPELINE ---
+
+def instrument_pipeline(sentiment_pipeline, metrics=None):
+    """
+    Misura separatamente gli stadi della pipeline: tokenizzazione (`preprocess`),
+    forward pass (`forward`) e post-elaborazione (`postprocess`).
+
+    I metodi vengono avvolti sull'istanza, quindi valgono sia per la pipeline di
+    transformers sia per il backend TorchScript. Con batch_size > 1 la pipeline di
+    transformers tokenizza un testo alla volta e fa la forward pass per batch:
+    gli istogrammi vanno letti di conseguenza.
+    """
+    metrics = metrics or METRICS
+    stages = {"preprocess": "tokenize", "forward": "model", "postprocess": "postprocess"}
+
+    for method_name, stage in stages.items():
+        method = getattr(sentiment_pipeline, method_name, None)
+        if method is None:
+            continue
+
+        def timed(*args, _method=method, _stage=stage, **kwargs):
+            with metrics.time("stage_seconds", stage=_stage):
+                return _method(*args, **kwargs)
+
+        setattr(sentiment_pipeline, method_name, timed)
+    return sentiment_pipeline
+
+
+# --- ESPOSIZIONE ---
+
+def start_metrics_server(metrics=None, port=None, host=None, profiler=None, ready=None, enable_profiler=None):
+    """
+    Avvia in un thread un piccolo server HTTP con:
+      - GET /metrics: metriche in formato Prometheus;
+      - GET /healthz: il processo è attivo (risponde subito, anche durante il caricamento);
+      - GET /readyz: 200 se `ready()` è vero (es. modello caricato), altrimenti 503;
+      - GET /profile/start?interval_ms=N e /profile/stop: accende e spegne il
+        profiler a campionamento senza riavviare l'applicazione. /profile/stop
+        restituisce gli stack raccolti in formato "collapsed" (per flame graph).
+        Solo con `enable_profiler` (default: config.PROFILER_ENDPOINT_ENABLED).
+
+    Il server ascolta su config.METRICS_HOST (default: solo locale).
+    """
+    from src.profiler import SamplingProfiler
+
+    metrics = metrics or METRICS
+    port = port if port is not None else config.METRICS_PORT
+    host = host or config.METRICS_HOST
+    if enable_profiler is None:
+        enable_profiler = config.PROFILER_ENDPOINT_ENABLED
+    profiler = profiler or SamplingProfiler()
+    if host not in ("127.0.0.1", "localhost", "::1"):
+        print(f"⚠️ Server delle metriche esposto su '{host}': nessuna autenticazione, "
+              "limitarne l'accesso (firewall o proxy).")
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/metrics":
+                self._reply(200, metrics.render_prometheus())
+            elif url.path == "/healthz":
+                self._reply(200, "ok\n")
+            elif url.path == "/readyz":
+                is_ready = ready is None or ready()
+                self._reply(200 if is_ready else 503, "ready\n" if is_ready else "loading\n")
+            elif url.path.startswith("/profile/") and not enable_profiler:
+                self._reply(404, "not found\n")
+            elif url.path == "/profile/start":
+                interval_ms = parse_qs(url.query).get("interval_ms", [None])[0]
+                try:
+                    interval_ms = float(interval_ms) if interval_ms else None
+                except ValueError:
+                    interval_ms = math.nan
+                if interval_ms is not None and not (math.isfinite(interval_ms) and interval_ms > 0):
+                    self._reply(400, "interval_ms deve essere un numero positivo\n")
+                    return
+                started = profiler.start(interval_ms)
+                self._reply(200, "profiler avviato\n" if started else "profiler già attivo\n")
+            elif url.path == "/profile/stop":
+                profiler.stop()
+                self._reply(200, profiler.collapsed())
+            else:
+                self._reply(404, "not found\n")
+
+        def log_message(self, format, *args):
+            pass  # Nessun log per ogni scrape
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📊 Metriche disponibili su http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def start_periodic_dump(metrics=None, path=None, interval_s=None):
+    """
+    Scrive periodicamente le metriche in formato Prometheus su file (es. per il
+    textfile collector di node_exporter). La scrittura è atomica.
+    """
+    metrics = metrics or METRICS
+    path = path or config.METRICS_DUMP_PATH
+    interval_s = interval_s or config.METRICS_DUMP_INTERVAL_S
+    stop_event = threading.Event()
+
+    def run():
+        while not stop_event.wait(interval_s):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(metrics.render_prometheus())
+            os.replace(tmp_path, path)
+
+    threading.Thread(target=run, name="metrics-dump", daemon=True).start()
+    return stop_event
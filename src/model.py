@@ -1,10 +1,80 @@
 # src/model.py
 
-from transformers import pipeline
 from src import config
 
 
-def load_sentiment_pipeline(device, model_name=None):
+def quantize_pipeline(sentiment_pipeline):
+    """
+    Crea una nuova pipeline con i layer Linear del modello quantizzati dinamicamente
+    in int8 (pesi int8, attivazioni quantizzate al volo). Funziona solo su CPU.
+    La pipeline originale (fp32) non viene modificata.
+    """
+    import torch
+    from transformers import pipeline
+
+    quantized_model = torch.ao.quantization.quantize_dynamic(
+        sentiment_pipeline.model,
+        {torch.nn.Linear},
+        dtype=torch.qint8
+    )
+
+    return pipeline(
+        "sentiment-analysis",
+        model=quantized_model,
+        tokenizer=sentiment_pipeline.tokenizer,
+        device="cpu",
+        truncation=True
+    )
+
+
+def check_quantization_accuracy(fp32_pipeline, quantized_pipeline, dataset, tolerance=None, sample_size=None):
+    """
+    Guardia di accuratezza per il modello quantizzato.
+    Valuta entrambe le pipeline con `evaluate_model` sullo stesso campione e
+    verifica che la perdita di accuratezza non superi la tolleranza.
+
+    Returns:
+        tuple: (quantizzato_accettato (bool), accuratezza fp32, accuratezza int8)
+    """
+    # Import locale: evaluate serve solo quando la guardia è attiva
+    from src.evaluate import evaluate_model
+
+    tolerance = tolerance if tolerance is not None else config.QUANTIZATION_ACCURACY_TOLERANCE
+    sample_size = sample_size or config.QUANTIZATION_GUARD_SAMPLE_SIZE
+
+    print("\n--- Guardia di accuratezza: modello fp32 ---")
+    fp32_accuracy = evaluate_model(fp32_pipeline, dataset, sample_size=sample_size)
+    print("\n--- Guardia di accuratezza: modello int8 ---")
+    int8_accuracy = evaluate_model(quantized_pipeline, dataset, sample_size=sample_size)
+
+    accepted = (fp32_accuracy - int8_accuracy) <= tolerance
+    return accepted, fp32_accuracy, int8_accuracy
+
+
+def _load_traced_pipeline(device, model_name, required=False):
+    """
+    Carica il backend TorchScript se l'artefatto esportato è disponibile.
+    Restituisce None (fallback alla pipeline eager) se l'artefatto manca.
+    """
+    from src.export import TracedSentimentPipeline, default_export_dir, find_traced_artifact
+
+    if find_traced_artifact(model_name) is None:
+        if required:
+            raise FileNotFoundError(
+                f"Nessun artefatto TorchScript in '{default_export_dir(model_name)}'. "
+                "Eseguire prima: python -m src.export"
+            )
+        return None
+
+    model_dir = default_export_dir(model_name)
+    print(f"Caricamento del modello esportato (TorchScript) da '{model_dir}' sul dispositivo '{device}'...")
+    traced_pipeline = TracedSentimentPipeline(model_dir, device=device)
+    traced_pipeline.warmup()
+    print("Modello esportato caricato con successo.")
+    return traced_pipeline
+
+
+def load_sentiment_pipeline(device, model_name=None, quantize=None, guard_dataset=None, backend=None, profile=None):
     """
     Carica la pipeline di sentiment analysis.
 
@@ -12,17 +82,82 @@ def load_sentiment_pipeline(device, model_name=None):
         device (str): Il dispositivo su cui caricare il modello ('mps', 'cpu', 'cuda').
         model_name (str, optional): Il percorso o nome del modello da caricare.
                                     Se None, usa il modello base definito in config.
+        quantize (bool, optional): Se True, usa la quantizzazione dinamica int8 (solo CPU).
+                                   Se None, usa config.QUANTIZE_INT8.
+        guard_dataset (optional): Dataset (da `load_sentiment_dataset`) con cui verificare
+                                  che il modello quantizzato non perda più di
+                                  config.QUANTIZATION_ACCURACY_TOLERANCE di accuratezza.
+                                  Se la verifica fallisce si usa il modello fp32.
+        backend (str, optional): 'auto', 'eager' o 'traced'. Se None, usa config.INFERENCE_BACKEND.
+                                 Con 'auto' si usa il grafo TorchScript esportato
+                                 (vedi src/export.py) quando è presente e aggiornato.
+        profile (str, optional): Profilo di esecuzione 'latency', 'throughput' o 'off'
+                                 (vedi src/runtime_profile.py), applicato prima del caricamento.
+                                 Se None, il processo resta con le impostazioni di torch.
     """
+    if profile is None:
+        return _load_pipeline(device, model_name, quantize, guard_dataset, backend)
+
+    from src.runtime_profile import apply_runtime_profile, prepare_for_inference
+
+    runtime_profile = apply_runtime_profile(profile)
+    return prepare_for_inference(_load_pipeline(device, model_name, quantize, guard_dataset, backend),
+                                 runtime_profile)
+
+
+def _load_pipeline(device, model_name, quantize, guard_dataset, backend):
     # Se non viene specificato un modello, usiamo quello di default (base)
     target_model = model_name if model_name else config.MODEL_NAME
+    if quantize is None:
+        quantize = config.QUANTIZE_INT8
+    backend = backend or config.INFERENCE_BACKEND
 
+    # La quantizzazione si applica al modello eager: in quel caso l'artefatto esportato non si usa
+    if backend != "eager" and not quantize:
+        traced_pipeline = _load_traced_pipeline(device, model_name, required=(backend == "traced"))
+        if traced_pipeline is not None:
+            return traced_pipeline
+
+    # Import locale: transformers impiega alcuni secondi e serve solo quando si carica un modello
+    from transformers import pipeline
+
+    from src.artifact_store import resolve_model_path
+
+    # Snapshot locale del modello del Hub, se presente (obbligatorio in modalità offline)
+    target_model = resolve_model_path(target_model)
     print(f"Caricamento del modello: '{target_model}' sul dispositivo '{device}'...")
 
+    # truncation=True come default delle chiamate: un testo oltre la lunghezza massima del
+    # modello viene troncato invece di far fallire la forward pass (come nel backend TorchScript)
     sentiment_pipeline = pipeline(
         "sentiment-analysis",
         model=target_model,
-        device=device
+        device=device,
+        truncation=True
     )
 
     print("Modello caricato con successo.")
-    return sentiment_pipeline
\ No newline at end of file
+
+    if not quantize:
+        return sentiment_pipeline
+
+    if device != "cpu":
+        print(f"Quantizzazione int8 disponibile solo su CPU: su '{device}' si usa il modello fp32.")
+        return sentiment_pipeline
+
+    print("Applicazione della quantizzazione dinamica int8 ai layer Linear...")
+    quantized_pipeline = quantize_pipeline(sentiment_pipeline)
+
+    if guard_dataset is not None:
+        accepted, fp32_accuracy, int8_accuracy = check_quantization_accuracy(
+            sentiment_pipeline, quantized_pipeline, guard_dataset
+        )
+        if not accepted:
+            print(f"⚠️ Modello int8 rifiutato: accuratezza {int8_accuracy:.4f} contro {fp32_accuracy:.4f} "
+                  f"(tolleranza {config.QUANTIZATION_ACCURACY_TOLERANCE}). Si usa il modello fp32.")
+            return sentiment_pipeline
+        print(f"✅ Modello int8 accettato: accuratezza {int8_accuracy:.4f} contro {fp32_accuracy:.4f}.")
+    else:
+        print("Nessun dataset di verifica fornito: modello int8 usato senza guardia di accuratezza.")
+
+    return quantized_pipeline
@@ -1,11 +1,16 @@
 # src/monitor.py
 
+import numpy as np
 import pandas as pd
+import csv
+import json
+import math
 import os
-from sklearn.metrics import accuracy_score
+from collections import deque
 from src import config
-from src.data_loader import load_sentiment_dataset
-from src.model import load_sentiment_pipeline
+from src.cache import CachedPipeline, PredictionCache
+from src.feedback_store import FeedbackStore
+from src.scoring import accuracy as accuracy_of, class_probabilities, label_ids, predicted_ids
 import warnings
 
 # Ignoriamo gli avvisi di UserWarning da scikit-learn per un output più pulito
@@ -14,6 +19,10 @@ warnings.filterwarnings("ignore", category=UserWarning)
 # Definiamo una soglia di accuratezza sotto la quale attivare un alert
 ACCURACY_THRESHOLD = 0.65
 
+# Log delle correzioni scritto da app.save_correction e stato del monitor incrementale
+CORRECTION_LOG = "flagged_data_corrected.csv"
+MONITOR_STATE_FILE = "monitor_state.json"
+
 
 def check_performance_drift(pipeline, new_data):
     """
@@ -21,23 +30,17 @@ def check_performance_drift(pipeline, new_data):
     """
     print("\n--- Controllo Performance Drift ---")
 
-    texts = list(new_data['text'])
-    true_labels_str = new_data['label'].tolist()
-    true_labels_ids = [config.LABEL2ID.get(label.lower()) for label in true_labels_str]
-
-    valid_indices = [i for i, label_id in enumerate(true_labels_ids) if label_id is not None]
-    texts = [texts[i] for i in valid_indices]
-    true_labels_ids = [true_labels_ids[i] for i in valid_indices]
+    true_labels_ids = label_ids(new_data['label'].to_numpy())
+    valid = true_labels_ids >= 0
+    texts = new_data['text'].to_numpy()[valid].tolist()
+    true_labels_ids = true_labels_ids[valid]
 
     if not texts:
         print("Nessun dato valido per la valutazione.")
         return
 
-    model_outputs = pipeline(texts)
-    predicted_labels_str = [output['label'].lower() for output in model_outputs]
-    predicted_labels_ids = [config.LABEL2ID[label] for label in predicted_labels_str]
-
-    accuracy = accuracy_score(true_labels_ids, predicted_labels_ids)
+    probabilities = class_probabilities(pipeline, texts)
+    accuracy = accuracy_of(true_labels_ids, predicted_ids(probabilities))
     print(f"Accuratezza sui nuovi dati: {accuracy:.4f}")
     print(f"Soglia di accuratezza minima: {ACCURACY_THRESHOLD}")
 
@@ -47,15 +50,313 @@ def check_performance_drift(pipeline, new_data):
     else:
         print("OK: Le performance del modello sono stabili.")
 
+
+def population_stability_index(reference_counts, current_counts, epsilon=1e-4):
+    """
+    Calcola il PSI (Population Stability Index) tra due distribuzioni di etichette.
+    Valori sopra ~0.2 indicano uno spostamento significativo della distribuzione.
+    """
+    reference_total = sum(reference_counts) or 1
+    current_total = sum(current_counts) or 1
+    psi = 0.0
+    for reference, current in zip(reference_counts, current_counts):
+        reference_share = max(reference / reference_total, epsilon)
+        current_share = max(current / current_total, epsilon)
+        psi += (current_share - reference_share) * math.log(current_share / reference_share)
+    return psi
+
+
+class CorrectionLogMonitor:
+    """
+    Monitor incrementale sulle correzioni degli utenti: archivio SQLite (FeedbackStore)
+    oppure vecchio log CSV (flagged_data_corrected.csv).
+
+    Legge solo le correzioni aggiunte dopo l'ultimo checkpoint (ultimo id dell'archivio,
+    oppure offset in byte nel CSV) e aggiorna in modo incrementale le statistiche su una finestra mobile delle
+    ultime N correzioni: accuratezza di `model_prediction` rispetto a `user_correction`,
+    matrice di confusione per classe e spostamento della distribuzione delle etichette
+    rispetto allo storico. Non esegue il modello: la predizione è già nel log.
+    """
+
+    def __init__(self, log_path=CORRECTION_LOG, state_path=MONITOR_STATE_FILE, window_size=None, store=None):
+        self.log_path = log_path
+        self.store = store
+        self.state_path = state_path
+        self.window_size = window_size or config.MONITOR_WINDOW_SIZE
+        self.source = "store" if store is not None else "csv"
+        self._reset()
+        state_source = self._load_state()
+        if state_source is not None and state_source != self.source:
+            self._switch_source(state_source)
+        if self.csv_rows is None:
+            self.csv_rows = self._count_csv_records()
+
+    # --- STATO PERSISTENTE ---
+
+    def _reset(self):
+        num_labels = len(config.LABELS)
+        self.offset = 0
+        self.last_id = 0
+        self.csv_rows = 0
+        self.columns = None
+        self.window = deque()
+        self.window_confusion = [[0] * num_labels for _ in range(num_labels)]
+        self.reference_label_counts = [0] * num_labels
+        self.rows_processed = 0
+
+    def _load_state(self):
+        """Carica il checkpoint e restituisce la sorgente da cui è stato prodotto (None se assente)."""
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+
+        self.offset = state["offset"]
+        self.last_id = state.get("last_id", 0)
+        self.csv_rows = state.get("csv_rows")
+        self.columns = state["columns"]
+        self.reference_label_counts = state["reference_label_counts"]
+        self.rows_processed = state["rows_processed"]
+        # La finestra viene ricostruita rispettando la dimensione corrente
+        for predicted_id, true_id in state["window"]:
+            self._push(predicted_id, true_id)
+        # I checkpoint precedenti non registravano la sorgente: con last_id > 0 venivano dall'archivio
+        return state.get("source", "store" if self.last_id else "csv")
+
+    def _switch_source(self, previous_source):
+        """
+        Il checkpoint è stato prodotto dall'altra sorgente. Dopo la migrazione CSV -> archivio
+        le prime righe dell'archivio sono quelle del CSV già contate: si riparte dopo l'ultima
+        di queste. In tutti gli altri casi le statistiche ripartono da zero.
+        """
+        csv_rows = self.csv_rows if self.csv_rows is not None else self._count_csv_records()
+        migrated = 0
+        if previous_source == "csv" and self.store is not None:
+            migrated = int(self.store.get_metadata(f"migrated_csv:{os.path.abspath(self.log_path)}", 0))
+
+        if previous_source == "csv" and csv_rows and migrated >= csv_rows:
+            counted = self.store.read_since(0, limit=csv_rows)
+            self.last_id = int(counted['id'].iloc[-1])
+            print(f"Checkpoint del log CSV convertito: le prime {csv_rows} correzioni dell'archivio "
+                  f"sono già state contate (id <= {self.last_id}).")
+        elif csv_rows or self.last_id:
+            print(f"Checkpoint prodotto dalla sorgente '{previous_source}': il monitor riparte da zero.")
+            self._reset()
+        self.csv_rows = 0
+        self.offset = 0
+        self.columns = None
+
+    def _count_csv_records(self):
+        """Record di dati del CSV prima dell'offset salvato (checkpoint senza `csv_rows`)."""
+        if not self.offset or not os.path.exists(self.log_path):
+            return 0
+        target, self.offset = self.offset, 0
+        records = 0
+        with open(self.log_path, "rb") as f:
+            for _, consumed in self._iter_new_records(f):
+                records += 1
+                if consumed >= target:
+                    break
+        self.offset = target
+        # La prima riga è l'intestazione
+        return max(0, records - 1)
+
+    def save_state(self):
+        state = {
+            "source": self.source,
+            "offset": self.offset,
+            "last_id": self.last_id,
+            "csv_rows": self.csv_rows,
+            "columns": self.columns,
+            "reference_label_counts": self.reference_label_counts,
+            "rows_processed": self.rows_processed,
+            "window": list(self.window),
+        }
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    # --- AGGIORNAMENTO INCREMENTALE ---
+
+    def _ingest(self, model_prediction, user_correction):
+        """Aggiunge una correzione alle statistiche; restituisce False se le etichette non sono valide."""
+        predicted_id = config.LABEL2ID.get((model_prediction or "").lower())
+        true_id = config.LABEL2ID.get((user_correction or "").lower())
+        if predicted_id is None or true_id is None:
+            return False
+
+        self._push(predicted_id, true_id)
+        self.reference_label_counts[true_id] += 1
+        self.rows_processed += 1
+        return True
+
+    def _push(self, predicted_id, true_id):
+        self.window.append((predicted_id, true_id))
+        self.window_confusion[true_id][predicted_id] += 1
+        if len(self.window) > self.window_size:
+            old_predicted, old_true = self.window.popleft()
+            self.window_confusion[old_true][old_predicted] -= 1
+
+    def _iter_new_records(self, f):
+        """
+        Restituisce (riga, offset dopo la riga) per ogni record completo dopo self.offset.
+        Una riga finale senza newline è ancora in scrittura e verrà letta al giro successivo.
+        """
+        consumed = self.offset
+
+        def complete_lines():
+            nonlocal consumed
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    return
+                consumed += len(raw_line)
+                yield raw_line.decode("utf-8")
+
+        # I testi possono contenere a capo: il reader CSV gestisce i campi su più righe
+        reader = csv.reader(complete_lines())
+        try:
+            for row in reader:
+                yield row, consumed
+        except csv.Error:
+            return
+
+    def update(self):
+        """
+        Elabora le nuove correzioni e salva il checkpoint.
+
+        Returns:
+            int: Numero di nuove correzioni elaborate.
+        """
+        if self.store is not None:
+            new_rows = self._update_from_store()
+        else:
+            new_rows = self._update_from_csv()
+        self.save_state()
+        return new_rows
+
+    def _update_from_store(self, chunk_size=10000):
+        new_rows = 0
+        while True:
+            chunk = self.store.read_since(self.last_id, limit=chunk_size)
+            if chunk.empty:
+                return new_rows
+            # Etichette convertite in id sull'intero blocco; le righe non valide vengono scartate
+            predicted = label_ids(chunk['model_prediction'].fillna("").to_numpy())
+            true = label_ids(chunk['user_correction'].fillna("").to_numpy())
+            valid = (predicted >= 0) & (true >= 0)
+            for predicted_id, true_id in zip(predicted[valid].tolist(), true[valid].tolist()):
+                self._push(predicted_id, true_id)
+            counts = np.bincount(true[valid], minlength=len(config.LABELS))
+            self.reference_label_counts = [a + int(b) for a, b in zip(self.reference_label_counts, counts)]
+            self.rows_processed += int(valid.sum())
+            new_rows += int(valid.sum())
+            self.last_id = int(chunk['id'].iloc[-1])
+
+    def _update_from_csv(self):
+        if not os.path.exists(self.log_path):
+            return 0
+        if os.path.getsize(self.log_path) < self.offset:
+            print("Il log delle correzioni è stato troncato o sostituito: il monitor riparte da zero.")
+            self._reset()
+
+        new_rows = 0
+        with open(self.log_path, "rb") as f:
+            f.seek(self.offset)
+            for row, next_offset in self._iter_new_records(f):
+                self.offset = next_offset
+                if self.columns is None:
+                    self.columns = row
+                    continue
+
+                self.csv_rows += 1
+                record = dict(zip(self.columns, row))
+                new_rows += self._ingest(record.get("model_prediction"), record.get("user_correction"))
+
+        return new_rows
+
+    # --- REPORT ---
+
+    def report(self):
+        """Statistiche correnti sulla finestra mobile."""
+        window_total = len(self.window)
+        correct = sum(self.window_confusion[i][i] for i in range(len(config.LABELS)))
+        window_label_counts = [sum(row) for row in self.window_confusion]
+
+        per_class = {}
+        for i, label in enumerate(config.LABELS):
+            support = window_label_counts[i]
+            predicted = sum(row[i] for row in self.window_confusion)
+            per_class[label] = {
+                "support": support,
+                "recall": self.window_confusion[i][i] / support if support else None,
+                "precision": self.window_confusion[i][i] / predicted if predicted else None,
+            }
+
+        return {
+            "rows_processed": self.rows_processed,
+            "window_size": window_total,
+            "accuracy": correct / window_total if window_total else None,
+            "confusion_matrix": [list(row) for row in self.window_confusion],
+            "per_class": per_class,
+            "window_label_distribution": window_label_counts,
+            "reference_label_distribution": list(self.reference_label_counts),
+            "label_psi": population_stability_index(self.reference_label_counts, window_label_counts),
+        }
+
+
+def check_correction_log_drift(monitor):
+    """
+    Aggiorna il monitor con le nuove correzioni e stampa il report di drift.
+    """
+    print("\n--- Controllo Drift sul Log delle Correzioni ---")
+    new_rows = monitor.update()
+    report = monitor.report()
+    print(f"Nuove correzioni elaborate: {new_rows} (totale storico: {report['rows_processed']})")
+
+    if report["accuracy"] is None:
+        print("Nessuna correzione valida nella finestra.")
+        print("--- Fine Controllo ---")
+        return report
+
+    print(f"Accuratezza sulla finestra delle ultime {report['window_size']} correzioni: {report['accuracy']:.4f}")
+    print(f"Soglia di accuratezza minima: {ACCURACY_THRESHOLD}")
+    for label, stats in report["per_class"].items():
+        recall = "n/d" if stats["recall"] is None else f"{stats['recall']:.3f}"
+        print(f"  {label:<10} supporto={stats['support']:<6} recall={recall}")
+    print(f"Matrice di confusione (righe = correzione utente, colonne = predizione): {report['confusion_matrix']}")
+    print(f"PSI distribuzione etichette (finestra vs storico): {report['label_psi']:.4f}")
+
+    if report["accuracy"] < ACCURACY_THRESHOLD:
+        print("ALERT: Performance Drift Rilevato! L'accuratezza è scesa sotto la soglia.")
+        print("Si consiglia di avviare il retraining del modello.")
+    elif report["label_psi"] > config.DRIFT_PSI_THRESHOLD:
+        print("ALERT: Spostamento della distribuzione delle etichette rilevato.")
+    else:
+        print("OK: Le performance del modello sono stabili.")
+
     print("--- Fine Controllo ---")
+    return report
 
 
 def run_monitoring():
     """
     Funzione principale per eseguire il monitoraggio.
+    Se esiste il log delle correzioni dell'app, il monitoraggio è incrementale e non
+    esegue il modello; altrimenti si simula il controllo su un piccolo set di esempi.
     """
     print("Avvio dello script di monitoraggio...")
 
+    if os.path.exists(config.FEEDBACK_DB_PATH):
+        store = FeedbackStore()
+        check_correction_log_drift(CorrectionLogMonitor(store=store))
+        store.close()
+        return
+
+    if os.path.exists(CORRECTION_LOG):
+        check_correction_log_drift(CorrectionLogMonitor())
+        return
+
     # --- FIX PER IL PATH DEL MODELLO ---
     # Definiamo il percorso relativo
     local_model_path = "./fine_tuned_model"
@@ -70,10 +371,15 @@ def run_monitoring():
     else:
         print("Nessun modello locale trovato (o incompleto). Utilizzo il modello base da Hugging Face.")
 
-    # Carica il modello (locale o base)
-    pipeline = load_sentiment_pipeline(device="cpu", model_name=model_to_use)
+    # Carica il modello (locale o base). Import locale: il monitoraggio incrementale non usa il modello
+    from src.model import load_sentiment_pipeline
+
+    pipeline = load_sentiment_pipeline(device="cpu", model_name=model_to_use, profile=config.RUNTIME_PROFILE_BATCH)
     # -----------------------------------
 
+    # I testi già valutati con lo stesso modello non vengono ricalcolati, anche tra un'esecuzione e l'altra
+    pipeline = CachedPipeline(pipeline, cache=PredictionCache(db_path=config.MONITOR_CACHE_DB_PATH))
+
     flagged_data = {
         'text': [
             "This new feature is kinda meh",
@@ -92,6 +398,7 @@ def run_monitoring():
 
     print(f"\nSimulazione del monitoraggio su {len(new_data_df)} nuovi campioni di dati.")
     check_performance_drift(pipeline, new_data_df)
+    print(f"Statistiche cache predizioni: {pipeline.stats()}")
 
 
 if __name__ == "__main__":
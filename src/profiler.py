@@ -0,0 +1,88 @@
+# src/profiler.py
+
+import os
+import sys
+import threading
+from collections import Counter
+
+from src import config
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Profiler a campionamento a basso overhead, da accendere a runtime in produzione.
+
+    Un thread legge a intervalli regolari lo stack di tutti gli altri thread
+    (`sys._current_frames`) e conta quante volte compare ogni stack. Il risultato
+    è nel formato "collapsed" usato da flamegraph.pl e speedscope.
+    """
+
+    def __init__(self, interval_ms=None):
+        self.interval_ms = interval_ms or config.PROFILER_INTERVAL_MS
+        self._stacks = Counter()
+        self._samples = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms=None):
+        """Avvia il campionamento azzerando i dati precedenti. Restituisce False se è già attivo."""
+        if self.running:
+            return False
+        if interval_ms:
+            self.interval_ms = interval_ms
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Ferma il campionamento; i dati raccolti restano disponibili."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        interval = self.interval_ms / 1000.0
+        while not self._stop_event.wait(interval):
+            samples = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                samples.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(samples)
+                self._samples += 1
+
+    def collapsed(self):
+        """Stack raccolti, una riga "frame;frame;frame conteggio" per stack."""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def top_functions(self, n=20):
+        """Le `n` funzioni in cima allo stack più frequenti, con la frazione dei campioni."""
+        with self._lock:
+            leaves = Counter()
+            for stack, count in self._stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            total = sum(leaves.values())
+            return [(name, count / total) for name, count in leaves.most_common(n)]
@@ -0,0 +1,317 @@
+# src/runtime_profile.py
+
+import argparse
+import ctypes
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+from src import config
+
+PROFILE_NAMES = ("latency", "throughput")
+
+# Parametri di mallopt (glibc, malloc.h)
+_M_TRIM_THRESHOLD = -1
+_M_MMAP_THRESHOLD = -3
+_M_ARENA_MAX = -8
+
+# Profilo applicato in questo processo (i thread inter-op di torch si possono impostare una sola volta)
+_applied = None
+
+
+def available_cores():
+    """Core utilizzabili dal processo: rispetta affinità e cpuset del container, a differenza di os.cpu_count()."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def host_signature():
+    """Caratteristiche dell'host da cui dipende la calibrazione."""
+    return {
+        "cores": available_cores(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "system": platform.system(),
+    }
+
+
+def default_profile(name, cores=None):
+    """
+    Profili predefiniti (senza calibrazione).
+
+    - "latency": una richiesta alla volta. Tutti i core per la singola forward pass,
+      micro-batch piccoli con attesa minima.
+    - "throughput": batch grandi (valutazione, monitoraggio, scoring in blocco, server
+      sotto carico). Batch e attesa del micro-batcher più ampi.
+
+    In entrambi un solo thread inter-op e il tokenizer senza thread propri: con le
+    richieste Gradio concorrenti i thread non superano i core disponibili.
+    """
+    if name not in PROFILE_NAMES:
+        raise ValueError(f"Profilo di esecuzione non valido: '{name}' (valori ammessi: {', '.join(PROFILE_NAMES)}, 'off').")
+    cores = cores or available_cores()
+    common = {
+        "num_threads": cores,
+        "interop_threads": 1,
+        "tokenizers_parallelism": False,
+        "inference_mode": True,
+        "flush_denormal": True,
+        # Allocatore (glibc): poche arene per i thread di inferenza e soglie alte per riusare
+        # i buffer delle attivazioni invece di restituirli al sistema a ogni richiesta
+        "malloc_arena_max": 2,
+        "malloc_mmap_threshold": 64 * 1024 * 1024,
+        "malloc_trim_threshold": 128 * 1024 * 1024,
+    }
+    if name == "latency":
+        return {**common, "name": name, "batch_max_size": 8, "batch_max_wait_ms": 2, "bulk_batch_size": 16}
+    return {**common, "name": name, "batch_max_size": 32, "batch_max_wait_ms": 10, "bulk_batch_size": 64}
+
+
+def load_calibration(path=None):
+    """Profili calibrati per questo host, oppure None se mancano o sono stati misurati su un altro host."""
+    path = path or config.RUNTIME_PROFILE_PATH
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        calibration = json.load(f)
+    if calibration.get("host") != host_signature():
+        print(f"⚠️ Profilo calibrato '{path}' misurato su un altro host: si usano i profili predefiniti. "
+              "Ricalibrare con: python -m src.runtime_profile calibrate")
+        return None
+    return calibration
+
+
+def resolve_profile(name, path=None):
+    """
+    Restituisce le impostazioni del profilo `name`: quelle calibrate per l'host se
+    disponibili, altrimenti quelle predefinite. Restituisce None con "off".
+    """
+    if name == "off":
+        return None
+    profile = default_profile(name)
+    calibration = load_calibration(path)
+    if calibration is not None:
+        profile.update(calibration["profiles"].get(name, {}))
+        profile["calibrated"] = True
+    return profile
+
+
+def _configure_allocator(profile):
+    """Imposta le soglie di malloc con mallopt; senza glibc (macOS, musl) non fa nulla."""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        libc = ctypes.CDLL("libc.so.6")
+    except OSError:
+        return False
+    libc.mallopt(_M_ARENA_MAX, profile["malloc_arena_max"])
+    libc.mallopt(_M_MMAP_THRESHOLD, profile["malloc_mmap_threshold"])
+    libc.mallopt(_M_TRIM_THRESHOLD, profile["malloc_trim_threshold"])
+    return True
+
+
+def apply_runtime_profile(name, path=None):
+    """
+    Applica un profilo di esecuzione al processo: thread torch e BLAS, parallelismo del
+    tokenizer, allocatore e dimensioni dei batch in config (lette da micro-batcher e
+    inferenza in blocco quando vengono creati). La modalità di sola inferenza viene
+    applicata al modello da `prepare_for_inference`.
+
+    Va chiamata prima di caricare il modello; le chiamate successive nello stesso
+    processo non cambiano nulla e restituiscono il profilo già applicato.
+    """
+    global _applied
+    if _applied is not None:
+        return _applied
+
+    profile = resolve_profile(name, path)
+    if profile is None:
+        _applied = {"name": "off"}
+        return _applied
+
+    # Le variabili d'ambiente valgono per i pool OpenMP/MKL creati dopo questo punto
+    # (torch viene importato solo al caricamento del modello)
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ.setdefault(variable, str(profile["num_threads"]))
+    os.environ["TOKENIZERS_PARALLELISM"] = "true" if profile["tokenizers_parallelism"] else "false"
+    allocator_configured = _configure_allocator(profile)
+
+    import torch
+
+    torch.set_num_threads(profile["num_threads"])
+    try:
+        torch.set_num_interop_threads(profile["interop_threads"])
+    except RuntimeError:
+        # Il pool inter-op è già partito (torch usato prima del profilo): resta quello predefinito
+        print("⚠️ Thread inter-op di torch già avviati: impostazione del profilo ignorata.")
+    torch.set_flush_denormal(profile["flush_denormal"])
+
+    config.BATCH_MAX_SIZE = profile["batch_max_size"]
+    config.BATCH_MAX_WAIT_MS = profile["batch_max_wait_ms"]
+    config.BULK_BATCH_SIZE = profile["bulk_batch_size"]
+
+    print(f"⚙️ Profilo di esecuzione '{profile['name']}'{' (calibrato)' if profile.get('calibrated') else ''}: "
+          f"{profile['num_threads']} thread, micro-batch {profile['batch_max_size']}, "
+          f"batch in blocco {profile['bulk_batch_size']}"
+          f"{'' if allocator_configured else ', allocatore predefinito'}.")
+    _applied = profile
+    return profile
+
+
+def prepare_for_inference(sentiment_pipeline, profile):
+    """
+    Modalità di sola inferenza: modello in eval e parametri senza gradiente.
+    A differenza di `torch.set_grad_enabled` (valido solo nel thread che lo chiama) vale
+    anche per il thread del micro-batcher e per i worker del pool.
+    """
+    model = getattr(sentiment_pipeline, 'model', None)
+    if not profile.get("inference_mode") or model is None:
+        return sentiment_pipeline
+    model.eval()
+    model.requires_grad_(False)
+    return sentiment_pipeline
+
+
+# --- CALIBRAZIONE ---
+
+def thread_candidates(cores):
+    """Numeri di thread da provare: potenze di due fino ai core disponibili, più i core stessi."""
+    candidates = {cores}
+    threads = 1
+    while threads < cores:
+        candidates.add(threads)
+        threads *= 2
+    return sorted(candidates)
+
+
+def pick_best(results, key, higher_is_better, tolerance=None):
+    """
+    Sceglie la configurazione migliore tra `results` (lista di dict con `num_threads`).
+    Tra quelle entro `tolerance` (relativa) dalla migliore si preferisce quella con meno
+    thread: lascia core liberi per le altre richieste a parità di prestazioni.
+    """
+    tolerance = config.RUNTIME_CALIBRATION_TOLERANCE if tolerance is None else tolerance
+    values = [result[key] for result in results]
+    best = max(values) if higher_is_better else min(values)
+    if higher_is_better:
+        acceptable = [r for r in results if r[key] >= best * (1 - tolerance)]
+    else:
+        acceptable = [r for r in results if r[key] <= best * (1 + tolerance)]
+    return min(acceptable, key=lambda r: (r["num_threads"], -r.get("batch_size", 0)))
+
+
+def _median_latency_ms(sentiment_pipeline, texts, repeats):
+    from src.scoring import class_probabilities
+
+    class_probabilities(sentiment_pipeline, texts[:1])  # Warm-up
+    latencies = []
+    for text in (texts * repeats)[:repeats]:
+        start = time.perf_counter()
+        class_probabilities(sentiment_pipeline, [text])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return sorted(latencies)[len(latencies) // 2]
+
+
+def _throughput(sentiment_pipeline, texts, batch_size):
+    from src.bulk_inference import predict_proba_sorted_by_length
+
+    predict_proba_sorted_by_length(sentiment_pipeline, texts[:batch_size], batch_size=batch_size)  # Warm-up
+    _, stats = predict_proba_sorted_by_length(sentiment_pipeline, texts, batch_size=batch_size)
+    return stats["texts_per_sec"]
+
+
+def calibrate(sentiment_pipeline, texts, output_path=None, batch_sizes=None, latency_repeats=50):
+    """
+    Misura l'host e scrive i profili migliori in `output_path`:
+    per "latency" il numero di thread con la latenza mediana più bassa su richieste singole,
+    per "throughput" la coppia (thread, batch) con più testi al secondo.
+    """
+    import torch
+
+    output_path = output_path or config.RUNTIME_PROFILE_PATH
+    batch_sizes = batch_sizes or config.RUNTIME_CALIBRATION_BATCH_SIZES
+    candidates = thread_candidates(available_cores())
+    torch.set_grad_enabled(False)
+
+    latency_results, throughput_results = [], []
+    for num_threads in candidates:
+        torch.set_num_threads(num_threads)
+        latency_ms = _median_latency_ms(sentiment_pipeline, texts, latency_repeats)
+        latency_results.append({"num_threads": num_threads, "latency_p50_ms": latency_ms})
+        print(f"  {num_threads:>3} thread: latenza mediana {latency_ms:.2f} ms")
+        for batch_size in batch_sizes:
+            texts_per_sec = _throughput(sentiment_pipeline, texts, batch_size)
+            throughput_results.append({"num_threads": num_threads, "batch_size": batch_size,
+                                       "texts_per_sec": texts_per_sec})
+            print(f"  {num_threads:>3} thread, batch {batch_size:>3}: {texts_per_sec:.1f} testi/sec")
+
+    best_latency = pick_best(latency_results, "latency_p50_ms", higher_is_better=False)
+    best_throughput = pick_best(throughput_results, "texts_per_sec", higher_is_better=True)
+    calibration = {
+        "host": host_signature(),
+        "calibrated_at": datetime.now().isoformat(),
+        "torch_version": torch.__version__,
+        "profiles": {
+            "latency": {"num_threads": best_latency["num_threads"],
+                        "measured": {"latency_p50_ms": best_latency["latency_p50_ms"]}},
+            "throughput": {"num_threads": best_throughput["num_threads"],
+                           "batch_max_size": best_throughput["batch_size"],
+                           "bulk_batch_size": best_throughput["batch_size"],
+                           "measured": {"texts_per_sec": best_throughput["texts_per_sec"]}},
+        },
+    }
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2)
+    os.replace(tmp_path, output_path)
+
+    print(f"✅ Profili calibrati salvati in '{output_path}':")
+    print(f"   latency: {best_latency['num_threads']} thread ({best_latency['latency_p50_ms']:.2f} ms)")
+    print(f"   throughput: {best_throughput['num_threads']} thread, batch {best_throughput['batch_size']} "
+          f"({best_throughput['texts_per_sec']:.1f} testi/sec)")
+    return calibration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profili di esecuzione (thread, allocatore, batch) per questo host.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    calibrate_parser = subparsers.add_parser("calibrate", help="Misura l'host e salva i profili migliori.")
+    calibrate_parser.add_argument("--model", default=None,
+                                  help="Modello da misurare (default: fine-tuned se presente, altrimenti base).")
+    calibrate_parser.add_argument("--texts", type=int, default=config.RUNTIME_CALIBRATION_TEXTS,
+                                  help="Testi di validazione usati per le misure.")
+    calibrate_parser.add_argument("--output", default=config.RUNTIME_PROFILE_PATH)
+
+    show_parser = subparsers.add_parser("show", help="Mostra le impostazioni dei profili per questo host.")
+    show_parser.add_argument("--profile", choices=PROFILE_NAMES, default=None)
+    args = parser.parse_args()
+
+    if args.command == "show":
+        for name in ([args.profile] if args.profile else PROFILE_NAMES):
+            print(json.dumps(resolve_profile(name), indent=2))
+        return
+
+    from src.data_loader import load_sentiment_dataset
+    from src.model import load_sentiment_pipeline
+
+    model_to_use = args.model
+    local_model_path = "./fine_tuned_model"
+    if model_to_use is None and os.path.isdir(local_model_path) and "config.json" in os.listdir(local_model_path):
+        model_to_use = os.path.abspath(local_model_path)
+
+    # Le misure partono dalle impostazioni di torch, non da un profilo già calibrato
+    sentiment_pipeline = load_sentiment_pipeline(device="cpu", model_name=model_to_use, profile="off")
+    validation = load_sentiment_dataset()['validation'].shuffle(seed=0)
+    texts = list(validation.select(range(min(args.texts, len(validation))))['text'])
+    print(f"Calibrazione su {available_cores()} core con {len(texts)} testi...")
+    calibrate(sentiment_pipeline, texts, output_path=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# src/scoring.py
+
+import numpy as np
+
+from src import config
+
+
+def _column_order(id2label):
+    """
+    Indici delle colonne del modello nell'ordine di config.LABELS.
+    Se il modello usa nomi generici (es. "LABEL_0"), si assume lo stesso ordine di config.
+    """
+    model_ids = {str(label).lower(): int(i) for i, label in id2label.items()}
+    return np.array([model_ids.get(label, j) for j, label in enumerate(config.LABELS)])
+
+
+def _softmax(logits):
+    """Softmax numericamente stabile lungo l'ultima dimensione."""
+    logits = np.asarray(logits, dtype=np.float32)
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+
+def distributions_to_array(outputs):
+    """
+    Converte l'output della pipeline con `top_k=None` (per ogni testo una lista di
+    dict {'label', 'score'}) in una matrice di probabilità nell'ordine di config.LABELS.
+    """
+    probabilities = np.zeros((len(outputs), len(config.LABELS)), dtype=np.float32)
+    for row, distribution in enumerate(outputs):
+        for item in distribution:
+            probabilities[row, config.LABEL2ID[item['label'].lower()]] = item['score']
+    return probabilities
+
+
+def class_probabilities(sentiment_pipeline, texts, truncation=True):
+    """
+    Probabilità di tutte le classi per un batch di testi, calcolate direttamente dai logit.
+
+    Con la pipeline di transformers e con il backend TorchScript si esegue solo
+    tokenizzazione + forward pass, senza creare un dict per ogni testo. Gli oggetti con
+    un proprio `predict_proba` (es. la cascata di src/cascade.py) lo usano direttamente;
+    per gli altri oggetti compatibili (pool di worker, cache, micro-batcher) si usa `top_k=None`.
+
+    Returns:
+        np.ndarray: Matrice (len(texts), len(config.LABELS)), colonne nell'ordine di config.LABELS.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, len(config.LABELS)), dtype=np.float32)
+
+    predict_proba = getattr(sentiment_pipeline, 'predict_proba', None)
+    if predict_proba is not None:
+        return predict_proba(texts, truncation)
+
+    logits_fn = getattr(sentiment_pipeline, 'logits', None)
+    model = getattr(sentiment_pipeline, 'model', None)
+    tokenizer = getattr(sentiment_pipeline, 'tokenizer', None)
+
+    if logits_fn is not None:
+        # Backend TorchScript
+        logits = logits_fn(texts, truncation)
+        id2label = sentiment_pipeline.config.id2label
+    elif model is not None and tokenizer is not None:
+        # Import locale: torch serve solo quando il modello è già caricato
+        import torch
+
+        encodings = tokenizer(texts, padding=True, truncation=truncation, return_tensors="pt")
+        encodings = {name: tensor.to(sentiment_pipeline.device) for name, tensor in encodings.items()}
+        with torch.inference_mode():
+            logits = model(**encodings).logits
+        id2label = model.config.id2label
+    else:
+        outputs = sentiment_pipeline(texts, batch_size=len(texts), truncation=truncation, top_k=None)
+        return distributions_to_array(outputs)
+
+    probabilities = _softmax(logits.float().cpu().numpy())
+    return probabilities[:, _column_order(id2label)]
+
+
+# --- OPERAZIONI VETTORIALI SULLE ETICHETTE ---
+
+def label_ids(labels):
+    """Converte etichette testuali (maiuscole o minuscole) in id di config.LABELS; -1 se non valide."""
+    labels = np.char.lower(np.asarray(labels, dtype=str))
+    ids = np.full(labels.shape, -1, dtype=np.int64)
+    for label_id, label in enumerate(config.LABELS):
+        ids[labels == label] = label_id
+    return ids
+
+
+def predicted_ids(probabilities):
+    return np.asarray(probabilities).argmax(axis=-1)
+
+
+def predicted_labels(probabilities):
+    """Etichetta più probabile di ogni riga."""
+    return np.asarray(config.LABELS)[predicted_ids(probabilities)]
+
+
+def accuracy(true_ids, pred_ids):
+    true_ids = np.asarray(true_ids)
+    if true_ids.size == 0:
+        return 0.0
+    return float(np.mean(true_ids == np.asarray(pred_ids)))
+
+
+def confusion_matrix(true_ids, pred_ids, num_labels=None):
+    """Matrice di confusione (righe = etichetta reale, colonne = predizione)."""
+    num_labels = num_labels or len(config.LABELS)
+    flat = np.asarray(true_ids, dtype=np.int64) * num_labels + np.asarray(pred_ids, dtype=np.int64)
+    return np.bincount(flat, minlength=num_labels * num_labels).reshape(num_labels, num_labels)
+
+
+def per_class_metrics(confusion):
+    """Precisione, recall, F1 e supporto di ogni classe a partire dalla matrice di confusione."""
+    confusion = np.asarray(confusion, dtype=np.float64)
+    true_positives = np.diagonal(confusion, axis1=-2, axis2=-1)
+    support = confusion.sum(axis=-1)
+    predicted = confusion.sum(axis=-2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+        recall = np.where(support > 0, true_positives / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return precision, recall, f1, support
+
+
+def classification_report_from_confusion(confusion, labels=None, digits=2):
+    """
+    Report di classificazione (stesso formato di scikit-learn) calcolato dalla sola
+    matrice di confusione: permette di unire conteggi parziali prodotti separatamente.
+    """
+    labels = labels or config.LABELS
+    precision, recall, f1, support = per_class_metrics(confusion)
+    total = support.sum()
+    accuracy_value = np.trace(np.asarray(confusion)) / total if total else 0.0
+
+    width = max(len(label) for label in labels + ["weighted avg"])
+    lines = [f"{'':>{width}} {'precision':>9} {'recall':>9} {'f1-score':>9} {'support':>9}", ""]
+    for i, label in enumerate(labels):
+        lines.append(f"{label:>{width}} {precision[i]:>9.{digits}f} {recall[i]:>9.{digits}f} "
+                     f"{f1[i]:>9.{digits}f} {int(support[i]):>9}")
+    lines.append("")
+    lines.append(f"{'accuracy':>{width}} {'':>9} {'':>9} {accuracy_value:>9.{digits}f} {int(total):>9}")
+    weights = support / total if total else support
+    for name, p, r, f in [("macro avg", precision.mean(), recall.mean(), f1.mean()),
+                          ("weighted avg", precision @ weights, recall @ weights, f1 @ weights)]:
+        lines.append(f"{name:>{width}} {p:>9.{digits}f} {r:>9.{digits}f} {f:>9.{digits}f} {int(total):>9}")
+    return "\n".join(lines) + "\n"
+
+
+def bootstrap_confidence_intervals(true_ids, pred_ids, num_samples=None, confidence=None, seed=0, chunk_size=100):
+    """
+    Intervalli di confidenza bootstrap (percentili) di accuratezza e macro-F1.
+
+    I campioni bootstrap vengono estratti a blocchi di `chunk_size` e le loro matrici
+    di confusione calcolate con un unico `bincount` per blocco.
+
+    Returns:
+        dict: {"accuracy": (basso, alto), "macro_f1": (basso, alto)}
+    """
+    num_samples = num_samples or config.EVAL_BOOTSTRAP_SAMPLES
+    confidence = confidence or config.EVAL_CONFIDENCE_LEVEL
+    num_labels = len(config.LABELS)
+    codes = np.asarray(true_ids, dtype=np.int64) * num_labels + np.asarray(pred_ids, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+
+    accuracies, macro_f1s = [], []
+    for start in range(0, num_samples, chunk_size):
+        size = min(chunk_size, num_samples - start)
+        resampled = codes[rng.integers(0, len(codes), size=(size, len(codes)))]
+        offsets = np.arange(size)[:, None] * num_labels * num_labels
+        confusions = np.bincount((resampled + offsets).ravel(), minlength=size * num_labels * num_labels)
+        confusions = confusions.reshape(size, num_labels, num_labels)
+
+        accuracies.append(np.trace(confusions, axis1=1, axis2=2) / len(codes))
+        macro_f1s.append(per_class_metrics(confusions)[2].mean(axis=-1))
+
+    tail = (1 - confidence) / 2 * 100
+    return {
+        name: tuple(float(v) for v in np.percentile(np.concatenate(values), [tail, 100 - tail]))
+        for name, values in [("accuracy", accuracies), ("macro_f1", macro_f1s)]
+    }
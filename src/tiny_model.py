@@ -0,0 +1,119 @@
+# src/tiny_model.py
+
+import json
+import os
+import shutil
+import tempfile
+
+from src import config
+
+# Piccolo corpus per addestrare il tokenizer locale (nessun accesso alla rete)
+_TOKENIZER_CORPUS = [
+    "I absolutely love this product, it is amazing!",
+    "Worst experience ever, I hate it.",
+    "The package arrived on Tuesday.",
+    "Excellent service and great quality.",
+    "Disgusting food and rude staff.",
+    "This new feature is kinda meh",
+    "Just love waiting 2 hours for customer support. #sarcasm",
+    "@user check this out http://example.com 😂🔥👍",
+    "Not bad at all, would buy again 12345",
+    "The weather today is cloudy with some rain in the afternoon.",
+]
+
+
+def build_tiny_model(output_dir, seed=0):
+    """
+    Genera in locale un modello RoBERTa minuscolo con pesi casuali e la stessa
+    configurazione delle etichette del progetto (config.LABELS).
+
+    Non serve a fare predizioni sensate: serve per benchmark e test veloci e offline
+    che esercitano lo stesso codice del modello reale.
+    """
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, processors, trainers
+    from transformers import PreTrainedTokenizerFast, RobertaConfig, RobertaForSequenceClassification
+
+    # Tokenizer BPE a livello di byte, come quello di RoBERTa (qualsiasi input è codificabile)
+    special_tokens = ["<s>", "<pad>", "</s>", "<unk>", "<mask>"]
+    bpe = Tokenizer(models.BPE(unk_token="<unk>"))
+    bpe.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    bpe.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(vocab_size=512, min_frequency=1, special_tokens=special_tokens,
+                                  initial_alphabet=pre_tokenizers.ByteLevel.alphabet())
+    bpe.train_from_iterator(_TOKENIZER_CORPUS * 10, trainer=trainer)
+    bpe.post_processor = processors.RobertaProcessing(
+        ("</s>", bpe.token_to_id("</s>")), ("<s>", bpe.token_to_id("<s>"))
+    )
+
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=bpe,
+        bos_token="<s>", eos_token="</s>", unk_token="<unk>", pad_token="<pad>",
+        mask_token="<mask>", cls_token="<s>", sep_token="</s>",
+        model_max_length=config.TINY_MODEL_MAX_LENGTH,
+    )
+
+    torch.manual_seed(seed)
+    model_config = RobertaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        # RoBERTa riserva le prime posizioni al padding
+        max_position_embeddings=config.TINY_MODEL_MAX_LENGTH + 2,
+        pad_token_id=tokenizer.pad_token_id,
+        num_labels=len(config.LABELS),
+        id2label=config.ID2LABEL,
+        label2id=config.LABEL2ID,
+    )
+    model = RobertaForSequenceClassification(model_config)
+
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    return output_dir
+
+
+def _is_current(model_dir):
+    """Il modello in cache corrisponde alla configurazione attuale (etichette e lunghezza massima)?"""
+    config_path = os.path.join(model_dir, "config.json")
+    if not os.path.isfile(config_path):
+        return False
+    with open(config_path, "r", encoding="utf-8") as f:
+        model_config = json.load(f)
+    return (model_config.get("max_position_embeddings") == config.TINY_MODEL_MAX_LENGTH + 2
+            and model_config.get("label2id") == config.LABEL2ID)
+
+
+def get_tiny_model(model_dir=None):
+    """
+    Restituisce il percorso del modello minuscolo, generandolo solo la prima volta.
+
+    La generazione avviene in una cartella temporanea che viene poi rinominata:
+    più processi (es. worker di pytest-xdist) possono chiamare questa funzione
+    insieme e vedranno sempre un modello completo.
+    """
+    model_dir = model_dir or config.TINY_MODEL_DIR
+    if _is_current(model_dir):
+        return model_dir
+
+    parent_dir = os.path.dirname(os.path.abspath(model_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tiny_model_", dir=parent_dir)
+    build_tiny_model(tmp_dir)
+
+    if os.path.isdir(model_dir) and not _is_current(model_dir):
+        # Modello generato con una configurazione precedente: lo spostiamo prima di sostituirlo
+        stale_dir = tempfile.mkdtemp(prefix=".tiny_model_stale_", dir=parent_dir)
+        try:
+            os.rename(model_dir, os.path.join(stale_dir, "model"))
+        except OSError:
+            pass
+        shutil.rmtree(stale_dir, ignore_errors=True)
+
+    try:
+        os.rename(tmp_dir, model_dir)
+    except OSError:
+        # Un altro processo ha già creato il modello: usiamo il suo
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return model_dir
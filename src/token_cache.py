@@ -0,0 +1,150 @@
+# src/token_cache.py
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+from datasets import Dataset, concatenate_datasets, load_from_disk
+
+from src import config
+
+
+def tokenizer_fingerprint(tokenizer):
+    """
+    Impronta del tokenizer: cambia se cambiano vocabolario, regole o lunghezza massima,
+    e in quel caso le feature salvate in precedenza non vengono riutilizzate.
+    """
+    hasher = hashlib.sha256(type(tokenizer).__name__.encode("utf-8"))
+    hasher.update(str(tokenizer.model_max_length).encode("utf-8"))
+    backend = getattr(tokenizer, 'backend_tokenizer', None)
+    if backend is not None:
+        # Troncamento e padding vengono impostati sul backend a ogni chiamata: non fanno
+        # parte dell'identità del tokenizer
+        state = json.loads(backend.to_str())
+        state.pop("truncation", None)
+        state.pop("padding", None)
+        hasher.update(json.dumps(state, sort_keys=True).encode("utf-8"))
+    else:
+        hasher.update(repr(sorted(tokenizer.get_vocab().items())).encode("utf-8"))
+    return hasher.hexdigest()[:16]
+
+
+class TokenizedFeatureCache:
+    """
+    Cache su disco delle feature tokenizzate delle correzioni.
+
+    Le feature (input_ids, attention_mask) vengono salvate come shard Arrow in una
+    cartella per ogni impronta del tokenizer. Un indice persistente (index.json)
+    associa a ogni id di correzione lo shard e la riga in cui si trova, così a ogni
+    retraining si tokenizzano solo le correzioni nuove e si aprono (in memory-map)
+    solo gli shard che servono. Oltre config.TOKEN_CACHE_MAX_SHARDS shard la cache
+    viene compattata in uno solo. Le feature non hanno padding: viene aggiunto batch
+    per batch dal collator durante il training.
+    """
+
+    def __init__(self, tokenizer, cache_dir=None, max_shards=None):
+        self.tokenizer = tokenizer
+        self.cache_dir = os.path.join(cache_dir or config.TOKEN_CACHE_DIR, tokenizer_fingerprint(tokenizer))
+        self.max_shards = max_shards or config.TOKEN_CACHE_MAX_SHARDS
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._shards = {}
+        self._index = self._load_index()
+
+    def _shard_names(self):
+        return sorted(name for name in os.listdir(self.cache_dir)
+                      if name.startswith("shard_") and not name.endswith(".tmp"))
+
+    def _open_shard(self, name):
+        # Gli shard aperti restano in memoria (in memory-map) per le chiamate successive
+        if name not in self._shards:
+            self._shards[name] = load_from_disk(os.path.join(self.cache_dir, name))
+        return self._shards[name]
+
+    def _load_index(self):
+        """Legge l'indice id -> (shard, riga); se manca (cache precedente) lo ricostruisce dagli shard."""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            return {int(row_id): tuple(location) for row_id, location in index["rows"].items()}
+
+        index = {}
+        for name in self._shard_names():
+            for position, row_id in enumerate(self._open_shard(name)['row_id']):
+                index[row_id] = (name, position)
+        if index:
+            self._save_index(index)
+        return index
+
+    def _save_index(self, index):
+        # Scrittura atomica: l'indice viene aggiornato solo dopo che lo shard è su disco
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"rows": {str(row_id): list(location) for row_id, location in index.items()}}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _write_shard(self, shard):
+        """Salva uno shard con un nome univoco e ne restituisce il nome."""
+        name = f"shard_{uuid.uuid4().hex}"
+        tmp_path = os.path.join(self.cache_dir, name + ".tmp")
+        shard.save_to_disk(tmp_path)
+        # Rinomina atomica: uno shard interrotto a metà non viene mai letto
+        os.replace(tmp_path, os.path.join(self.cache_dir, name))
+        return name
+
+    def _tokenize_new(self, rows):
+        """Tokenizza le correzioni non ancora in cache e le salva in un nuovo shard."""
+        features = self.tokenizer(rows['text'].tolist(), truncation=True)
+        row_ids = rows['id'].astype("int64").tolist()
+        name = self._write_shard(Dataset.from_dict({
+            "row_id": row_ids,
+            "input_ids": features['input_ids'],
+            "attention_mask": features['attention_mask'],
+        }))
+        index = dict(self._index)
+        index.update((row_id, (name, position)) for position, row_id in enumerate(row_ids))
+        self._save_index(index)
+        self._index = index
+
+    def _compact(self):
+        """Riscrive tutte le righe indicizzate in un unico shard ed elimina i vecchi (e gli orfani)."""
+        names = sorted({name for name, _ in self._index.values()})
+        print(f"Compattazione della cache: {len(names)} shard -> 1.")
+        merged = concatenate_datasets([self._open_shard(name) for name in names])
+        name = self._write_shard(merged)
+        self._save_index({row_id: (name, position) for position, row_id in enumerate(merged['row_id'])})
+        self._index = self._load_index()
+        self._shards = {}
+
+        for old_name in os.listdir(self.cache_dir):
+            if old_name.startswith("shard_") and old_name != name:
+                shutil.rmtree(os.path.join(self.cache_dir, old_name), ignore_errors=True)
+
+    def features_for(self, df):
+        """
+        Restituisce un Dataset con input_ids, attention_mask e labels per le righe di `df`
+        (colonne richieste: 'id', 'text', 'label'), nello stesso ordine.
+        """
+        new_rows = df[~df['id'].isin(set(self._index))]
+        if len(new_rows):
+            print(f"Tokenizzazione di {len(new_rows)} nuove correzioni "
+                  f"({len(df) - len(new_rows)} già in cache).")
+            self._tokenize_new(new_rows.drop_duplicates('id'))
+            if len({name for name, _ in self._index.values()}) > self.max_shards:
+                self._compact()
+        else:
+            print(f"Tutte le {len(df)} correzioni sono già tokenizzate in cache.")
+
+        # Si aprono solo gli shard che contengono le righe richieste; select() su un dataset
+        # in memory-map crea solo una mappa di indici, senza copie
+        locations = [self._index[int(row_id)] for row_id in df['id']]
+        names = sorted({name for name, _ in locations})
+        offsets, total = {}, 0
+        for name in names:
+            offsets[name] = total
+            total += len(self._open_shard(name))
+        shards = concatenate_datasets([self._open_shard(name) for name in names])
+        features = shards.select([offsets[name] + position for name, position in locations])
+        return features.add_column("labels", df['label'].astype("int64").tolist())
@@ -0,0 +1,246 @@
+# src/worker_pool.py
+
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from src import config
+
+
+def assign_core_sets(num_workers):
+    """
+    Divide i core disponibili al processo in `num_workers` gruppi contigui.
+    Se i worker sono più dei core, alcuni gruppi restano vuoti (nessun pinning).
+    """
+    available_cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+    if not available_cores:
+        return [[] for _ in range(num_workers)]
+    return [list(map(int, group)) for group in np.array_split(available_cores, num_workers)]
+
+
+# Moduli importati una volta sola dal processo forkserver: i worker nascono già con torch e transformers
+_FORKSERVER_PRELOAD = ["torch", "transformers.pipelines", "src.worker_pool", "src.evaluate"]
+
+
+def process_context():
+    """
+    Contesto multiprocessing per i processi di inferenza e valutazione
+    (config.WORKER_START_METHOD, default "forkserver").
+
+    Con `fork` un figlio eredita il pool di thread OpenMP del padre: se il padre ha già
+    eseguito una forward pass con più thread torch, il figlio si blocca alla prima
+    inferenza. Con `forkserver` i processi nascono da un server che non ha mai eseguito
+    inferenze (e che ha già importato torch e transformers, quindi l'avvio è rapido);
+    i tensori del modello, in memoria condivisa, vengono passati come riferimenti.
+    """
+    context = mp.get_context(config.WORKER_START_METHOD)
+    if config.WORKER_START_METHOD == "forkserver":
+        # Ha effetto solo prima dell'avvio del server (al primo processo creato)
+        context.set_forkserver_preload(_FORKSERVER_PRELOAD)
+    return context
+
+
+def _worker_main(worker_index, sentiment_pipeline, core_set, num_threads, task_queue, result_queue, current_tasks):
+    """
+    Loop di un processo worker: riceve batch di testi, esegue l'inferenza e
+    restituisce i risultati. I pesi del modello sono quelli del padre, in memoria condivisa.
+    L'id del task in corso viene scritto in memoria condivisa (visibile subito, a
+    differenza dei messaggi in coda): se il worker termina in modo anomalo il padre
+    sa quale richiesta far fallire.
+    """
+    if core_set and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, core_set)
+    torch.set_num_threads(num_threads)
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            return
+
+        task_id, texts, kwargs = task
+        current_tasks[worker_index] = task_id
+        try:
+            with torch.inference_mode():
+                outputs = sentiment_pipeline(texts, batch_size=len(texts), **kwargs)
+            result_queue.put((task_id, outputs, None))
+        except Exception as e:
+            result_queue.put((task_id, None, repr(e)))
+
+
+class InferenceWorkerPool:
+    """
+    Pool di processi di inferenza che condividono gli stessi pesi del modello.
+
+    Il modello viene caricato una sola volta nel processo principale e i suoi tensori
+    vengono spostati in memoria condivisa; i worker vengono avviati con `forkserver`
+    (vedi `process_context`) e li ricevono come riferimenti, senza copiarli. La pipeline
+    può quindi aver già eseguito inferenze nel processo principale. Ogni worker è vincolato a un gruppo di core, con un numero
+    di thread torch pari ai core assegnati, così i processi non si contendono le CPU.
+
+    Il pool è compatibile con la pipeline: `pool(texts, batch_size=...)` restituisce
+    la lista di dict {'label', 'score'} nello stesso ordine dei testi.
+
+    Se un worker termina in modo anomalo (es. ucciso dall'OOM killer), le richieste
+    che stava elaborando falliscono con RuntimeError invece di restare in attesa;
+    quelle ancora in coda vengono servite dai worker rimasti.
+    """
+
+    def __init__(self, model_name=None, num_workers=None, threads_per_worker=None, sentiment_pipeline=None):
+        """
+        Args:
+            model_name (str, optional): Modello da caricare (come in `load_sentiment_pipeline`).
+            num_workers (int, optional): Numero di processi. Default: config.WORKER_POOL_SIZE.
+            threads_per_worker (int, optional): Thread torch per processo. Default:
+                                                config.WORKER_THREADS o i core assegnati.
+            sentiment_pipeline (optional): Pipeline già caricata da condividere con i worker.
+        """
+        self.num_workers = num_workers or config.WORKER_POOL_SIZE or 1
+
+        if sentiment_pipeline is None:
+            # Import locale per evitare dipendenze circolari con src.model
+            from src.model import load_sentiment_pipeline
+            # Backend eager: il grafo TorchScript non si può passare a un processo avviato dal forkserver
+            sentiment_pipeline = load_sentiment_pipeline(device="cpu", model_name=model_name, backend="eager")
+
+        self.pipeline = sentiment_pipeline
+        self.model = getattr(sentiment_pipeline, 'model', None)
+        self.tokenizer = getattr(sentiment_pipeline, 'tokenizer', None)
+        if isinstance(self.model, torch.nn.Module):
+            self.model.share_memory()
+
+        context = process_context()
+        self._task_queue = context.Queue()
+        self._result_queue = context.Queue()
+        self._task_ids = itertools.count()
+        self._pending = {}
+        # Task in corso per ogni worker (-1 = nessuno), scritto dai worker in memoria condivisa
+        self._current_tasks = context.Array('q', [-1] * self.num_workers, lock=False)
+        self._dead_workers = set()
+        self._closing = False
+        self._pending_lock = threading.Lock()
+
+        core_sets = assign_core_sets(self.num_workers)
+        print(f"Avvio di {self.num_workers} worker di inferenza...")
+        self._workers = []
+        for worker_index, core_set in enumerate(core_sets):
+            num_threads = threads_per_worker or config.WORKER_THREADS or max(1, len(core_set))
+            worker = context.Process(
+                target=_worker_main,
+                args=(worker_index, sentiment_pipeline, core_set, num_threads, self._task_queue,
+                      self._result_queue, self._current_tasks),
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+            print(f"  Worker PID {worker.pid}: core {core_set or 'non vincolati'}, {num_threads} thread")
+
+        self._collector = threading.Thread(target=self._collect_results, name="worker-pool-results", daemon=True)
+        self._collector.start()
+
+    # --- API PUBBLICA ---
+
+    def submit_batch(self, texts, **kwargs):
+        """Invia un batch a un worker libero e restituisce un Future con la lista dei risultati."""
+        kwargs.pop("batch_size", None)
+        task_id = next(self._task_ids)
+        future = Future()
+        with self._pending_lock:
+            if len(self._dead_workers) == len(self._workers):
+                raise RuntimeError("Tutti i worker di inferenza sono terminati: il pool non è utilizzabile.")
+            self._pending[task_id] = future
+        self._task_queue.put((task_id, list(texts), kwargs))
+        return future
+
+    def run_batches(self, batches, **kwargs):
+        """Esegue in parallelo una lista di batch e restituisce le uscite nello stesso ordine."""
+        futures = [self.submit_batch(batch, **kwargs) for batch in batches]
+        return [future.result() for future in futures]
+
+    def __call__(self, inputs, batch_size=None, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        batch_size = batch_size or config.BULK_BATCH_SIZE
+        batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+        return [output for batch_outputs in self.run_batches(batches, **kwargs) for output in batch_outputs]
+
+    def close(self):
+        """Ferma i worker e il thread di raccolta dei risultati."""
+        self._closing = True
+        for _ in self._workers:
+            self._task_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._result_queue.put(None)
+        self._collector.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- LOGICA INTERNA ---
+
+    def _collect_results(self):
+        while True:
+            try:
+                message = self._result_queue.get(timeout=config.WORKER_LIVENESS_INTERVAL_S)
+            except queue.Empty:
+                pass
+            else:
+                if message is None:
+                    return
+                self._handle_message(message)
+            if not self._closing and not self._check_workers():
+                return
+
+    def _handle_message(self, message):
+        task_id, outputs, error = message
+        with self._pending_lock:
+            future = self._pending.pop(task_id, None)
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(f"Errore nel worker di inferenza: {error}"))
+        else:
+            future.set_result(outputs)
+
+    def _check_workers(self):
+        """
+        Fa fallire le richieste dei worker terminati in modo anomalo.
+        Restituisce False se durante lo svuotamento della coda arriva il segnale di chiusura.
+        """
+        for worker_index, worker in enumerate(self._workers):
+            if worker_index in self._dead_workers or worker.is_alive():
+                continue
+            # I messaggi inviati dal worker prima di terminare vanno elaborati prima di dichiararli persi
+            while True:
+                try:
+                    message = self._result_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    return False
+                self._handle_message(message)
+
+            with self._pending_lock:
+                self._dead_workers.add(worker_index)
+                # Il task in corso è perso se il suo risultato non è arrivato prima della terminazione
+                lost_ids = [self._current_tasks[worker_index]]
+                if len(self._dead_workers) == len(self._workers):
+                    # Nessun worker può più servire le richieste rimaste in coda
+                    lost_ids = list(self._pending)
+                lost = [self._pending.pop(task_id) for task_id in lost_ids if task_id in self._pending]
+
+            print(f"⚠️ Worker PID {worker.pid} terminato (exitcode {worker.exitcode}): "
+                  f"{len(lost)} richieste fallite.")
+            for future in lost:
+                future.set_exception(RuntimeError(
+                    f"Il worker di inferenza PID {worker.pid} è terminato (exitcode {worker.exitcode})"
+                ))
+        return True
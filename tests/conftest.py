@@ -0,0 +1,45 @@
+# tests/conftest.py
+
+import os
+
+import pytest
+
+from src import config
+
+# Il modello minuscolo viene generato una sola volta nella cartella del progetto e riusato
+# da tutte le esecuzioni (e da tutti i worker di pytest-xdist, che leggono gli stessi file)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pytest_addoption(parser):
+    parser.addoption("--real-model", action="store_true", default=False,
+                     help="Esegue anche i test sul modello reale del Hub (lenti, richiedono la rete).")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "real_model: test sul modello reale del Hub (opt-in con --real-model)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--real-model") or os.environ.get("RUN_REAL_MODEL_TESTS") == "1":
+        return
+    skip_real = pytest.mark.skip(reason="modello reale escluso: usare --real-model o RUN_REAL_MODEL_TESTS=1")
+    for item in items:
+        if "real_model" in item.keywords:
+            item.add_marker(skip_real)
+
+
+@pytest.fixture(scope="session")
+def tiny_model_dir():
+    """Modello RoBERTa minuscolo con pesi casuali e le etichette di config, generato in locale."""
+    from src.tiny_model import get_tiny_model
+
+    return get_tiny_model(os.path.join(ROOT_DIR, config.TINY_MODEL_DIR))
+
+
+@pytest.fixture(scope="session")
+def tiny_pipeline(tiny_model_dir):
+    """Pipeline sul modello minuscolo: stesso codice di caricamento del modello reale, offline e in pochi secondi."""
+    from src.model import load_sentiment_pipeline
+
+    return load_sentiment_pipeline(device="cpu", model_name=tiny_model_dir, backend="eager")
@@ -0,0 +1,26 @@
+# tests/test_app.py
+
+import app
+from src import config
+
+
+def test_server_address_honours_gradio_environment(monkeypatch):
+    """Su Hugging Face Spaces GRADIO_SERVER_NAME/PORT decidono dove ascoltare; altrimenti vale config."""
+    monkeypatch.delenv("GRADIO_SERVER_NAME", raising=False)
+    monkeypatch.delenv("GRADIO_SERVER_PORT", raising=False)
+    assert app.server_address() == (config.SERVER_HOST, config.SERVER_PORT)
+
+    monkeypatch.setenv("GRADIO_SERVER_NAME", "0.0.0.0")
+    monkeypatch.setenv("GRADIO_SERVER_PORT", "8080")
+    assert app.server_address() == ("0.0.0.0", 8080)
+
+
+def test_predict_rejects_explicit_invalid_length_options():
+    """max_tokens=0 e truncation="" sono valori espliciti: vanno rifiutati, non sostituiti dai default."""
+    from fastapi.testclient import TestClient
+
+    client = TestClient(app.create_server_app())
+    for options in ({"max_tokens": 0}, {"truncation": ""}, {"max_tokens": "abc"}):
+        response = client.post("/v1/predict", json={"text": "I love it", **options})
+        assert response.status_code == 400, options
+        assert "error" in response.json()
@@ -0,0 +1,60 @@
+# tests/test_artifact_store.py
+
+import os
+
+import pytest
+from datasets import Dataset, DatasetDict
+
+from src import config
+from src.artifact_store import ArtifactStore, load_dataset_snapshot, resolve_model_path
+
+
+def write_files(contents):
+    def write(directory):
+        for name, text in contents.items():
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                f.write(text)
+    return write
+
+
+def test_snapshot_is_content_addressed(tmp_path):
+    """Lo stesso contenuto produce lo stesso snapshot; un nuovo contenuto sostituisce il precedente."""
+    store = ArtifactStore(str(tmp_path))
+
+    first = store._commit("models", "org/model", write_files({"config.json": "{}"}), source="test")
+    again = store._commit("models", "org/model", write_files({"config.json": "{}"}), source="test")
+    assert again["path"] == first["path"]
+
+    updated = store._commit("models", "org/model", write_files({"config.json": "{\"v\": 2}"}), source="test")
+    assert updated["sha256"] != first["sha256"]
+    assert store.path("models", "org/model") == os.path.join(str(tmp_path), updated["path"])
+    assert not os.path.exists(os.path.join(str(tmp_path), first["path"]))
+
+
+def test_verify_detects_modified_files(tmp_path):
+    """La verifica completa confronta gli SHA-256 con quelli del manifest."""
+    store = ArtifactStore(str(tmp_path))
+    entry = store._commit("models", "org/model", write_files({"weights.bin": "abcd"}), source="test")
+    assert store.verify("models", "org/model", full=True) == []
+
+    with open(os.path.join(str(tmp_path), entry["path"], "weights.bin"), "w") as f:
+        f.write("abce")
+    assert store.verify("models", "org/model") == []
+    assert store.verify("models", "org/model", full=True) == ["weights.bin: contenuto diverso dal manifest"]
+
+
+def test_offline_mode_loads_only_from_snapshots(tmp_path, monkeypatch):
+    """In modalità offline il dataset viene aperto dallo snapshot e un modello mancante è un errore."""
+    monkeypatch.setattr(config, "ARTIFACT_STORE_MODE", "offline")
+    store = ArtifactStore(str(tmp_path))
+    dataset = DatasetDict(test=Dataset.from_dict({"text": ["ciao", "addio"], "label": [2, 0]}))
+    store._commit("datasets", f"{config.DATASET_NAME}/{config.DATASET_SUBSET}", dataset.save_to_disk, source="test")
+
+    loaded = load_dataset_snapshot(store=store)
+    assert loaded['test']['text'] == ["ciao", "addio"]
+
+    with pytest.raises(FileNotFoundError):
+        resolve_model_path("org/assente", store=store)
+
+    monkeypatch.setattr(config, "ARTIFACT_STORE_MODE", "prefer")
+    assert resolve_model_path("org/assente", store=store) == "org/assente"
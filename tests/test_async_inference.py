@@ -0,0 +1,132 @@
+# tests/test_async_inference.py
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src import config
+from src.async_inference import (AsyncInferenceService, DeadlineExceeded, RequestShed, run_until_disconnected,
+                                  validate_deadline_ms)
+
+
+def slow_predict(delay_s):
+    def predict(text):
+        time.sleep(delay_s)
+        return {'label': 'neutral', 'score': 1.0}
+    return predict
+
+
+def test_requests_within_capacity_complete():
+    service = AsyncInferenceService(slow_predict(0.01), max_concurrency=4, max_queue=4)
+
+    async def run():
+        return await asyncio.gather(*(service.predict(f"t{i}") for i in range(8)))
+
+    results = asyncio.run(run())
+    assert len(results) == 8
+    assert service.stats()["completed"] == 8
+
+
+def test_full_queue_is_shed_immediately():
+    """Oltre la capacità di esecuzione e di coda le richieste vengono rifiutate (429)."""
+    service = AsyncInferenceService(slow_predict(0.2), max_concurrency=1, max_queue=1, queue_budget_ms=1000)
+
+    async def run():
+        return await asyncio.gather(*(service.predict(f"t{i}") for i in range(4)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    shed = [r for r in results if isinstance(r, RequestShed)]
+    assert len(shed) == 2
+    assert shed[0].status_code == 429
+    assert service.stats()["completed"] == 2
+
+
+def test_queue_wait_over_budget_is_shed():
+    service = AsyncInferenceService(slow_predict(0.3), max_concurrency=1, max_queue=10, queue_budget_ms=50)
+
+    async def run():
+        return await asyncio.gather(service.predict("a"), service.predict("b"), return_exceptions=True)
+
+    first, second = asyncio.run(run())
+    assert isinstance(first, dict)
+    assert isinstance(second, RequestShed) and second.reason == "attesa in coda oltre il budget"
+
+
+def test_deadline_exceeded_during_inference():
+    service = AsyncInferenceService(slow_predict(0.3), max_concurrency=1)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(service.predict("a", deadline_ms=50))
+
+
+def test_request_deadline_must_be_positive_and_capped():
+    """Una scadenza arrivata con la richiesta deve essere un numero positivo entro il limite di config."""
+    validate_deadline_ms(1)
+    validate_deadline_ms(2500.5)
+    validate_deadline_ms(config.ASYNC_MAX_DEADLINE_MS)
+    for invalid in [0, -5, config.ASYNC_MAX_DEADLINE_MS + 1, "2000", True, None, float("nan")]:
+        with pytest.raises(ValueError):
+            validate_deadline_ms(invalid)
+
+
+def test_disconnected_client_never_reaches_the_model():
+    """Una richiesta in coda il cui client si disconnette viene cancellata prima dell'esecuzione."""
+    executed = []
+    release = threading.Event()
+
+    def predict(text):
+        executed.append(text)
+        release.wait(1)
+        return {'label': 'neutral', 'score': 1.0}
+
+    service = AsyncInferenceService(predict, max_concurrency=1, queue_budget_ms=2000)
+
+    async def run():
+        busy = asyncio.ensure_future(service.predict("in esecuzione"))
+        await asyncio.sleep(0.05)
+
+        async def is_disconnected():
+            return True
+
+        result = await run_until_disconnected(service.predict("in coda"), is_disconnected)
+        release.set()
+        await busy
+        return result
+
+    assert asyncio.run(run()) is None
+    assert executed == ["in esecuzione"]
+    assert service.stats()["cancelled"] == 1
+
+
+def test_default_concurrency_follows_batch_size_changed_after_creation(monkeypatch):
+    """Il profilo di esecuzione cambia config.BATCH_MAX_SIZE al caricamento del modello, dopo la creazione del servizio."""
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def predict(text):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return {'label': 'neutral', 'score': 1.0}
+
+    monkeypatch.setattr(config, "ASYNC_MAX_CONCURRENCY", None)
+    monkeypatch.setattr(config, "BATCH_MAX_SIZE", 1)
+    service = AsyncInferenceService(predict, max_queue=16, queue_budget_ms=5000)
+
+    async def run(count):
+        return await asyncio.gather(*(service.predict(f"t{i}") for i in range(count)))
+
+    for batch_size in (4, 2):
+        monkeypatch.setattr(config, "BATCH_MAX_SIZE", batch_size)
+        peak[0] = 0
+        assert len(asyncio.run(run(8))) == 8
+        assert peak[0] == batch_size
+        assert service.stats()["max_concurrency"] == batch_size
+    assert service.stats()["completed"] == 16
+    service.close()
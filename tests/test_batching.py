@@ -0,0 +1,98 @@
+# tests/test_batching.py
+
+import threading
+import time
+
+from src.batching import MicroBatcher
+
+
+class FakePipeline:
+    """
+    Pipeline finta che registra la dimensione di ogni batch ricevuto.
+    Restituisce come label il testo stesso, così possiamo verificare
+    che ogni chiamante riceva il proprio risultato.
+    """
+
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, texts, batch_size=None, **kwargs):
+        with self.lock:
+            self.calls.append(len(texts))
+        time.sleep(self.delay)
+        return [{'label': text, 'score': 1.0} for text in texts]
+
+
+def test_single_request_is_flushed_after_deadline():
+    """Un testo isolato deve essere processato anche se il batch non è pieno."""
+    fake = FakePipeline()
+    batcher = MicroBatcher(fake, max_batch_size=8, max_wait_ms=5)
+
+    result = batcher.predict("ciao", timeout=2)
+
+    assert result == {'label': "ciao", 'score': 1.0}
+    assert fake.calls == [1]
+    batcher.close()
+
+
+def test_concurrent_requests_are_batched_and_routed():
+    """Richieste concorrenti finiscono nello stesso batch e tornano al chiamante giusto."""
+    fake = FakePipeline()
+    batcher = MicroBatcher(fake, max_batch_size=4, max_wait_ms=200)
+
+    futures = [batcher.submit(f"testo-{i}") for i in range(8)]
+    results = [future.result(timeout=2) for future in futures]
+
+    assert [r['label'] for r in results] == [f"testo-{i}" for i in range(8)]
+    assert fake.calls == [4, 4]
+
+    stats = batcher.stats()
+    assert stats['requests'] == 8
+    assert stats['batches'] == 2
+    assert stats['batch_size_histogram'] == {4: 2}
+    batcher.close()
+
+
+def test_pipeline_compatible_call():
+    """Il batcher deve poter sostituire la pipeline: stessa firma e stesso formato."""
+    fake = FakePipeline()
+    batcher = MicroBatcher(fake, max_batch_size=4, max_wait_ms=5)
+
+    assert batcher("uno") == [{'label': "uno", 'score': 1.0}]
+    assert [r['label'] for r in batcher(["a", "b"])] == ["a", "b"]
+    batcher.close()
+
+
+def test_pipeline_errors_are_propagated():
+    """Un errore del modello deve arrivare a tutti i chiamanti del batch."""
+    def broken_pipeline(texts, **kwargs):
+        raise RuntimeError("modello rotto")
+
+    batcher = MicroBatcher(broken_pipeline, max_batch_size=2, max_wait_ms=5)
+    future = batcher.submit("x")
+
+    try:
+        future.result(timeout=2)
+        assert False, "Il Future avrebbe dovuto sollevare un'eccezione"
+    except RuntimeError as e:
+        assert "modello rotto" in str(e)
+    batcher.close()
+
+
+def test_submit_after_close_is_rejected():
+    """Le richieste in coda vengono smaltite; dopo close() una nuova richiesta fallisce subito invece di bloccarsi."""
+    fake = FakePipeline(delay=0.05)
+    batcher = MicroBatcher(fake, max_batch_size=2, max_wait_ms=5)
+    queued = [batcher.submit(text) for text in ["a", "b", "c"]]
+
+    batcher.close(timeout=2)
+    batcher.close(timeout=2)
+
+    assert [future.result(timeout=1)['label'] for future in queued] == ["a", "b", "c"]
+    try:
+        batcher.predict("tardi", timeout=1)
+        assert False, "La richiesta dopo close() avrebbe dovuto essere rifiutata"
+    except RuntimeError as e:
+        assert "chiuso" in str(e)
@@ -0,0 +1,37 @@
+# tests/test_benchmark_performance.py
+
+from benchmark_performance import append_history, compare_runs, load_history
+
+
+def _run(**metrics):
+    return {"model": "tiny", "backend": "eager", "metrics": metrics}
+
+
+def test_compare_runs_direction_of_metrics():
+    """Latenze più alte e throughput più bassi oltre la soglia sono regressioni."""
+    baseline = _run(latency_p95_ms=10.0, throughput_seq16_bs8=1000.0, peak_rss_mb=500.0)
+    current = _run(latency_p95_ms=12.0, throughput_seq16_bs8=850.0, peak_rss_mb=520.0)
+
+    regressions = {r['metric'] for r in compare_runs(baseline, current, threshold=0.10)}
+
+    # La memoria cresce solo del 4%: sotto la soglia
+    assert regressions == {"latency_p95_ms", "throughput_seq16_bs8"}
+
+
+def test_improvements_are_not_regressions():
+    """Un miglioramento (latenza più bassa, throughput più alto) non viene segnalato."""
+    baseline = _run(latency_p50_ms=10.0, throughput_seq16_bs1=100.0)
+    current = _run(latency_p50_ms=5.0, throughput_seq16_bs1=300.0, cold_start_s=1.0)
+
+    assert compare_runs(baseline, current, threshold=0.10) == []
+
+
+def test_history_is_appended(tmp_path):
+    """Ogni esecuzione viene aggiunta in coda allo storico JSON."""
+    path = str(tmp_path / "history.json")
+    assert load_history(path) == []
+
+    append_history(path, _run(latency_p50_ms=1.0))
+    append_history(path, _run(latency_p50_ms=2.0))
+
+    assert [run['metrics']['latency_p50_ms'] for run in load_history(path)] == [1.0, 2.0]
@@ -0,0 +1,43 @@
+# tests/test_bulk_inference.py
+
+import numpy as np
+
+from src.bulk_inference import padding_waste, predict_sorted_by_length
+
+
+class RecordingPipeline:
+    """Pipeline finta senza tokenizer: registra i batch e restituisce il testo come label."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts, batch_size=None, truncation=None):
+        self.batches.append(list(texts))
+        return [{'label': text, 'score': 1.0} for text in texts]
+
+
+def test_original_order_is_restored():
+    """Le predizioni devono tornare nello stesso ordine dei testi in input."""
+    texts = ["a b c d e f", "a", "a b c", "a b", "a b c d e f g h", "a b c d"]
+    fake = RecordingPipeline()
+
+    outputs, stats = predict_sorted_by_length(fake, texts, batch_size=2)
+
+    assert [o['label'] for o in outputs] == texts
+    assert stats['texts'] == len(texts)
+    # I batch devono contenere testi di lunghezza crescente
+    assert fake.batches[0] == ["a", "a b"]
+
+
+def test_sorting_reduces_padding_waste():
+    """Ordinare per lunghezza non può aumentare il padding rispetto all'ordine originale."""
+    texts = ["x " * n for n in [1, 30, 2, 25, 3, 40, 1, 35]]
+    _, stats = predict_sorted_by_length(RecordingPipeline(), texts, batch_size=2)
+
+    assert stats['padding_waste'] < stats['padding_waste_unsorted']
+
+
+def test_padding_waste_values():
+    """Nessuno spreco con lunghezze uguali, metà spreco con lunghezze 1 e 3 in un batch da 2."""
+    assert padding_waste(np.array([4, 4, 4, 4]), batch_size=2) == 0.0
+    assert padding_waste(np.array([1, 3]), batch_size=2) == 1 - 4 / 6
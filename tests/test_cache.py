@@ -0,0 +1,85 @@
+# tests/test_cache.py
+
+import time
+
+from src.cache import CachedPipeline, PredictionCache
+
+
+class CountingPipeline:
+    """Pipeline finta che conta quanti testi arrivano al 'modello'."""
+
+    def __init__(self):
+        self.seen = []
+
+    def __call__(self, texts, **kwargs):
+        self.seen.extend(texts)
+        return [{'label': 'positive', 'score': len(text) / 100} for text in texts]
+
+
+def test_repeated_texts_hit_the_cache():
+    """Un testo già visto non deve tornare al modello; testi identici nella stessa chiamata vanno una volta."""
+    fake = CountingPipeline()
+    cached = CachedPipeline(fake, cache=PredictionCache(max_entries=10, ttl_seconds=60), fingerprint="m1")
+
+    first = cached("Great product")
+    second = cached(["Great product", "Another one", "Another one"])
+
+    assert fake.seen == ["Great product", "Another one"]
+    assert second[0] == first[0]
+    assert cached.stats()['memory_hits'] == 1
+
+
+def test_new_model_fingerprint_invalidates_entries():
+    """Con un'impronta diversa (modello ri-addestrato) la predizione va ricalcolata."""
+    fake = CountingPipeline()
+    cache = PredictionCache(max_entries=10, ttl_seconds=60)
+
+    CachedPipeline(fake, cache=cache, fingerprint="old")("text")
+    CachedPipeline(fake, cache=cache, fingerprint="new")("text")
+
+    assert fake.seen == ["text", "text"]
+
+
+def test_lru_eviction_and_ttl():
+    """L'elemento meno usato viene rimosso e gli elementi scaduti non vengono restituiti."""
+    cache = PredictionCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()['evictions'] == 1
+
+    short_lived = PredictionCache(max_entries=2, ttl_seconds=0.01)
+    short_lived.put("x", 1)
+    time.sleep(0.05)
+    assert short_lived.get("x") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Il livello SQLite deve restituire le predizioni anche a un nuovo processo."""
+    db_path = str(tmp_path / "cache.db")
+    PredictionCache(max_entries=10, ttl_seconds=60, db_path=db_path).put("k", {'label': 'neutral'})
+
+    reopened = PredictionCache(max_entries=10, ttl_seconds=60, db_path=db_path)
+
+    assert reopened.get("k") == {'label': 'neutral'}
+    assert reopened.stats()['disk_hits'] == 1
+
+
+def test_whitespace_and_unicode_variants_are_distinct_keys(tiny_model_dir):
+    """Il tokenizer BPE distingue spazi e forme Unicode: ogni variante ha la sua voce di cache."""
+    from transformers import AutoTokenizer
+
+    variants = ["Great product", "Great  product", " Great product", "Great product\n", "caf\u00e9", "cafe\u0301"]
+    tokenizer = AutoTokenizer.from_pretrained(tiny_model_dir)
+    assert len({tuple(tokenizer(text)['input_ids']) for text in variants}) == len(variants)
+
+    fake = CountingPipeline()
+    cached = CachedPipeline(fake, cache=PredictionCache(max_entries=10, ttl_seconds=60), fingerprint="m1")
+    cached(variants)
+    cached(variants)
+
+    assert fake.seen == variants
@@ -0,0 +1,81 @@
+# tests/test_cascade.py
+
+import numpy as np
+
+from src import config
+from src.cascade import CascadePipeline, FirstStageModel, calibrate_threshold
+from src.scoring import class_probabilities
+
+
+class NeutralPipeline:
+    """Transformer finto: risponde sempre 'neutral' e registra i testi ricevuti."""
+
+    def __init__(self):
+        self.received = []
+
+    def __call__(self, texts, batch_size=None, truncation=True, top_k=1):
+        self.received.extend(texts)
+        distribution = [{'label': 'neutral', 'score': 0.8}, {'label': 'positive', 'score': 0.1},
+                        {'label': 'negative', 'score': 0.1}]
+        return [distribution if top_k is None else distribution[0] for _ in texts]
+
+
+def trained_first_stage():
+    texts = ["I love this, great day"] * 20 + ["I hate this, awful day"] * 20 + ["the meeting is at noon"] * 20
+    labels = [2] * 20 + [0] * 20 + [1] * 20
+    return FirstStageModel(num_features=2 ** 12).fit(texts, labels)
+
+
+def test_calibration_respects_accuracy_budget():
+    """La soglia scelta accetta i testi più sicuri finché la perdita resta entro il budget."""
+    true_ids = np.array([0, 1, 2, 0, 1, 2])
+    transformer_ids = true_ids.copy()
+    # Confidenze decrescenti; il primo stadio sbaglia solo il quinto testo (confidenza 0.6)
+    probabilities = np.array([
+        [0.99, 0.005, 0.005],
+        [0.025, 0.95, 0.025],
+        [0.05, 0.05, 0.9],
+        [0.8, 0.1, 0.1],
+        [0.6, 0.2, 0.2],
+        [0.25, 0.25, 0.5],
+    ])
+    strict = calibrate_threshold(probabilities, transformer_ids, true_ids, max_accuracy_loss=0.0)
+    assert strict["threshold"] == 0.8
+    assert strict["escalation_rate"] == 2 / 6
+    assert strict["cascade_accuracy"] == 1.0
+
+    loose = calibrate_threshold(probabilities, transformer_ids, true_ids, max_accuracy_loss=0.2)
+    assert loose["threshold"] == 0.5
+    assert loose["escalation_rate"] == 0.0
+
+
+def test_only_uncertain_texts_escalate():
+    """I testi sicuri sono risolti dal primo stadio, gli altri passano al transformer nell'ordine giusto."""
+    transformer = NeutralPipeline()
+    cascade = CascadePipeline(trained_first_stage(), transformer, threshold=0.7)
+    texts = ["I love this, great day", "zxqv wpt", "I hate this, awful day"]
+
+    outputs = cascade(texts)
+
+    assert transformer.received == ["zxqv wpt"]
+    assert [output['label'] for output in outputs] == ["positive", "neutral", "negative"]
+    assert cascade.stats()["escalated"] == 1
+
+    probabilities = class_probabilities(cascade, texts)
+    assert probabilities.shape == (3, len(config.LABELS))
+    np.testing.assert_allclose(probabilities[1], [0.1, 0.8, 0.1])
+
+
+def test_first_stage_round_trip(tmp_path):
+    """Il primo stadio salvato su disco dà le stesse probabilità e la stessa soglia."""
+    first_stage = trained_first_stage()
+    first_stage.threshold = 0.77
+    path = str(tmp_path / "stage1.joblib")
+
+    first_stage.save(path)
+    loaded = FirstStageModel.load(path)
+
+    texts = ["great day", "awful day", "noon"]
+    np.testing.assert_allclose(loaded.predict_proba(texts), first_stage.predict_proba(texts))
+    assert loaded.threshold == 0.77
+    assert loaded.fingerprint() == first_stage.fingerprint()
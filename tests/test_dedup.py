@@ -0,0 +1,59 @@
+# tests/test_dedup.py
+
+import pandas as pd
+
+from src.dedup import NearDuplicateIndex, canonicalize_text, deduplicate_corrections, predict_deduplicated
+
+
+def test_canonical_form_ignores_links_mentions_and_case():
+    """Lo stesso tweet con link, menzioni e maiuscole diverse ha la stessa forma canonica."""
+    assert canonicalize_text("Great phone!!  https://t.co/abc @bob") == \
+        canonicalize_text("great PHONE! http://x.y/z @alice")
+
+
+def test_near_duplicates_share_a_cluster():
+    """Piccole differenze restano nello stesso cluster, testi diversi no."""
+    index = NearDuplicateIndex()
+    clusters = index.assign([
+        "The delivery was late again and nobody answered the phone",
+        "the delivery was late again and nobody answered the phone.",
+        "The delivery was late again, and nobody answered the phone",
+        "Absolutely loved the new update, great job team",
+    ])
+
+    assert clusters[0] == clusters[1] == clusters[2]
+    assert clusters[3] != clusters[0]
+    assert len(index) == 2
+
+
+def test_predictions_are_fanned_out_to_the_cluster():
+    """Il modello vede un testo per cluster e ogni riga riceve il risultato del suo cluster."""
+    seen = []
+
+    def predict(texts):
+        seen.extend(texts)
+        return [text.upper() for text in texts]
+
+    outputs, scored = predict_deduplicated(predict, ["Ciao @a", "ciao @b", "Addio", "CIAO @c"])
+
+    assert scored == 2
+    assert seen == ["Ciao @a", "Addio"]
+    assert outputs == ["CIAO @A", "CIAO @A", "ADDIO", "CIAO @A"]
+
+
+def test_conflicting_labels_majority_and_latest():
+    """Voto di maggioranza (a parità vince la più recente) oppure ultima etichetta."""
+    df = pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "text": ["Nice one https://t.co/1", "nice one https://t.co/2", "NICE ONE https://t.co/3",
+                 "Other text entirely"],
+        "label": [2, 2, 1, 0],
+    })
+
+    majority = deduplicate_corrections(df, policy="majority")
+    latest = deduplicate_corrections(df, policy="latest")
+
+    assert majority["id"].tolist() == [3, 4]
+    assert majority["label"].tolist() == [2, 0]
+    assert majority["duplicates"].tolist() == [3, 1]
+    assert latest["label"].tolist() == [1, 0]
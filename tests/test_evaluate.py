@@ -0,0 +1,85 @@
+# tests/test_evaluate.py
+
+import os
+
+import pytest
+import torch
+from datasets import Dataset, DatasetDict
+
+from src import config
+from src.evaluate import evaluate_sharded
+
+
+class WordCountPipeline:
+    """Backend finto con `logits`: predice la classe (numero di parole) % 3."""
+
+    config = type("Config", (), {"id2label": {0: "negative", 1: "neutral", 2: "positive"}})
+
+    def logits(self, texts, truncation=True):
+        logits = torch.zeros(len(texts), 3)
+        for row, text in enumerate(texts):
+            logits[row, len(text.split()) % 3] = 1.0
+        return logits
+
+
+def make_dataset(size=60):
+    texts = [" ".join(["w"] * (i % 7 + 1)) for i in range(size)]
+    labels = [(i % 7 + 1) % 3 if i % 5 else 0 for i in range(size)]
+    return DatasetDict(test=Dataset.from_dict({"text": texts, "label": labels}))
+
+
+def test_sharded_evaluation_matches_serial():
+    """Unire le matrici di confusione degli shard dà gli stessi risultati della valutazione seriale."""
+    dataset = make_dataset()
+
+    serial = evaluate_sharded(WordCountPipeline(), dataset, num_shards=1, bootstrap_samples=50)
+    sharded = evaluate_sharded(WordCountPipeline(), dataset, num_shards=3, bootstrap_samples=50)
+
+    assert sharded['shards'] == 3
+    assert sharded['confusion_matrix'] == serial['confusion_matrix']
+    assert sharded['accuracy'] == serial['accuracy']
+    assert sum(map(sum, sharded['confusion_matrix'])) == 60
+
+
+class CrashingPipeline(WordCountPipeline):
+    """Backend finto il cui processo termina in modo anomalo sul testo 'crash'."""
+
+    def logits(self, texts, truncation=True):
+        if "crash" in texts:
+            os._exit(1)
+        return super().logits(texts, truncation)
+
+
+def test_sharded_evaluation_fails_when_a_shard_process_dies(monkeypatch):
+    """Se un processo di valutazione muore senza risultato si ottiene un errore, non un'attesa infinita."""
+    monkeypatch.setattr(config, "WORKER_LIVENESS_INTERVAL_S", 0.1)
+    dataset = make_dataset()
+    dataset = DatasetDict(test=Dataset.from_dict({
+        "text": list(dataset['test']['text']) + ["crash"],
+        "label": list(dataset['test']['label']) + [0],
+    }))
+
+    with pytest.raises(RuntimeError, match="exitcode 1"):
+        evaluate_sharded(CrashingPipeline(), dataset, num_shards=3, bootstrap_samples=50)
+
+
+def test_sharded_evaluation_after_inference_in_the_parent(tiny_pipeline, monkeypatch):
+    """Con una pipeline reale già usata (più thread torch) gli shard non si bloccano e coincidono con la seriale."""
+    import src.worker_pool
+
+    # Due thread per shard anche su un host con un solo core: il blocco si presenta solo con più thread
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else [0]
+    monkeypatch.setattr(src.worker_pool, "assign_core_sets", lambda num_shards: [cores * 2] * num_shards)
+    dataset = make_dataset(size=24)
+    previous_threads = torch.get_num_threads()
+    torch.set_num_threads(4)
+    try:
+        # Forward pass abbastanza grande da avviare il pool di thread OpenMP del processo principale
+        tiny_pipeline(["word " * 200] * 16, batch_size=16)
+        serial = evaluate_sharded(tiny_pipeline, dataset, num_shards=1, bootstrap_samples=20)
+        sharded = evaluate_sharded(tiny_pipeline, dataset, num_shards=2, bootstrap_samples=20)
+    finally:
+        torch.set_num_threads(previous_threads)
+
+    assert sharded['shards'] == 2
+    assert sharded['confusion_matrix'] == serial['confusion_matrix']
@@ -0,0 +1,74 @@
+# tests/test_export.py
+
+import os
+import shutil
+
+import pytest
+import torch
+
+from src import config
+from src.export import PARITY_BATCHES, TracedSentimentPipeline, check_parity, export_traced_model, find_traced_artifact
+from src.model import load_sentiment_pipeline
+
+
+@pytest.fixture
+def model_copy(tiny_model_dir, tmp_path):
+    """Copia privata del modello minuscolo: l'export scrive l'artefatto accanto ai pesi."""
+    return shutil.copytree(tiny_model_dir, str(tmp_path / "model"))
+
+
+def weights_path(model_dir):
+    return next(os.path.join(model_dir, name) for name in ("model.safetensors", "pytorch_model.bin")
+                if os.path.isfile(os.path.join(model_dir, name)))
+
+
+def test_export_keeps_parity_on_untraced_shapes(model_copy):
+    """L'artefatto esportato coincide con il modello eager anche su batch e lunghezze diverse dal tracing."""
+    artifact_path = export_traced_model(model_copy)
+    assert artifact_path == os.path.join(model_copy, config.TRACED_MODEL_FILENAME)
+    assert find_traced_artifact(model_copy) == artifact_path
+
+    traced = TracedSentimentPipeline(model_copy)
+    eager = load_sentiment_pipeline(device="cpu", model_name=model_copy, backend="eager")
+    for batch in PARITY_BATCHES:
+        traced_results = traced(batch, batch_size=len(batch))
+        eager_results = eager(batch, batch_size=len(batch))
+        assert [r['label'] for r in traced_results] == [r['label'] for r in eager_results]
+        for traced_result, eager_result in zip(traced_results, eager_results):
+            assert traced_result['score'] == pytest.approx(eager_result['score'], abs=config.EXPORT_PARITY_ATOL)
+
+
+def test_parity_rejects_graph_with_fixed_shape(model_copy):
+    """Un grafo che ignora la forma dell'input viene scartato dal controllo di parità."""
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_copy)
+    model = AutoModelForSequenceClassification.from_pretrained(model_copy).eval()
+    fixed_logits = torch.zeros(len(PARITY_BATCHES[0]), model.config.num_labels)
+
+    assert check_parity(model, lambda input_ids, attention_mask: fixed_logits, tokenizer) == (False, float("inf"))
+
+
+def test_artifact_older_than_weights_is_stale(model_copy):
+    """Se i pesi sono più recenti dell'artefatto, l'artefatto viene ignorato."""
+    artifact_path = export_traced_model(model_copy)
+    artifact_mtime = os.path.getmtime(artifact_path)
+    os.utime(weights_path(model_copy), (artifact_mtime + 10, artifact_mtime + 10))
+
+    assert find_traced_artifact(model_copy) is None
+
+
+def test_auto_backend_falls_back_to_eager(model_copy):
+    """Con backend 'auto' si usa l'artefatto solo se presente e aggiornato, altrimenti la pipeline eager."""
+    assert not isinstance(load_sentiment_pipeline("cpu", model_copy, backend="auto"), TracedSentimentPipeline)
+    with pytest.raises(FileNotFoundError):
+        load_sentiment_pipeline("cpu", model_copy, backend="traced")
+
+    artifact_path = export_traced_model(model_copy)
+    assert isinstance(load_sentiment_pipeline("cpu", model_copy, backend="auto"), TracedSentimentPipeline)
+
+    artifact_mtime = os.path.getmtime(artifact_path)
+    os.utime(weights_path(model_copy), (artifact_mtime + 10, artifact_mtime + 10))
+    fallback = load_sentiment_pipeline("cpu", model_copy, backend="auto")
+    assert not isinstance(fallback, TracedSentimentPipeline)
+    assert fallback("ok")[0]['label'] in config.LABELS
@@ -0,0 +1,80 @@
+# tests/test_feedback_store.py
+
+import csv
+import threading
+
+from src.feedback_store import FeedbackStore, migrate_csv
+from src.monitor import CorrectionLogMonitor
+
+
+def test_concurrent_appends_are_group_committed(tmp_path):
+    """Scritture da più thread e da due istanze (due processi) sullo stesso file."""
+    db_path = str(tmp_path / "feedback.db")
+    store_a = FeedbackStore(db_path, flush_interval_ms=20)
+    store_b = FeedbackStore(db_path, flush_interval_ms=20)
+
+    def write(store, prefix):
+        futures = [store.append(f"2025-01-01T00:00:{i:02d}", f"{prefix}{i}", "neutral", "positive")
+                   for i in range(25)]
+        for future in futures:
+            future.result(timeout=10)
+
+    threads = [threading.Thread(target=write, args=(store, prefix))
+               for store, prefix in [(store_a, "a"), (store_b, "b"), (store_a, "c")]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store_a.count() == 75
+    assert store_b.read_since(0)['id'].is_unique
+    store_a.close()
+    store_b.close()
+
+
+def test_read_since_returns_only_new_records(tmp_path):
+    store = FeedbackStore(str(tmp_path / "feedback.db"))
+    store.append("2025-01-01T10:00:00", "vecchio", "neutral", "neutral")
+    store.flush()
+    last_id = store.max_id()
+
+    store.append("2025-01-02T10:00:00", "nuovo", "positive", "negative")
+    store.flush()
+
+    new_records = store.read_since(last_id)
+    assert new_records['text'].tolist() == ["nuovo"]
+    assert store.read_since_timestamp("2025-01-01T12:00:00")['text'].tolist() == ["nuovo"]
+    store.close()
+
+
+def test_csv_migration_is_incremental(tmp_path):
+    """La migrazione importa solo le righe del CSV non ancora importate."""
+    csv_path = str(tmp_path / "flagged_data_corrected.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "text", "model_prediction", "user_correction"])
+        writer.writerow(["t1", "primo", "neutral", "positive"])
+
+    store = FeedbackStore(str(tmp_path / "feedback.db"))
+    assert migrate_csv(csv_path, store) == 1
+    assert migrate_csv(csv_path, store) == 0
+
+    with open(csv_path, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(["t2", "secondo", "negative", "negative"])
+
+    assert migrate_csv(csv_path, store) == 1
+    assert store.read_since(0)['text'].tolist() == ["primo", "secondo"]
+    store.close()
+
+
+def test_monitor_reads_new_records_from_store(tmp_path):
+    store = FeedbackStore(str(tmp_path / "feedback.db"))
+    store.append_many([("t1", "a", "positive", "positive"), ("t2", "b", "positive", "negative")])
+
+    monitor = CorrectionLogMonitor(state_path=str(tmp_path / "state.json"), store=store)
+    assert monitor.update() == 2
+
+    store.append_many([("t3", "c", "neutral", "neutral")])
+    assert monitor.update() == 1
+    assert monitor.report()["accuracy"] == 2 / 3
+    store.close()
@@ -0,0 +1,117 @@
+# tests/test_hot_reload.py
+
+from src.hot_reload import HotSwapper, ModelReloader, check_golden_examples
+
+GOLDEN = {"good": "positive", "bad": "negative"}
+
+
+class FakePipeline:
+    """Pipeline finta: restituisce le etichette di un dizionario fisso."""
+
+    def __init__(self, answers):
+        self.answers = answers
+
+    def __call__(self, texts, batch_size=None):
+        return [{'label': self.answers[text], 'score': 1.0} for text in texts]
+
+
+def test_old_model_is_released_after_in_flight_requests():
+    """Una richiesta iniziata prima dello swap termina sul vecchio modello, poi questo viene rilasciato."""
+    released = []
+    swapper = HotSwapper("old", release=released.append)
+
+    with swapper.acquire() as model:
+        swapper.swap("new")
+        assert model == "old"
+        assert released == []  # Richiesta ancora in corso
+        with swapper.acquire() as new_model:
+            assert new_model == "new"
+
+    assert released == ["old"]
+    assert swapper.current == "new"
+
+
+def test_check_golden_examples_reports_mistakes():
+    assert check_golden_examples(FakePipeline(GOLDEN), GOLDEN) == []
+    wrong = FakePipeline({"good": "positive", "bad": "neutral"})
+    assert check_golden_examples(wrong, GOLDEN) == [("bad", "negative", "neutral")]
+
+
+def _make_reloader(tmp_path, swapper, answers):
+    return ModelReloader(swapper, load_pipeline=lambda: FakePipeline(answers),
+                         build_stack=lambda pipeline: pipeline, watch_dirs=[str(tmp_path)],
+                         golden_examples=GOLDEN)
+
+
+def test_reload_waits_for_stable_directory(tmp_path):
+    """Il ricaricamento parte solo quando i file del modello non cambiano per due controlli."""
+    swapper = HotSwapper("initial", release=lambda value: None)
+    reloader = _make_reloader(tmp_path, swapper, GOLDEN)
+
+    (tmp_path / "config.json").write_text("{}")
+    assert reloader.check_for_changes() is False  # Cambiamento appena visto: si attende
+    assert reloader.check_for_changes() is True   # Stabile: ricaricamento
+    assert isinstance(swapper.current, FakePipeline)
+    assert reloader.check_for_changes() is False  # Nessun nuovo cambiamento
+
+
+def test_degraded_model_is_not_swapped_in(tmp_path):
+    """Un modello che sbaglia gli esempi di riferimento non va in servizio."""
+    swapper = HotSwapper("initial", release=lambda value: None)
+    reloader = _make_reloader(tmp_path, swapper, {"good": "negative", "bad": "negative"})
+
+    assert reloader.reload() is False
+    assert swapper.current == "initial"
+
+
+def test_rejected_stack_is_released(tmp_path):
+    """Lo stack costruito per un modello rifiutato viene rilasciato, non lasciato con i suoi worker attivi."""
+    released = []
+    swapper = HotSwapper("initial", release=released.append)
+    reloader = _make_reloader(tmp_path, swapper, {"good": "negative", "bad": "negative"})
+
+    assert reloader.reload() is False
+    assert len(released) == 1 and isinstance(released[0], FakePipeline)
+
+
+def test_reload_with_worker_pool_after_inference(tiny_model_dir, tmp_path):
+    """
+    Con il pool di worker attivo il ricaricamento non si blocca anche se il processo ha già
+    eseguito inferenze con più thread, e la verifica passa dallo stack (cioè dai worker).
+    """
+    import torch
+
+    from src.batching import MicroBatcher
+    from src.hot_reload import ServingStack
+    from src.model import load_sentiment_pipeline
+    from src.worker_pool import InferenceWorkerPool
+
+    def load_pipeline():
+        return load_sentiment_pipeline(device="cpu", model_name=tiny_model_dir, backend="eager")
+
+    built = []
+
+    def build_stack(pipeline):
+        pool = InferenceWorkerPool(num_workers=2, threads_per_worker=2, sentiment_pipeline=pipeline)
+        built.append(pool)
+        return ServingStack(pool, MicroBatcher(pool, max_wait_ms=1), None, model_name=tiny_model_dir)
+
+    previous_threads = torch.get_num_threads()
+    torch.set_num_threads(4)
+    try:
+        # Il modello minuscolo ha pesi casuali: gli esempi di riferimento sono le sue stesse predizioni
+        reference = load_pipeline()
+        texts = ["I love it", "terrible", "the package arrived on Tuesday"]
+        golden = {text: result['label'].lower() for text, result in zip(texts, reference(texts))}
+
+        swapper = HotSwapper("initial", release=lambda value: None)
+        reloader = ModelReloader(swapper, load_pipeline, build_stack, watch_dirs=[str(tmp_path)],
+                                 golden_examples=golden, check_timeout_s=60)
+        assert reloader.reload() is True
+        assert swapper.current.sentiment_pipeline is built[0]
+        assert swapper.current.batcher("I love it")[0]['label'].lower() == golden["I love it"]
+        swapper.current.batcher.close()
+    finally:
+        torch.set_num_threads(previous_threads)
+        for pool in built:
+            pool.close()
@@ -0,0 +1,105 @@
+# tests/test_long_text.py
+
+import re
+
+import pytest
+
+from src.long_text import LengthPolicy, aggregate_distributions, validate_options
+from src.metrics import Metrics
+
+TEXT = " ".join(f"w{i}" for i in range(20))
+
+
+class WhitespaceTokenizer:
+    """Tokenizer finto: un token per parola, più due token speciali come RoBERTa."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False, verbose=True):
+        self.calls += 1
+        return {"offset_mapping": [match.span() for match in re.finditer(r"\S+", text)]}
+
+
+def test_short_texts_are_not_tokenized():
+    """I testi che entrano sicuramente nel limite passano invariati senza tokenizzazione."""
+    tokenizer = WhitespaceTokenizer()
+    policy = LengthPolicy(tokenizer, max_tokens=64)
+
+    assert policy.split("ciao a tutti") == (["ciao a tutti"], [1.0], "fits")
+    assert tokenizer.calls == 0
+
+
+@pytest.mark.parametrize("strategy, expected", [
+    ("head", "w0 w1 w2 w3 w4 w5 w6 w7"),
+    ("tail", "w12 w13 w14 w15 w16 w17 w18 w19"),
+    ("head+tail", "w0 w1 w14 w15 w16 w17 w18 w19"),
+])
+def test_truncation_strategies(strategy, expected):
+    """Con 10 token (8 + 2 speciali) si tengono inizio, fine o inizio + fine del testo originale."""
+    policy = LengthPolicy(WhitespaceTokenizer(), max_tokens=10, strategy=strategy, head_fraction=0.25)
+
+    segments, weights, path = policy.split(TEXT)
+
+    assert segments == [expected]
+    assert path == strategy
+
+
+def test_chunks_cover_text_once_and_are_counted():
+    """I blocchi sovrapposti coprono tutto il testo; i pesi contano ogni token una volta sola."""
+    metrics = Metrics()
+    policy = LengthPolicy(WhitespaceTokenizer(), max_tokens=10, strategy="chunk", chunk_overlap=2, metrics=metrics)
+
+    segments, weights, path = policy.split(TEXT)
+
+    assert segments == [" ".join(f"w{i}" for i in range(start, min(start + 8, 20))) for start in (0, 6, 12)]
+    assert weights == [8.0, 6.0, 6.0]
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['input_length_path{path="chunk"}'] == 1
+    assert snapshot['histograms']['input_segments']['count'] == 1
+
+
+def test_aggregate_is_weighted_mean():
+    """La distribuzione di un testo diviso in blocchi è la media pesata di quelle dei blocchi."""
+    first = [{'label': 'positive', 'score': 0.9}, {'label': 'negative', 'score': 0.1}]
+    second = [{'label': 'negative', 'score': 0.7}, {'label': 'positive', 'score': 0.3}]
+
+    aggregated = aggregate_distributions([first, second], [1.0, 3.0])
+
+    assert aggregated[0]['label'] == "negative"
+    assert aggregated[0]['score'] == pytest.approx(0.55)
+
+
+def test_invalid_request_options_are_rejected():
+    with pytest.raises(ValueError):
+        validate_options(128, "middle")
+    with pytest.raises(ValueError):
+        validate_options(100000, "head")
+
+
+@pytest.mark.parametrize("strategy", ["head", "tail", "head+tail", "chunk"])
+def test_segments_fit_after_retokenization(tiny_model_dir, strategy):
+    """
+    Con un tokenizer BPE reale i tagli a metà parola e la giunzione di inizio + fine cambiano
+    le fusioni: ogni segmento, ritokenizzato con i token speciali, resta entro max_tokens.
+    """
+    import random
+
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(tiny_model_dir)
+    rng = random.Random(0)
+    pieces = ["the", "movie", "love", "hate", "!", "??", "...", " ", "  ", "ing", "un", "believ", "able",
+              "é", "🙂", "a", "b", "\n"]
+    for _ in range(100):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(30, 120)))
+        max_tokens = rng.choice([8, 9, 12, 16])
+        policy = LengthPolicy(tokenizer, max_tokens=max_tokens, strategy=strategy)
+
+        segments, _, _ = policy.split(text)
+
+        for segment in segments:
+            assert len(tokenizer(segment)["input_ids"]) <= max_tokens, (text, segment)
@@ -0,0 +1,131 @@
+# tests/test_metrics.py
+
+import threading
+import time
+import urllib.request
+
+from src.metrics import Metrics, instrument_pipeline, start_metrics_server
+from src.profiler import SamplingProfiler
+
+
+class StagedPipeline:
+    """Pipeline finta con gli stessi stadi della pipeline di transformers."""
+
+    def preprocess(self, text):
+        return text.split()
+
+    def forward(self, tokens):
+        return len(tokens)
+
+    def postprocess(self, n_tokens):
+        return {'label': 'neutral', 'score': 1.0 / n_tokens}
+
+    def __call__(self, text):
+        return self.postprocess(self.forward(self.preprocess(text)))
+
+
+def test_histogram_is_rendered_in_prometheus_format():
+    """Bucket cumulativi, somma e conteggio devono comparire nel testo esportato."""
+    metrics = Metrics(latency_buckets=[0.1, 1.0])
+    metrics.observe("stage_seconds", 0.05, stage="model")
+    metrics.observe("stage_seconds", 0.5, stage="model")
+    metrics.inc("requests", endpoint="predict")
+
+    text = metrics.render_prometheus()
+
+    assert 'sentiment_stage_seconds_bucket{stage="model",le="0.1"} 1' in text
+    assert 'sentiment_stage_seconds_bucket{stage="model",le="1.0"} 2' in text
+    assert 'sentiment_stage_seconds_bucket{stage="model",le="+Inf"} 2' in text
+    assert 'sentiment_stage_seconds_count{stage="model"} 2' in text
+    assert 'sentiment_requests_total{endpoint="predict"} 1' in text
+
+
+def test_collectors_are_exported_as_gauges():
+    """Le statistiche dei componenti vengono lette al momento dell'esportazione."""
+    metrics = Metrics()
+    stats = {"hits": 1, "nested": {"depth": 2}, "label": "ignorato"}
+    metrics.add_collector("cache", lambda: stats)
+    stats["hits"] = 5
+
+    text = metrics.render_prometheus()
+
+    assert "sentiment_cache_hits 5.0" in text
+    assert "sentiment_cache_nested_depth 2.0" in text
+    assert "ignorato" not in text
+
+
+def test_instrument_pipeline_times_each_stage():
+    """Ogni stadio della pipeline deve avere il proprio istogramma, senza cambiare l'output."""
+    metrics = Metrics()
+    pipeline = instrument_pipeline(StagedPipeline(), metrics)
+
+    assert pipeline("a b") == {'label': 'neutral', 'score': 0.5}
+
+    histograms = metrics.snapshot()["histograms"]
+    for stage in ("tokenize", "model", "postprocess"):
+        assert histograms[f'stage_seconds{{stage="{stage}"}}']["count"] == 1
+
+
+def test_profiler_can_be_toggled_over_http():
+    """Il profiler si accende e spegne a runtime e restituisce gli stack campionati."""
+    def busy_function(stop):
+        while not stop.is_set():
+            sum(range(1000))
+
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_function, args=(stop,), daemon=True)
+    worker.start()
+
+    server = start_metrics_server(Metrics(), port=0, host="127.0.0.1", profiler=SamplingProfiler(interval_ms=1),
+                                  enable_profiler=True)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        urllib.request.urlopen(f"{base_url}/profile/start").read()
+        time.sleep(0.2)
+        collapsed = urllib.request.urlopen(f"{base_url}/profile/stop").read().decode("utf-8")
+        metrics_text = urllib.request.urlopen(f"{base_url}/metrics").read().decode("utf-8")
+    finally:
+        stop.set()
+        server.shutdown()
+
+    assert "test_metrics.py:busy_function" in collapsed
+    assert isinstance(metrics_text, str)
+
+
+def test_profiler_endpoints_are_off_by_default():
+    """Senza abilitazione esplicita /profile risponde 404; /metrics resta disponibile in locale."""
+    import urllib.error
+
+    from src import config
+
+    assert config.METRICS_PORT is None and config.METRICS_HOST == "127.0.0.1"
+    server = start_metrics_server(Metrics(), port=0)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert urllib.request.urlopen(f"{base_url}/metrics").status == 200
+        try:
+            urllib.request.urlopen(f"{base_url}/profile/start")
+            assert False, "L'endpoint del profiler avrebbe dovuto essere disattivato"
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.shutdown()
+
+
+def test_profiler_rejects_invalid_interval():
+    """Un interval_ms non numerico o non positivo è un errore del client (400), il profiler resta spento."""
+    import urllib.error
+
+    profiler = SamplingProfiler(interval_ms=1)
+    server = start_metrics_server(Metrics(), port=0, host="127.0.0.1", profiler=profiler, enable_profiler=True)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        for interval in ("abc", "nan", "-5", "0"):
+            try:
+                urllib.request.urlopen(f"{base_url}/profile/start?interval_ms={interval}")
+                assert False, f"interval_ms={interval} avrebbe dovuto essere rifiutato"
+            except urllib.error.HTTPError as e:
+                assert e.code == 400
+        assert not profiler.running
+    finally:
+        server.shutdown()
@@ -2,19 +2,24 @@
 
 import pytest
 from src.model import load_sentiment_pipeline
-from src.config import LABELS
+from src.config import GOLDEN_EXAMPLES, LABELS
 
 
 # --- FIXTURE ---
-# Utilizziamo una fixture con scope="module" per caricare il modello
-# una sola volta per tutti i test di questo file.
-# Questo rende i test molto più veloci.
+# Il modello reale viene caricato una sola volta per modulo e solo con --real-model.
+# I test di formato e robustezza girano di default sul modello minuscolo (vedi conftest.py),
+# che ha le stesse etichette e lo stesso codice di caricamento: offline e in pochi secondi.
 @pytest.fixture(scope="module")
-def pipeline():
+def real_pipeline():
     # Forziamo la CPU per i test per garantire che girino ovunque (anche su GitHub Actions)
     return load_sentiment_pipeline(device="cpu")
 
 
+@pytest.fixture(params=["tiny", pytest.param("real", marks=pytest.mark.real_model)])
+def pipeline(request):
+    return request.getfixturevalue("tiny_pipeline" if request.param == "tiny" else "real_pipeline")
+
+
 # --- TEST ESISTENTI (MIGLIORATI) ---
 
 def test_pipeline_structure(pipeline):
@@ -48,24 +53,17 @@ def test_labels_consistency(pipeline):
 
 # --- NUOVI TEST: ANTI-DEGRADO E ROBUSTEZZA ---
 
-def test_model_performance_sanity_check(pipeline):
+@pytest.mark.real_model
+def test_model_performance_sanity_check(real_pipeline):
     """
     GOLDEN SET / ANTI-DEGRADATION TEST:
     Questo test verifica che il modello mantenga una "conoscenza di base".
     Se il modello sbaglia queste frasi ovvie, significa che è degradato
     (es. dopo un retraining sbagliato) e non deve andare in produzione.
     """
-    # Dizionario di frasi inequivocabili -> etichetta attesa
-    golden_examples = {
-        "I absolutely love this product, it is amazing!": "positive",
-        "Worst experience ever, I hate it.": "negative",
-        "The package arrived on Tuesday.": "neutral",  # Fatto oggettivo
-        "Excellent service and great quality.": "positive",
-        "Disgusting food and rude staff.": "negative"
-    }
-
-    for text, expected_label in golden_examples.items():
-        result = pipeline(text)
+    # Dizionario di frasi inequivocabili -> etichetta attesa (condiviso con il ricaricamento a caldo)
+    for text, expected_label in GOLDEN_EXAMPLES.items():
+        result = real_pipeline(text)
         predicted_label = result[0]['label'].lower()
 
         # Se fallisce qui, il modello è "rotto" o ha dimenticato concetti base
@@ -103,4 +101,51 @@ def test_confidence_score(pipeline):
     result = pipeline(text)
     score = result[0]['score']
 
-    assert 0.0 <= score <= 1.0, f"Lo score {score} è fuori dal range [0, 1]"
\ No newline at end of file
+    assert 0.0 <= score <= 1.0, f"Lo score {score} è fuori dal range [0, 1]"
+
+# --- QUANTIZZAZIONE INT8 ---
+
+def _linear_types(pipeline):
+    """Tipi dei layer lineari del modello (fp32 o quantizzati dinamicamente)."""
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+
+    return {type(module) for module in pipeline.model.modules()
+            if isinstance(module, (torch.nn.Linear, DynamicQuantizedLinear))}
+
+
+def test_int8_quantization_replaces_linear_layers(tiny_pipeline):
+    """La quantizzazione sostituisce i Linear con moduli int8 dinamici e mantiene il formato dell'output."""
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+
+    from src.model import quantize_pipeline
+
+    quantized = quantize_pipeline(tiny_pipeline)
+
+    assert _linear_types(quantized) == {DynamicQuantizedLinear}
+    # La pipeline originale (fp32) non viene modificata
+    assert _linear_types(tiny_pipeline) == {torch.nn.Linear}
+
+    result = quantized(["Test sentence", "Another one"])
+    assert [set(item) for item in result] == [{'label', 'score'}] * 2
+    assert all(item['label'].lower() in LABELS and 0.0 <= item['score'] <= 1.0 for item in result)
+
+
+@pytest.mark.parametrize("int8_accuracy, expect_int8", [(0.90, True), (0.70, False)])
+def test_accuracy_guard_rejects_int8_beyond_tolerance(tiny_model_dir, monkeypatch, int8_accuracy, expect_int8):
+    """Con un calo di accuratezza oltre la tolleranza la guardia scarta l'int8 e restituisce il modello fp32."""
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+
+    from src import config
+
+    monkeypatch.setattr(config, "QUANTIZATION_ACCURACY_TOLERANCE", 0.05)
+    # Accuratezza simulata: 0.92 per il modello fp32, `int8_accuracy` per quello quantizzato
+    monkeypatch.setattr("src.evaluate.evaluate_model", lambda pipeline, dataset, sample_size=None: (
+        int8_accuracy if DynamicQuantizedLinear in _linear_types(pipeline) else 0.92))
+
+    loaded = load_sentiment_pipeline(device="cpu", model_name=tiny_model_dir, quantize=True,
+                                     guard_dataset=object(), backend="eager")
+
+    assert (DynamicQuantizedLinear in _linear_types(loaded)) == expect_int8
+    assert loaded("Test")[0]['label'].lower() in LABELS
@@ -0,0 +1,149 @@
+# tests/test_monitor.py
+
+import csv
+import json
+
+from src.feedback_store import FeedbackStore, migrate_csv
+from src.monitor import CorrectionLogMonitor, population_stability_index
+
+HEADER = ["timestamp", "text", "model_prediction", "user_correction"]
+
+
+def append_rows(path, rows, header=False):
+    """Simula app.save_correction: apertura in append e scrittura con csv.writer."""
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+def test_only_new_rows_are_processed(tmp_path):
+    """Il secondo aggiornamento deve leggere solo le righe aggiunte dopo il checkpoint."""
+    log_path = str(tmp_path / "log.csv")
+    state_path = str(tmp_path / "state.json")
+    append_rows(log_path, [
+        ["t1", "great", "positive", "positive"],
+        ["t2", "testo\nsu più righe", "positive", "negative"],
+    ], header=True)
+
+    monitor = CorrectionLogMonitor(log_path, state_path, window_size=10)
+    assert monitor.update() == 2
+
+    append_rows(log_path, [["t3", "meh", "neutral", "neutral"]])
+
+    # Un nuovo processo riparte dal checkpoint salvato su disco
+    restarted = CorrectionLogMonitor(log_path, state_path, window_size=10)
+    assert restarted.update() == 1
+
+    report = restarted.report()
+    assert report["rows_processed"] == 3
+    assert report["accuracy"] == 2 / 3
+    # Riga = correzione utente (negative), colonna = predizione (positive)
+    assert report["confusion_matrix"][0][2] == 1
+
+
+def test_window_keeps_only_latest_rows(tmp_path):
+    """Le statistiche della finestra escludono le correzioni più vecchie."""
+    log_path = str(tmp_path / "log.csv")
+    append_rows(log_path, [["t", "x", "positive", "negative"]] * 5, header=True)
+    append_rows(log_path, [["t", "y", "neutral", "neutral"]] * 3)
+
+    monitor = CorrectionLogMonitor(log_path, str(tmp_path / "state.json"), window_size=3)
+    monitor.update()
+    report = monitor.report()
+
+    assert report["window_size"] == 3
+    assert report["accuracy"] == 1.0
+    assert report["reference_label_distribution"] == [5, 3, 0]
+
+
+def test_incomplete_last_row_is_not_consumed(tmp_path):
+    """Una riga ancora in scrittura (senza newline finale) viene letta al giro successivo."""
+    log_path = str(tmp_path / "log.csv")
+    append_rows(log_path, [["t1", "ok", "neutral", "neutral"]], header=True)
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write("t2,parziale,positive,posi")
+
+    monitor = CorrectionLogMonitor(log_path, str(tmp_path / "state.json"))
+    assert monitor.update() == 1
+
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write("tive\r\n")
+    assert monitor.update() == 1
+    assert monitor.report()["accuracy"] == 1.0
+
+
+def test_psi_is_zero_for_identical_distributions():
+    assert population_stability_index([10, 20, 30], [1, 2, 3]) == 0.0
+    assert population_stability_index([100, 0, 0], [0, 0, 100]) > 0.2
+
+
+def test_migration_to_store_does_not_count_rows_twice(tmp_path):
+    """Dopo la migrazione CSV -> archivio le correzioni già contate dal CSV non vengono rilette."""
+    log_path = str(tmp_path / "log.csv")
+    state_path = str(tmp_path / "state.json")
+    append_rows(log_path, [["t1", "a", "positive", "positive"], ["t2", "b", "positive", "negative"],
+                           ["t3", "c", "neutral", "neutral"]], header=True)
+    assert CorrectionLogMonitor(log_path, state_path, window_size=10).update() == 3
+
+    store = FeedbackStore(str(tmp_path / "feedback.db"))
+    migrate_csv(log_path, store)
+    store.append("t4", "d", "negative", "negative").result(timeout=10)
+
+    monitor = CorrectionLogMonitor(log_path, state_path, window_size=10, store=store)
+    assert monitor.update() == 1
+    report = monitor.report()
+    assert report["rows_processed"] == 4
+    assert report["reference_label_distribution"] == [2, 1, 1]
+    assert sum(map(sum, report["confusion_matrix"])) == 4
+
+    with open(state_path, encoding="utf-8") as f:
+        assert json.load(f)["source"] == "store"
+    store.close()
+
+
+def test_legacy_csv_checkpoint_is_converted(tmp_path):
+    """Un checkpoint CSV senza sorgente né conteggio delle righe viene convertito correttamente."""
+    log_path = str(tmp_path / "log.csv")
+    state_path = str(tmp_path / "state.json")
+    append_rows(log_path, [["t1", "a", "positive", "positive"], ["t2", "b", "neutral", "neutral"]], header=True)
+    CorrectionLogMonitor(log_path, state_path, window_size=10).update()
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    del state["source"], state["csv_rows"]
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+    store = FeedbackStore(str(tmp_path / "feedback.db"))
+    migrate_csv(log_path, store)
+    monitor = CorrectionLogMonitor(log_path, state_path, window_size=10, store=store)
+    assert monitor.update() == 0
+    assert monitor.report()["rows_processed"] == 2
+    store.close()
+
+
+def test_simulated_check_reuses_predictions_across_runs(tiny_pipeline, tmp_path, monkeypatch):
+    """La cache del monitoraggio è su disco: una seconda esecuzione non rivaluta gli stessi testi."""
+    import src.model
+    from src import config
+    from src.monitor import run_monitoring
+
+    calls = []
+
+    class CountingPipeline:
+        model = tiny_pipeline.model
+
+        def __call__(self, texts, **kwargs):
+            calls.append(len(texts))
+            return tiny_pipeline(texts, **kwargs)
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "MONITOR_CACHE_DB_PATH", str(tmp_path / "monitor_cache.db"))
+    monkeypatch.setattr(src.model, "load_sentiment_pipeline", lambda **kwargs: CountingPipeline())
+
+    run_monitoring()
+    assert calls
+    calls.clear()
+    run_monitoring()
+    assert calls == []
@@ -0,0 +1,74 @@
+# tests/test_retrain.py
+
+import json
+
+import retrain
+from src import config
+from src.feedback_store import FeedbackStore
+
+
+def fill_store(db_path, texts):
+    store = FeedbackStore(db_path)
+    for text in texts:
+        store.append("2025-01-01T00:00:00", text, "neutral", "positive").result(timeout=10)
+    store.close()
+
+
+def test_training_state_requires_a_model(tmp_path):
+    """Il watermark vale solo se accanto c'è un modello: senza config.json si riparte da zero."""
+    model_dir = str(tmp_path)
+    retrain.save_training_state({"last_correction_id": 7}, model_dir=model_dir)
+    assert retrain.load_training_state(model_dir) is None
+
+    (tmp_path / "config.json").write_text("{}")
+    assert retrain.load_training_state(model_dir) == {"last_correction_id": 7}
+    assert json.loads((tmp_path / config.RETRAIN_STATE_FILENAME).read_text())["last_correction_id"] == 7
+
+
+def test_incremental_data_is_new_rows_plus_bounded_replay(tmp_path, monkeypatch):
+    """Solo le correzioni dopo il watermark sono nuove; il replay è limitato e prende solo le vecchie."""
+    db_path = str(tmp_path / "feedback.db")
+    monkeypatch.setattr(config, "FEEDBACK_DB_PATH", db_path)
+    monkeypatch.setattr(config, "DEDUP_CORRECTIONS", False)
+    monkeypatch.setattr(retrain, "CSV_FILE", str(tmp_path / "assente.csv"))
+    fill_store(db_path, [f"testo vecchio numero {i}" for i in range(20)] + ["nuovo uno", "nuovo due"])
+
+    new = retrain.load_corrected_data(since_id=20)
+    replay = retrain.load_replay_corrections(until_id=20, sample_size=5)
+
+    assert new['text'].tolist() == ["nuovo uno", "nuovo due"]
+    assert new['label'].tolist() == [config.LABEL2ID["positive"]] * 2
+    assert len(replay) == 5
+    assert replay['id'].max() <= 20
+    assert retrain.load_corrected_data(since_id=22) is None
+
+
+def test_new_corrections_are_never_held_out(tmp_path):
+    """Le correzioni nuove vanno tutte in training: l'eval set viene solo dal replay."""
+    import pandas as pd
+
+    new = pd.DataFrame({"id": range(21, 41), "text": ["nuova"] * 20, "label": [2] * 20})
+    replay = pd.DataFrame({"id": range(1, 21), "text": ["vecchia"] * 20, "label": [0] * 20})
+
+    train_df, eval_df = retrain.split_train_eval(new, replay)
+    assert set(new['id']) <= set(train_df['id'])
+    assert set(eval_df['id']) <= set(replay['id'])
+    assert len(eval_df) == 4 and not set(eval_df['id']) & set(train_df['id'])
+
+    train_df, eval_df = retrain.split_train_eval(new, None)
+    assert eval_df is None and train_df['id'].tolist() == new['id'].tolist()
+
+
+def test_replay_sample_is_drawn_in_sql(tmp_path):
+    """Il campione di replay arriva da SQLite già limitato e solo tra le correzioni fino al watermark."""
+    db_path = str(tmp_path / "feedback.db")
+    fill_store(db_path, [f"testo {i}" for i in range(30)])
+
+    store = FeedbackStore(db_path)
+    sample = store.sample_until(until_id=10, limit=4)
+    everything = store.sample_until(until_id=10, limit=100)
+    store.close()
+
+    assert len(sample) == 4 and sample['id'].max() <= 10
+    assert sample['id'].is_monotonic_increasing
+    assert everything['id'].tolist() == list(range(1, 11))
@@ -0,0 +1,53 @@
+# tests/test_runtime_profile.py
+
+import json
+import subprocess
+import sys
+
+from src.runtime_profile import host_signature, pick_best, resolve_profile, thread_candidates
+
+
+def write_calibration(path, host, num_threads):
+    path.write_text(json.dumps({"host": host, "profiles": {"latency": {"num_threads": num_threads}}}))
+
+
+def test_calibration_applies_only_to_the_same_host(tmp_path):
+    """I valori calibrati sostituiscono quelli predefiniti solo se misurati su questo host."""
+    path = tmp_path / "runtime_profile.json"
+
+    write_calibration(path, host_signature(), num_threads=3)
+    profile = resolve_profile("latency", path=str(path))
+    assert profile["num_threads"] == 3 and profile["calibrated"]
+    assert resolve_profile("throughput", path=str(path))["batch_max_size"] == 32
+
+    write_calibration(path, {**host_signature(), "cores": 999}, num_threads=3)
+    assert "calibrated" not in resolve_profile("latency", path=str(path))
+    assert resolve_profile("off", path=str(path)) is None
+
+
+def test_pick_best_prefers_fewer_threads_within_tolerance():
+    """A prestazioni quasi uguali vince la configurazione con meno thread."""
+    results = [
+        {"num_threads": 1, "texts_per_sec": 50.0},
+        {"num_threads": 4, "texts_per_sec": 97.0},
+        {"num_threads": 8, "texts_per_sec": 100.0},
+    ]
+    assert pick_best(results, "texts_per_sec", higher_is_better=True, tolerance=0.05)["num_threads"] == 4
+    assert pick_best(results, "texts_per_sec", higher_is_better=True, tolerance=0.0)["num_threads"] == 8
+    assert thread_candidates(6) == [1, 2, 4, 6]
+
+
+def test_profile_sets_threads_batches_and_inference_mode(tmp_path):
+    """In un processo nuovo il profilo imposta thread torch, batch in config e modello senza gradienti."""
+    path = tmp_path / "runtime_profile.json"
+    write_calibration(path, host_signature(), num_threads=2)
+    code = (
+        "import torch; from src import config; "
+        "from src.runtime_profile import apply_runtime_profile, prepare_for_inference; "
+        f"profile = apply_runtime_profile('latency', path={str(path)!r}); "
+        "p = prepare_for_inference(type('P', (), {'model': torch.nn.Linear(2, 2)})(), profile); "
+        "print(torch.get_num_threads(), torch.get_num_interop_threads(), config.BATCH_MAX_SIZE, "
+        "p.model.weight.requires_grad, p.model.training)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "2 1 8 False False"
@@ -0,0 +1,98 @@
+# tests/test_score_file.py
+
+import json
+
+import pandas as pd
+import pytest
+
+from score_file import checkpoint_path, score_file
+
+# Testi con caratteri multi-byte, virgole, virgolette e a capo: gli offset del checkpoint sono in byte
+TEXTS = [
+    "I love this!",
+    "caffè pessimo ☕, mai più",
+    'Ha detto "ok", poi basta',
+    "riga\r\nsu due righe",
+    "neutral tweet about Tuesday",
+    "I LOVE THIS!",
+    "Check http://example.com/a now",
+    "check http://example.com/b NOW",
+    "😡😡😡",
+    "ultimo testo del file",
+]
+
+
+class FakePipeline:
+    """Pipeline finta e deterministica; con `fail_after` si interrompe dopo quel numero di testi."""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.seen = []
+
+    def __call__(self, texts, batch_size=None, truncation=None):
+        if self.fail_after is not None and len(self.seen) + len(texts) > self.fail_after:
+            raise RuntimeError("interruzione simulata")
+        self.seen.extend(texts)
+        labels = ["negative", "neutral", "positive"]
+        return [{'label': labels[len(text.lower().split()) % 3], 'score': 1 / (1 + len(text.split()))}
+                for text in texts]
+
+
+def write_input(path, fmt):
+    df = pd.DataFrame({"id": [f"r{i}" for i in range(len(TEXTS))], "text": TEXTS})
+    if fmt == "csv":
+        df.to_csv(path, index=False, lineterminator="\r\n")
+    elif fmt == "jsonl":
+        df.to_json(path, orient="records", lines=True, force_ascii=False)
+    else:
+        df.to_parquet(path, row_group_size=4)
+
+
+def run(input_path, output_path, pipeline, dedup=False):
+    return score_file(pipeline, str(input_path), str(output_path), id_column="id",
+                      chunk_size=3, batch_size=2, dedup=dedup)
+
+
+@pytest.mark.parametrize("dedup", [False, True])
+@pytest.mark.parametrize("output_format", ["csv", "jsonl"])
+@pytest.mark.parametrize("input_format", ["csv", "jsonl", "parquet"])
+def test_resume_after_interruption_is_byte_identical(tmp_path, input_format, output_format, dedup):
+    """Un'esecuzione interrotta e ripresa produce esattamente gli stessi byte di una senza interruzioni."""
+    input_path = tmp_path / f"input.{input_format}"
+    write_input(input_path, input_format)
+
+    reference = tmp_path / f"reference.{output_format}"
+    assert run(input_path, reference, FakePipeline(), dedup) == len(TEXTS)
+
+    output = tmp_path / f"output.{output_format}"
+    with pytest.raises(RuntimeError):
+        run(input_path, output, FakePipeline(fail_after=5), dedup)
+    rows_done = json.loads(open(checkpoint_path(str(output))).read())["rows_done"]
+    assert 0 < rows_done < len(TEXTS)
+    # Un blocco scritto solo in parte dopo l'ultimo checkpoint viene scartato alla ripresa
+    with open(output, "ab") as f:
+        f.write("riga parziale, ☕".encode("utf-8"))
+
+    resumed = FakePipeline()
+    assert run(input_path, output, resumed, dedup) == len(TEXTS)
+    assert len(resumed.seen) <= len(TEXTS) - rows_done
+    assert output.read_bytes() == reference.read_bytes()
+
+
+def test_dedup_scores_each_cluster_once(tmp_path):
+    """Con la deduplicazione i quasi duplicati di un blocco vengono valutati una volta con lo stesso risultato."""
+    input_path = tmp_path / "input.csv"
+    write_input(input_path, "csv")
+
+    plain, deduplicated = FakePipeline(), FakePipeline()
+    run(input_path, tmp_path / "plain.csv", plain)
+    run(input_path, tmp_path / "dedup.csv", deduplicated, dedup=True)
+
+    assert len(deduplicated.seen) < len(plain.seen) == len(TEXTS)
+    plain_df = pd.read_csv(tmp_path / "plain.csv")
+    dedup_df = pd.read_csv(tmp_path / "dedup.csv")
+    assert dedup_df['row'].tolist() == list(range(len(TEXTS)))
+    assert dedup_df['id'].tolist() == plain_df['id'].tolist()
+    # "I love this!" e "I LOVE THIS!" (righe 0 e 5) finiscono in blocchi diversi; le righe 6 e 7 nello stesso
+    assert not {TEXTS[6], TEXTS[7]} <= set(deduplicated.seen)
+    assert dedup_df.loc[6, ['label', 'score']].tolist() == dedup_df.loc[7, ['label', 'score']].tolist()
@@ -0,0 +1,102 @@
+# tests/test_scoring.py
+
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+from src.bulk_inference import predict_proba_sorted_by_length
+from src.scoring import (accuracy, bootstrap_confidence_intervals, class_probabilities, confusion_matrix, label_ids,
+                         per_class_metrics, predicted_labels)
+
+
+class LogitsPipeline:
+    """
+    Backend finto con `logits` (come TracedSentimentPipeline) e classi in ordine
+    diverso da config.LABELS: il logit più alto è la lunghezza del testo modulo 3.
+    """
+
+    config = SimpleNamespace(id2label={0: "POSITIVE", 1: "NEGATIVE", 2: "NEUTRAL"})
+
+    def __init__(self):
+        self.batches = []
+
+    def logits(self, texts, truncation=True):
+        self.batches.append(list(texts))
+        logits = torch.zeros(len(texts), 3)
+        for row, text in enumerate(texts):
+            logits[row, len(text.split()) % 3] = 5.0
+        return logits
+
+
+class TopKPipeline:
+    """Pipeline finta senza logit: risponde solo con la distribuzione `top_k=None`."""
+
+    def __call__(self, texts, batch_size=None, truncation=None, top_k=1):
+        assert top_k is None
+        return [[{'label': 'Neutral', 'score': 0.7}, {'label': 'positive', 'score': 0.2},
+                 {'label': 'negative', 'score': 0.1}] for _ in texts]
+
+
+def test_columns_follow_config_labels():
+    """Le colonne devono seguire config.LABELS anche se il modello ordina le classi diversamente."""
+    probabilities = class_probabilities(LogitsPipeline(), ["a b c", "a", "a b"])
+
+    assert probabilities.shape == (3, 3)
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1.0, rtol=1e-5)
+    assert predicted_labels(probabilities).tolist() == ["positive", "negative", "neutral"]
+
+
+def test_sorted_probabilities_keep_original_order():
+    """Con i batch ordinati per lunghezza, le righe tornano nell'ordine dei testi."""
+    texts = ["a b c d e f", "a", "a b c", "a b", "a b c d"]
+    fake = LogitsPipeline()
+
+    probabilities, stats = predict_proba_sorted_by_length(fake, texts, batch_size=2)
+
+    assert fake.batches[0] == ["a", "a b"]
+    assert predicted_labels(probabilities).tolist() == ["positive", "negative", "positive", "neutral", "negative"]
+    assert stats['texts'] == len(texts)
+
+
+def test_top_k_fallback():
+    """Senza accesso ai logit si usa la distribuzione completa restituita dalla pipeline."""
+    probabilities = class_probabilities(TopKPipeline(), ["x", "y"])
+
+    np.testing.assert_allclose(probabilities, [[0.1, 0.7, 0.2]] * 2)
+
+
+def test_label_ids_and_confusion_matrix():
+    """Conversione vettoriale delle etichette (-1 se non valide) e matrice di confusione."""
+    assert label_ids(["Positive", "neutral", "boh", "NEGATIVE"]).tolist() == [2, 1, -1, 0]
+
+    matrix = confusion_matrix([0, 0, 1, 2, 2], [0, 1, 1, 2, 0])
+    assert matrix.tolist() == [[1, 1, 0], [0, 1, 0], [1, 0, 1]]
+
+
+def test_report_from_confusion_matches_sklearn():
+    """Le metriche calcolate dalla sola matrice di confusione coincidono con scikit-learn."""
+    from sklearn.metrics import precision_recall_fscore_support
+
+    rng = np.random.default_rng(0)
+    true_ids = rng.integers(0, 3, size=500)
+    pred_ids = np.where(rng.random(500) < 0.7, true_ids, rng.integers(0, 3, size=500))
+
+    precision, recall, f1, support = per_class_metrics(confusion_matrix(true_ids, pred_ids))
+    expected = precision_recall_fscore_support(true_ids, pred_ids)
+
+    for ours, theirs in zip((precision, recall, f1, support), expected):
+        np.testing.assert_allclose(ours, theirs)
+
+
+def test_bootstrap_interval_contains_point_estimate():
+    """L'intervallo bootstrap dell'accuratezza contiene la stima puntuale ed è ragionevolmente stretto."""
+    true_ids = np.repeat([0, 1, 2], 300)
+    pred_ids = true_ids.copy()
+    pred_ids[::4] = (pred_ids[::4] + 1) % 3
+
+    intervals = bootstrap_confidence_intervals(true_ids, pred_ids, num_samples=200, confidence=0.95)
+    low, high = intervals['accuracy']
+
+    assert low < accuracy(true_ids, pred_ids) < high
+    assert high - low < 0.1
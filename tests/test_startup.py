@@ -0,0 +1,79 @@
+# tests/test_startup.py
+
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from src.lazy import LazyResource
+from src.metrics import Metrics, start_metrics_server
+
+HEAVY_MODULES = ["torch", "transformers", "sklearn", "seaborn", "matplotlib", "datasets"]
+
+
+def test_lightweight_modules_do_not_import_heavy_libraries():
+    """I moduli usati all'avvio non devono importare torch, transformers & co. finché non servono."""
+    code = (
+        "import sys, src.model, src.evaluate, src.monitor, src.hot_reload, src.metrics, src.lazy, src.long_text, src.runtime_profile; "
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_lazy_resource_is_created_once():
+    """Chiamate concorrenti durante il caricamento attendono la stessa istanza."""
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    resource = LazyResource(factory, name="test")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resource.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert resource.loaded
+
+
+def test_failed_load_is_retried():
+    """Se il caricamento fallisce, la chiamata successiva riprova."""
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("modello non disponibile")
+        return "ok"
+
+    resource = LazyResource(factory, name="test")
+    resource.preload().join()
+    assert not resource.loaded
+    assert resource.get() == "ok"
+
+
+def test_readiness_follows_model_loading():
+    """/healthz risponde subito, /readyz solo quando il modello è caricato."""
+    loaded = threading.Event()
+    server = start_metrics_server(Metrics(), port=0, host="127.0.0.1", ready=loaded.is_set)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert urllib.request.urlopen(f"{base_url}/healthz").status == 200
+        try:
+            urllib.request.urlopen(f"{base_url}/readyz")
+            raise AssertionError("/readyz deve rispondere 503 durante il caricamento")
+        except urllib.error.HTTPError as e:
+            assert e.code == 503
+        loaded.set()
+        assert urllib.request.urlopen(f"{base_url}/readyz").status == 200
+    finally:
+        server.shutdown()
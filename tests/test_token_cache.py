@@ -0,0 +1,83 @@
+# tests/test_token_cache.py
+
+import os
+
+import pandas as pd
+import pytest
+from transformers import AutoTokenizer
+
+from src.token_cache import TokenizedFeatureCache
+
+
+class CountingTokenizer:
+    """Tokenizer che registra i testi ricevuti, per verificare cosa viene ritokenizzato."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.seen = []
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+    def __call__(self, texts, **kwargs):
+        self.seen.extend(texts)
+        return self.tokenizer(texts, **kwargs)
+
+
+@pytest.fixture
+def tokenizer(tiny_model_dir):
+    return CountingTokenizer(AutoTokenizer.from_pretrained(tiny_model_dir))
+
+
+def corrections(ids):
+    return pd.DataFrame({"id": ids, "text": [f"correzione numero {i}" for i in ids], "label": [i % 3 for i in ids]})
+
+
+def expected_ids(tokenizer, df):
+    return tokenizer.tokenizer(df['text'].tolist(), truncation=True)['input_ids']
+
+
+def test_only_new_ids_are_tokenized(tokenizer, tmp_path):
+    """Le righe già in cache vengono riusate (anche da un'istanza nuova); si tokenizzano solo gli id nuovi."""
+    first = corrections([1, 2, 3])
+    TokenizedFeatureCache(tokenizer, cache_dir=str(tmp_path)).features_for(first)
+    assert tokenizer.seen == first['text'].tolist()
+
+    tokenizer.seen.clear()
+    df = corrections([3, 5, 1, 4])
+    features = TokenizedFeatureCache(tokenizer, cache_dir=str(tmp_path)).features_for(df)
+
+    assert tokenizer.seen == ["correzione numero 5", "correzione numero 4"]
+    assert features['row_id'] == [3, 5, 1, 4]
+    assert features['labels'] == df['label'].tolist()
+    assert features['input_ids'] == expected_ids(tokenizer, df)
+
+
+def test_tokenizer_change_invalidates_cache(tokenizer, tmp_path):
+    """Con un'impronta del tokenizer diversa le feature salvate non vengono riusate."""
+    df = corrections([1, 2])
+    TokenizedFeatureCache(tokenizer, cache_dir=str(tmp_path)).features_for(df)
+
+    tokenizer.seen.clear()
+    tokenizer.tokenizer.model_max_length = 64
+    features = TokenizedFeatureCache(tokenizer, cache_dir=str(tmp_path)).features_for(df)
+
+    assert tokenizer.seen == df['text'].tolist()
+    assert features['input_ids'] == expected_ids(tokenizer, df)
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_shards_are_compacted_past_threshold(tokenizer, tmp_path):
+    """Oltre il numero massimo di shard la cache viene riscritta in uno solo, senza perdere righe."""
+    cache = TokenizedFeatureCache(tokenizer, cache_dir=str(tmp_path), max_shards=3)
+    for i in range(1, 5):
+        cache.features_for(corrections([i]))
+
+    shard_names = [name for name in os.listdir(cache.cache_dir) if name.startswith("shard_")]
+    assert len(shard_names) == 1
+
+    tokenizer.seen.clear()
+    df = corrections([4, 2, 3, 1])
+    features = TokenizedFeatureCache(tokenizer, cache_dir=str(tmp_path), max_shards=3).features_for(df)
+    assert tokenizer.seen == []
+    assert features['input_ids'] == expected_ids(tokenizer, df)
@@ -0,0 +1,91 @@
+# tests/test_worker_pool.py
+
+import os
+
+import pytest
+
+from src import config
+from src.worker_pool import InferenceWorkerPool
+
+
+class PidPipeline:
+    """Pipeline finta: restituisce il testo e il PID del processo che l'ha elaborato."""
+
+    def __call__(self, texts, batch_size=None, **kwargs):
+        if "boom" in texts:
+            raise ValueError("input non valido")
+        if "crash" in texts:
+            # Terminazione anomala del processo (come un kill dell'OOM killer)
+            os._exit(1)
+        return [{'label': text, 'score': float(os.getpid())} for text in texts]
+
+
+def test_pool_preserves_order_across_workers():
+    """I batch vengono distribuiti tra processi diversi ma l'ordine dei risultati resta invariato."""
+    texts = [f"t{i}" for i in range(40)]
+
+    with InferenceWorkerPool(num_workers=2, threads_per_worker=1, sentiment_pipeline=PidPipeline()) as pool:
+        outputs = pool(texts, batch_size=4)
+
+    assert [o['label'] for o in outputs] == texts
+    # L'inferenza avviene nei processi figli, non nel processo principale
+    assert os.getpid() not in {o['score'] for o in outputs}
+
+
+def test_pool_propagates_worker_errors():
+    """Un'eccezione in un worker deve arrivare al chiamante senza bloccare il pool."""
+    with InferenceWorkerPool(num_workers=1, threads_per_worker=1, sentiment_pipeline=PidPipeline()) as pool:
+        failed = pool.submit_batch(["boom"])
+        ok = pool.submit_batch(["fine"])
+
+        try:
+            failed.result(timeout=10)
+            assert False, "Il batch avrebbe dovuto fallire"
+        except RuntimeError as e:
+            assert "input non valido" in str(e)
+        assert ok.result(timeout=10)[0]['label'] == "fine"
+
+
+def test_dead_worker_fails_its_requests(monkeypatch):
+    """Se un worker muore, le sue richieste falliscono invece di restare in attesa; gli altri continuano."""
+    monkeypatch.setattr(config, "WORKER_LIVENESS_INTERVAL_S", 0.1)
+    with InferenceWorkerPool(num_workers=2, threads_per_worker=1, sentiment_pipeline=PidPipeline()) as pool:
+        crashed = pool.submit_batch(["crash"])
+        with pytest.raises(RuntimeError, match="terminato"):
+            crashed.result(timeout=10)
+
+        outputs = pool([f"t{i}" for i in range(8)], batch_size=2)
+        assert [o['label'] for o in outputs] == [f"t{i}" for i in range(8)]
+
+
+def test_pool_without_live_workers_rejects_requests(monkeypatch):
+    """Morti tutti i worker, anche le richieste in coda falliscono e le nuove vengono rifiutate."""
+    monkeypatch.setattr(config, "WORKER_LIVENESS_INTERVAL_S", 0.1)
+    with InferenceWorkerPool(num_workers=1, threads_per_worker=1, sentiment_pipeline=PidPipeline()) as pool:
+        crashed = pool.submit_batch(["crash"])
+        queued = pool.submit_batch(["in coda"])
+        for future in (crashed, queued):
+            with pytest.raises(RuntimeError, match="terminato"):
+                future.result(timeout=10)
+
+        with pytest.raises(RuntimeError, match="worker"):
+            pool.submit_batch(["nuovo"])
+
+
+def test_pool_works_after_inference_in_the_parent(tiny_pipeline):
+    """Una pipeline reale già usata dal processo principale (con più thread torch) non blocca i worker."""
+    import torch
+
+    texts = ["I love it", "terrible service", "ok", "the package arrived on Tuesday"] * 2
+    previous_threads = torch.get_num_threads()
+    torch.set_num_threads(4)
+    try:
+        expected = tiny_pipeline(texts, batch_size=len(texts))
+        with InferenceWorkerPool(num_workers=2, threads_per_worker=2, sentiment_pipeline=tiny_pipeline) as pool:
+            futures = [pool.submit_batch(texts[start:start + 2]) for start in range(0, len(texts), 2)]
+            outputs = [output for future in futures for output in future.result(timeout=60)]
+    finally:
+        torch.set_num_threads(previous_threads)
+
+    assert [o['label'] for o in outputs] == [o['label'] for o in expected]
+    assert [o['score'] for o in outputs] == pytest.approx([o['score'] for o in expected], abs=1e-5)